@@ -10,3 +10,6 @@ class EcommerceConfig(AppConfig):
         from django.conf import settings
         stripe.api_key = settings.STRIPE_SECRET_KEY
 
+        # Register the signal receivers that keep the product search index
+        # current, maintain rating aggregates and count SQL per operation
+        from . import ratings, search, tracing  # noqa: F401
@@ -0,0 +1,93 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .checkout import CENTS
+from .models import CartItem
+from .replicas import primary
+from .response_cache import get_cache
+
+
+PRICES_VERSION_KEY = "graphql:cart-summary:prices"
+
+
+def _summary_key(user_id):
+    return f"graphql:cart-summary:{user_id}"
+
+
+def _cart_version_key(user_id):
+    # Kept as long as the entries, as a lost version only costs a recompute
+    return f"graphql:cart-summary:{user_id}:version"
+
+
+def _version(cache, key, timeout=None):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key, timeout=None):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout)
+
+
+def compute_cart_summary(user_id):
+    """Price every line of a user's cart in one query"""
+    lines = list(
+        CartItem.objects.filter(cart__user_id=user_id)
+        .order_by("product_id")
+        .values("product_id", "quantity", name=F("product__name"), unit_price=F("product__price"))
+        .annotate(line_total=F("quantity") * F("product__price"))
+    )
+    for line in lines:
+        line["line_total"] = line["line_total"].quantize(CENTS)
+    return {
+        "item_count": sum(line["quantity"] for line in lines),
+        "line_count": len(lines),
+        "subtotal": sum((line["line_total"] for line in lines), Decimal("0.00")),
+        "lines": lines,
+    }
+
+
+def get_cart_summary(user_id):
+    """Return the cached summary of a user's cart, computing it on a miss.
+
+    Entries carry the cart and price versions read before computing, so a
+    write committed meanwhile leaves the entry already out of date.
+    """
+    cache = get_cache()
+    timeout = settings.CART_SUMMARY_CACHE_TIMEOUT
+    key, version_key = _summary_key(user_id), _cart_version_key(user_id)
+    cached = cache.get_many([key, version_key, PRICES_VERSION_KEY])
+    versions = (
+        cached.get(version_key) or _version(cache, version_key, timeout),
+        cached.get(PRICES_VERSION_KEY) or _version(cache, PRICES_VERSION_KEY),
+    )
+    entry = cached.get(key)
+    if entry is not None and entry[0] == versions:
+        return entry[1]
+
+    # Computed on the primary, which has the cart write that expired the entry
+    with primary():
+        summary = compute_cart_summary(user_id)
+    cache.set(key, (versions, summary), timeout)
+    return summary
+
+
+def invalidate_cart_summary(user_id):
+    """Expire a user's cached summary once the cart write commits"""
+    timeout = settings.CART_SUMMARY_CACHE_TIMEOUT
+    transaction.on_commit(lambda: _bump(_cart_version_key(user_id), timeout))
+
+
+def invalidate_cart_prices():
+    """Expire every cached summary once a price change commits"""
+    transaction.on_commit(lambda: _bump(PRICES_VERSION_KEY))
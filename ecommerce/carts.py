@@ -0,0 +1,65 @@
+from collections import Counter
+
+from .models import Cart, CartItem, Product
+
+
+def merge_lines(items):
+    """Collapse CartItemInput-like lines into {product_id: quantity}"""
+    quantities = Counter()
+    for item in items:
+        if item.quantity is None or item.quantity < 1:
+            raise Exception("Quantity must be a positive integer.")
+        quantities[item.product_id] += item.quantity
+    return quantities
+
+
+def validate_products(product_ids):
+    """Check every product exists with a single query"""
+    found = set(Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True))
+    missing = sorted(set(product_ids) - found)
+    if missing:
+        raise Exception(
+            f"Product does not exist: {', '.join(str(product_id) for product_id in missing)}."
+        )
+
+
+def upsert_lines(cart, quantities):
+    """Write {product_id: quantity} as one INSERT ... ON CONFLICT on (cart, product)"""
+    CartItem.objects.bulk_create(
+        [
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["cart", "product"],
+        update_fields=["quantity"],
+    )
+
+
+def add_lines(cart, quantities):
+    """Add quantities on top of what the cart already holds.
+
+    Must run inside a transaction: the cart row stays locked until it
+    ends, so concurrent additions to one cart cannot lose each other's
+    quantities between the read and the upsert.
+    """
+    validate_products(quantities)
+    Cart.objects.select_for_update().filter(pk=cart.pk).values_list("pk").first()
+    existing = dict(
+        cart.cart_items.filter(product_id__in=quantities).values_list("product_id", "quantity")
+    )
+    upsert_lines(
+        cart,
+        {
+            product_id: existing.get(product_id, 0) + quantity
+            for product_id, quantity in quantities.items()
+        },
+    )
+
+
+def replace_lines(cart, quantities):
+    """Make the cart hold exactly the given quantities"""
+    validate_products(quantities)
+    cart.cart_items.exclude(product_id__in=quantities).delete()
+    if quantities:
+        upsert_lines(cart, quantities)
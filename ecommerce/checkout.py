@@ -0,0 +1,38 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Sum
+
+from .inventory import reserve
+from .models import Order, OrderItem
+
+
+CENTS = Decimal("0.01")
+
+
+def checkout(cart, status="created"):
+    """Turn a cart into an order with a fixed number of queries.
+
+    Loads the lines once, sums the total in SQL, reserves stock for every
+    line with one conditional UPDATE, bulk inserts the order items and
+    empties the cart. Must run inside a transaction so a short line rolls
+    everything back.
+    """
+    lines = dict(cart.cart_items.order_by("product_id").values_list("product_id", "quantity"))
+    if not lines:
+        raise Exception("Cart is empty.")
+
+    total = cart.cart_items.aggregate(
+        total=Sum(F("quantity") * F("product__price"), output_field=DecimalField())
+    )["total"]
+    order = Order.objects.create(
+        user_id=cart.user_id, status=status, total=total.quantize(CENTS)
+    )
+    reserve(order, lines)
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(order=order, product_id=product_id, quantity=quantity)
+            for product_id, quantity in lines.items()
+        ]
+    )
+    cart.cart_items.all().delete()
+    return order
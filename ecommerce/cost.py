@@ -0,0 +1,142 @@
+from typing import NamedTuple
+
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    get_named_type,
+    get_nullable_type,
+    is_leaf_type,
+    is_list_type,
+)
+from graphql.execution.values import get_argument_values, get_variable_values
+
+
+# Fields that cost more than a keyed lookup, by "Type.field". Other fields
+# weigh 1 if they return an object and 0 if they return a scalar.
+FIELD_WEIGHTS = {
+    "Query.products": 5,
+    "Query.searchProducts": 10,
+    "CartType.cartSummary": 2,
+    "Mutation.createOrder": 10,
+    "Mutation.createPayment": 10,
+    "Mutation.addToCartBatch": 5,
+    "Mutation.replaceCart": 5,
+}
+
+
+class QueryCost(NamedTuple):
+    cost: int
+    depth: int
+
+    def as_extension(self):
+        return {
+            "requested": self.cost,
+            "maximum": settings.GRAPHQL_MAX_COST,
+            "depth": self.depth,
+            "maxDepth": settings.GRAPHQL_MAX_DEPTH,
+        }
+
+    def error(self):
+        """Return the GraphQLError for a query over its limits, or None"""
+        if self.cost > settings.GRAPHQL_MAX_COST:
+            return GraphQLError(
+                f"Query cost {self.cost} exceeds the maximum of {settings.GRAPHQL_MAX_COST}."
+            )
+        if self.depth > settings.GRAPHQL_MAX_DEPTH:
+            return GraphQLError(
+                f"Query depth {self.depth} exceeds the maximum of {settings.GRAPHQL_MAX_DEPTH}."
+            )
+        return None
+
+
+class CostAnalysis:
+    """Walks an operation, multiplying each selection's cost by its page size.
+
+    ``first``/``last`` set the multiplier of connections and lists. Without
+    either, a connection counts RELAY_CONNECTION_MAX_LIMIT items, the page
+    it returns, and a plain list GRAPHQL_COST_DEFAULT_LIST_SIZE items.
+    Fragments count for every type they may apply to.
+    """
+
+    def __init__(self, schema, document, variables):
+        self.schema = schema
+        self.variables = variables
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+
+    def selection_set(self, parent_type, selection_set, depth, spread=()):
+        cost = 0
+        max_depth = depth
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                selection_cost, selection_depth = self.field(parent_type, selection, depth + 1)
+            else:
+                fragment, name = selection, None
+                if isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    fragment = self.fragments.get(name)
+                    if fragment is None or name in spread:
+                        continue
+                fragment_type = parent_type
+                if fragment.type_condition is not None:
+                    fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                selection_cost, selection_depth = self.selection_set(
+                    fragment_type, fragment.selection_set, depth, spread + (name,)
+                )
+            cost += selection_cost
+            max_depth = max(max_depth, selection_depth)
+        return cost, max_depth
+
+    def field(self, parent_type, node, depth):
+        name = node.name.value
+        field_def = getattr(parent_type, "fields", {}).get(name)
+        if field_def is None or name.startswith("__"):
+            return 0, depth
+
+        field_type = get_named_type(field_def.type)
+        weight = FIELD_WEIGHTS.get(
+            f"{parent_type.name}.{name}", 0 if is_leaf_type(field_type) else 1
+        )
+        if node.selection_set is None:
+            return weight, depth
+        cost, max_depth = self.selection_set(field_type, node.selection_set, depth)
+        return weight + self.multiplier(field_def, field_type, node) * cost, max_depth
+
+    def multiplier(self, field_def, field_type, node):
+        args = get_argument_values(field_def, node, self.variables)
+        for name in ("first", "last"):
+            if args.get(name) is not None:
+                return max(args[name], 0)
+        # A connection's size is counted once, on the field returning it
+        if node.name.value == "edges":
+            return 1
+        if "edges" in getattr(field_type, "fields", {}):
+            # Unpaginated connections return RELAY_CONNECTION_MAX_LIMIT rows
+            return graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        if is_list_type(get_nullable_type(field_def.type)):
+            return settings.GRAPHQL_COST_DEFAULT_LIST_SIZE
+        return 1
+
+
+def analyze(schema, document, operation, variables=None):
+    """Return the QueryCost of an operation, or None if its variables are invalid"""
+    variable_values = get_variable_values(
+        schema, operation.variable_definitions or (), variables or {}
+    )
+    if isinstance(variable_values, list):
+        return None
+    root_type = schema.get_root_type(operation.operation)
+    try:
+        cost, depth = CostAnalysis(schema, document, variable_values).selection_set(
+            root_type, operation.selection_set, 0
+        )
+    except GraphQLError:
+        return None
+    return QueryCost(cost, depth)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, post_save
+
+from .replicas import primary
+from .response_cache import get_cache
+
+
+EXACT = "exact"
+CACHED = "cached"
+APPROXIMATE = "approximate"
+
+COUNT_STRATEGIES = (EXACT, CACHED, APPROXIMATE)
+
+
+def count_queryset(queryset, strategy=EXACT):
+    """Count a filtered queryset with the given strategy"""
+    if isinstance(queryset, list):
+        return len(queryset)
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if strategy == CACHED:
+        return cached_count(queryset)
+    if strategy == APPROXIMATE:
+        return approximate_count(queryset)
+    return queryset.count()
+
+
+def _version_key(model):
+    return f"graphql:count-version:{model._meta.label_lower}"
+
+
+def _model_version(model):
+    cache = get_cache()
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_counts(model):
+    """Expire cached counts for model once the write commits.
+
+    Bulk writes that skip signals call this.
+    """
+
+    def bump():
+        cache = get_cache()
+        try:
+            cache.incr(_version_key(model))
+        except ValueError:
+            cache.set(_version_key(model), time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def cached_count(queryset):
+    """Exact count cached per filtered query until the model is written.
+
+    Counted on the primary, as a replica could still miss the write that
+    expired the previous count.
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    payload = json.dumps([sql, params, _model_version(queryset.model)], default=str)
+    key = "graphql:count:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    cache = get_cache()
+    total = cache.get(key)
+    if total is None:
+        with primary():
+            total = queryset.count()
+        cache.set(key, total, settings.GRAPHQL_COUNT_CACHE_TIMEOUT)
+    return total
+
+
+def approximate_count(queryset):
+    """Estimate a count without scanning the whole filtered set.
+
+    PostgreSQL uses the planner's row estimate. Other backends sample the
+    first matching rows in primary key order and extrapolate over the pk
+    range. Small results are always counted exactly.
+    """
+    threshold = settings.GRAPHQL_APPROXIMATE_COUNT_THRESHOLD
+    connection = connections[queryset.db]
+
+    if connection.vendor == "postgresql":
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        return queryset.count() if estimate <= threshold else estimate
+
+    sample = list(queryset.order_by("pk").values_list("pk", flat=True)[:threshold])
+    if len(sample) < threshold:
+        return len(sample)
+    bounds = queryset.model._default_manager.aggregate(low=Min("pk"), high=Max("pk"))
+    covered = sample[-1] - bounds["low"] + 1
+    span = bounds["high"] - bounds["low"] + 1
+    return round(len(sample) * span / covered)
+
+
+def expire_counts(sender, **kwargs):
+    """Signal receiver that expires cached counts when a tracked model is written"""
+    invalidate_counts(sender)
+
+
+def track_writes(model):
+    """Expire model's cached counts on every save and delete.
+
+    Receivers are connected per model, so models without cached counts keep
+    Django's fast delete path.
+    """
+    label = model._meta.label_lower
+    post_save.connect(expire_counts, sender=model, dispatch_uid=f"graphql_count_save_{label}")
+    post_delete.connect(
+        expire_counts, sender=model, dispatch_uid=f"graphql_count_delete_{label}"
+    )
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from graphql import ExecutionContext
+from graphql.execution.execute import get_field_def
+
+
+@lru_cache(maxsize=None)
+def _get_executor(workers):
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="graphql-sync")
+
+
+def _pooled(func, *args):
+    """Run a pool job between the connection cleanups a request would do.
+
+    Pool threads outlive requests, so their connections are dropped here
+    once unusable or older than CONN_MAX_AGE.
+    """
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def run_sync(func, *args):
+    """Await blocking code on the bounded GraphQL thread pool.
+
+    GRAPHQL_ASYNC_WORKERS sets the pool size; with 0 every call goes to
+    Django's thread-sensitive executor instead (one thread per request).
+    """
+    workers = settings.GRAPHQL_ASYNC_WORKERS
+    if not workers:
+        return sync_to_async(func)(*args)
+    executor = _get_executor(workers)
+    return sync_to_async(_pooled, thread_sensitive=False, executor=executor)(func, *args)
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class AsyncExecutionContext(ExecutionContext):
+    """Execution context for the async view.
+
+    Root fields with coroutine resolvers are awaited on the event loop and
+    only their selection sets are completed on the thread pool. Every other
+    root field is resolved and completed on the pool as a whole. Sync work of
+    one request runs one job at a time, as the request's loaders are not
+    thread-safe.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sync_lock = threading.Lock()
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if path.prev is None and _on_event_loop():
+            field_def = get_field_def(self.schema, parent_type, field_nodes[0])
+            if field_def is not None and not iscoroutinefunction(field_def.resolve):
+                return self.offload(
+                    super().execute_field, parent_type, source, field_nodes, path
+                )
+        return super().execute_field(parent_type, source, field_nodes, path)
+
+    def complete_value(self, return_type, field_nodes, info, path, result):
+        if path.prev is None and _on_event_loop():
+            return self.offload(
+                super().complete_value, return_type, field_nodes, info, path, result
+            )
+        return super().complete_value(return_type, field_nodes, info, path, result)
+
+    async def offload(self, func, *args):
+        """Run func on the pool, then await whatever it left pending"""
+        result = await run_sync(self._locked, func, *args)
+        if self.is_awaitable(result):
+            return await result
+        return result
+
+    def _locked(self, func, *args):
+        with self.sync_lock:
+            return func(*args)
@@ -0,0 +1,284 @@
+import csv
+import itertools
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import models
+
+from .filter import OrderFilter, PaymentFilter, ProductFilter
+from .models import OrderItem, Payment, Product
+
+
+class Export(NamedTuple):
+    """A model dumped one row per instance, ordered and resumed by key.
+
+    columns are (name, lookup path) pairs read with values_list, so only
+    those columns are selected. Rows are sliced with filterset, the same
+    FilterSet the API uses; when via is set it filters that relation
+    instead, e.g. the orders of exported order items.
+    """
+
+    model: type
+    filterset: type
+    key: str
+    columns: tuple
+    via: str = None
+
+    @property
+    def names(self):
+        return [name for name, _ in self.columns]
+
+    @property
+    def key_path(self):
+        return dict(self.columns)[self.key]
+
+    def fields(self):
+        """The model field behind each column, following relations"""
+        fields = []
+        for _, path in self.columns:
+            model = self.model
+            for part in path.split("__"):
+                field = model._meta.get_field(part)
+                model = field.related_model
+            fields.append(field.target_field if field.is_relation else field)
+        return fields
+
+    def queryset(self, data=None, after=None):
+        """The rows to export as tuples, after the key value after; raises on bad filters"""
+        filterset = self.filterset(data or {}, queryset=self.filterset._meta.model.objects.all())
+        if not filterset.is_valid():
+            raise Exception(f"Invalid filters: {_errors(filterset)}")
+        queryset = filterset.qs
+        if self.via:
+            queryset = self.model.objects.filter(
+                **{f"{self.via}__in": queryset.order_by().values("pk")}
+            )
+        if after is not None:
+            queryset = queryset.filter(**{f"{self.key_path}__gt": after})
+        return queryset.order_by(self.key_path).values_list(
+            *(path for _, path in self.columns)
+        )
+
+    def rows(self, data=None, after=None, chunk_size=None):
+        """Stream the rows, fetching chunk_size at a time"""
+        chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+        return self.queryset(data, after).iterator(chunk_size=chunk_size)
+
+
+EXPORTS = {
+    "products": Export(
+        Product,
+        ProductFilter,
+        key="id",
+        columns=(
+            ("id", "id"),
+            ("sku", "sku"),
+            ("name", "name"),
+            ("category_id", "category_id"),
+            ("category", "category__name"),
+            ("sub_category_id", "sub_category_id"),
+            ("description", "description"),
+            ("price", "price"),
+            ("amount_in_stock", "amount_in_stock"),
+            ("average_rating", "average_rating"),
+            ("rating_count", "rating_count"),
+            ("created_at", "created_at"),
+            ("updated_at", "updated_at"),
+        ),
+    ),
+    # One row per order item, carrying its order's columns
+    "orders": Export(
+        OrderItem,
+        OrderFilter,
+        key="item_id",
+        via="order",
+        columns=(
+            ("order_id", "order_id"),
+            ("user_id", "order__user_id"),
+            ("status", "order__status"),
+            ("total", "order__total"),
+            ("created_at", "order__created_at"),
+            ("item_id", "id"),
+            ("product_id", "product_id"),
+            ("sku", "product__sku"),
+            ("quantity", "quantity"),
+        ),
+    ),
+    "payments": Export(
+        Payment,
+        PaymentFilter,
+        key="id",
+        columns=(
+            ("id", "id"),
+            ("order_id", "order_id"),
+            ("user_id", "user_id"),
+            ("stripe_payment_intent", "stripe_payment_intent"),
+            ("amount", "amount"),
+            ("currency", "currency"),
+            ("status", "status"),
+            ("created_at", "created_at"),
+        ),
+    ),
+}
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _errors(filterset):
+    return "; ".join(
+        f"{field}: {error['message']}"
+        for field, errors in filterset.errors.get_json_data().items()
+        for error in errors
+    )
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+class _Buffer:
+    """Write-only file collecting output between drains.
+
+    tell() keeps counting across drains, as the Parquet writer records
+    file offsets in its footer.
+    """
+
+    closed = False
+
+    def __init__(self, empty):
+        self.empty = empty
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(data if isinstance(data, str) else bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = self.empty.join(self.parts)
+        self.parts = []
+        return data
+
+
+def write_csv(export, rows, chunk_size):
+    """CSV with a header line; timestamps are ISO 8601, NULL is empty"""
+    buffer = _Buffer("")
+    writer = csv.writer(buffer)
+    writer.writerow(export.names)
+    dates = [
+        index
+        for index, field in enumerate(export.fields())
+        if isinstance(field, models.DateTimeField)
+    ]
+    for chunk in _chunks(rows, chunk_size):
+        if dates:
+            chunk = [list(row) for row in chunk]
+            for row in chunk:
+                for index in dates:
+                    if row[index] is not None:
+                        row[index] = row[index].isoformat()
+        writer.writerows(chunk)
+        yield buffer.drain().encode()
+    yield buffer.drain().encode()
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__} as JSON")
+
+
+def write_jsonl(export, rows, chunk_size):
+    """One JSON object per line; decimals are strings to keep their precision"""
+    names = export.names
+    encoder = json.JSONEncoder(separators=(",", ":"), default=_json_default)
+    for chunk in _chunks(rows, chunk_size):
+        yield "".join(encoder.encode(dict(zip(names, row))) + "\n" for row in chunk).encode()
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("Parquet exports need pyarrow; install it with `pip install pyarrow`.")
+    return pyarrow, pyarrow.parquet
+
+
+def _arrow_type(pa, field):
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, models.IntegerField):
+        return pa.int64()
+    return pa.string()
+
+
+def write_parquet(export, rows, chunk_size):
+    """Parquet with one row group per chunk, streamed as each group is written"""
+    pa, pq = _pyarrow()
+    schema = pa.schema(
+        [(name, _arrow_type(pa, field)) for name, field in zip(export.names, export.fields())]
+    )
+    buffer = _Buffer(b"")
+    with pq.ParquetWriter(buffer, schema) as writer:
+        for chunk in _chunks(rows, chunk_size):
+            columns = [
+                pa.array(values, type=column_type)
+                for values, column_type in zip(zip(*chunk), schema.types)
+            ]
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "parquet": write_parquet}
+
+
+def stream_export(name, file_format, data=None, after=None, chunk_size=None):
+    """Return the byte chunks of an export, checking its arguments before any query runs.
+
+    data holds ProductFilter, OrderFilter or PaymentFilter parameters and
+    after resumes the export past that key value.
+    """
+    if name not in EXPORTS:
+        raise Exception(f"Unknown export {name!r}; choose from {', '.join(EXPORTS)}.")
+    if file_format not in WRITERS:
+        raise Exception(f"Unsupported export format {file_format!r}.")
+    if file_format == "parquet":
+        _pyarrow()
+    if after not in (None, ""):
+        try:
+            after = int(after)
+        except (TypeError, ValueError):
+            raise Exception(f"Invalid resume key {after!r}.")
+    else:
+        after = None
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    export = EXPORTS[name]
+    rows = export.rows(data, after, chunk_size)
+    return WRITERS[file_format](export, rows, chunk_size)
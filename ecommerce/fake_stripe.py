@@ -0,0 +1,187 @@
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+INTENT_PATH = re.compile(r"^/v1/payment_intents(?:/(?P<id>[\w-]+))?$")
+
+
+def make_event(event_type, data_object, event_id=None, created=None):
+    """Build a Stripe event body for webhook tests and benchmarks"""
+    return json.dumps(
+        {
+            "id": event_id or f"evt_fake_{uuid.uuid4().hex}",
+            "object": "event",
+            "type": event_type,
+            "created": int(time.time() if created is None else created),
+            "data": {"object": data_object},
+        }
+    )
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """Return the Stripe-Signature header Stripe would send with payload"""
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+class FakeStripeServer:
+    """Local stand-in for Stripe's PaymentIntent endpoints.
+
+    Replays the stored response for a repeated Idempotency-Key the way
+    Stripe does, answering 400 when the key comes back with different
+    parameters, and can add latency or fail requests so timeouts and
+    retries can be exercised offline. Use it as a context manager and
+    point STRIPE_API_BASE at ``url``.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.intents = {}
+        self.requests = 0
+        self._replies = {}
+        self._in_flight = set()
+        self._failures = []
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fail_next(self, count=1, status=500):
+        """Answer the next count requests with the given error status"""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _injected_failure(self):
+        with self._lock:
+            self.requests += 1
+            if self._failures:
+                return self._failures.pop(0)
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                return 500
+        return None
+
+    def create_intent(self, params, idempotency_key):
+        if idempotency_key:
+            with self._lock:
+                if idempotency_key in self._replies:
+                    status, intent, first_params = self._replies[idempotency_key]
+                    if params != first_params:
+                        return 400, _error(
+                            "idempotency_error",
+                            "Keys for idempotent requests can only be used with the same "
+                            "parameters they were first used with.",
+                        ), False
+                    return status, intent, True
+                if idempotency_key in self._in_flight:
+                    return 409, _error("idempotency_error", "Request already in progress."), False
+                self._in_flight.add(idempotency_key)
+
+        intent_id = f"pi_fake_{next(self._ids)}"
+        intent = {
+            "id": intent_id,
+            "object": "payment_intent",
+            "amount": int(params.get("amount", 0)),
+            "currency": params.get("currency", "usd"),
+            "status": "requires_payment_method",
+            "client_secret": f"{intent_id}_secret_fake",
+            "metadata": {
+                key[len("metadata["):-1]: value
+                for key, value in params.items()
+                if key.startswith("metadata[")
+            },
+        }
+        with self._lock:
+            self.intents[intent_id] = intent
+            if idempotency_key:
+                self._replies[idempotency_key] = (200, intent, params)
+                self._in_flight.discard(idempotency_key)
+        return 200, intent, False
+
+
+def _error(error_type, message):
+    return {"error": {"type": error_type, "message": message}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body, replayed=False):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Request-Id", f"req_fake_{id(body)}")
+        if replayed:
+            self.send_header("Idempotent-Replayed", "true")
+        try:
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out and hung up, as retry tests make it do
+            self.close_connection = True
+
+    def handle_request(self, method):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        params = dict(parse_qsl(self.rfile.read(length).decode())) if length else {}
+
+        if fake.latency:
+            time.sleep(fake.latency)
+        status = fake._injected_failure()
+        if status is not None:
+            return self.reply(status, _error("api_error", "Injected failure."))
+
+        match = INTENT_PATH.match(self.path.split("?")[0])
+        if match is None:
+            return self.reply(404, _error("invalid_request_error", "Unrecognized request URL."))
+        if method == "POST" and match["id"] is None:
+            return self.reply(*fake.create_intent(params, self.headers.get("Idempotency-Key")))
+        if method == "GET" and match["id"] in fake.intents:
+            return self.reply(200, fake.intents[match["id"]])
+        return self.reply(404, _error("invalid_request_error", "No such payment_intent."))
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
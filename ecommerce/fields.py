@@ -0,0 +1,286 @@
+import base64
+import json
+from functools import partial
+
+from django.db.models import Q, QuerySet
+from graphene.relay import PageInfo
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from graphql_relay import get_offset_with_default, offset_to_cursor
+
+from .counting import CACHED, COUNT_STRATEGIES, EXACT, track_writes
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
+
+
+class BatchedFilterConnectionField(DjangoFilterConnectionField):
+    """Filter connection that optimizes its queryset for the selection and
+    primes the request loaders with each page.
+
+    Nested relations resolved through ``get_loaders(info)`` return plain
+    lists; those are paginated as-is unless filter arguments were given.
+
+    Forward pages over a queryset never run COUNT(*); ``totalCount`` is
+    computed only when selected, using the ``total_count`` strategy
+    (exact, cached or approximate).
+    """
+
+    def __init__(self, type_, *args, total_count=EXACT, **kwargs):
+        if total_count not in COUNT_STRATEGIES:
+            raise ValueError(f"Unknown total_count strategy {total_count!r}.")
+        self.total_count = total_count
+        super().__init__(type_, *args, **kwargs)
+
+    def wrap_resolve(self, parent_resolver):
+        return self.with_total_count(super().wrap_resolve(parent_resolver))
+
+    def with_total_count(self, resolve):
+        """Tag the connections returned by resolve with this field's count strategy"""
+        strategy = self.total_count
+        if strategy == CACHED:
+            track_writes(self.model)
+
+        def resolve_with_total_count(root, info, **args):
+            connection = resolve(root, info, **args)
+            connection.total_count_strategy = strategy
+            return connection
+
+        return resolve_with_total_count
+
+    @classmethod
+    def resolve_queryset(
+        cls, connection, iterable, info, args, filtering_args, filterset_class
+    ):
+        if isinstance(iterable, list):
+            if not any(args.get(name) is not None for name in filtering_args):
+                return iterable
+            model = connection._meta.node._meta.model
+            iterable = model.objects.filter(pk__in=[obj.pk for obj in iterable])
+        queryset = super().resolve_queryset(
+            connection, iterable, info, args, filtering_args, filterset_class
+        )
+        return optimize_queryset(queryset, info)
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        iterable = maybe_queryset(iterable)
+        if (
+            not isinstance(iterable, QuerySet)
+            or args.get("last") is not None
+            or args.get("before") is not None
+        ):
+            return super().resolve_connection(connection, args, iterable, max_limit)
+
+        # Fetch one extra row to learn whether a next page exists
+        start = get_offset_with_default(args.get("after"), -1) + 1
+        start += args.pop("offset", None) or 0
+        first = args.get("first")
+        if first is None:
+            first = max_limit
+        if first is None:
+            nodes = list(iterable[start:])
+            has_next_page = False
+        else:
+            nodes = list(iterable[start : start + first + 1])
+            has_next_page = len(nodes) > first
+            nodes = nodes[:first]
+
+        edges = [
+            connection.Edge(node=node, cursor=offset_to_cursor(start + position))
+            for position, node in enumerate(nodes)
+        ]
+        connection = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=False,
+                has_next_page=has_next_page,
+            ),
+        )
+        connection.iterable = iterable
+        connection.length = None
+        return connection
+
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        connection = super().connection_resolver(
+            resolver,
+            connection,
+            default_manager,
+            queryset_resolver,
+            max_limit,
+            enforce_first_or_last,
+            root,
+            info,
+            **args,
+        )
+        get_loaders(info).prime(edge.node for edge in connection.edges)
+        return connection
+
+
+class KeysetFilterConnectionField(BatchedFilterConnectionField):
+    """Filter connection paginated by keyset instead of OFFSET.
+
+    Rows are ordered newest first by ``(sort_key, pk)``, or by the single
+    column a filterset ``orderBy`` names, and the cursor encodes that pair,
+    so every page is an indexed seek of
+    ``sort_key <= k AND (sort_key < k OR id < i)`` and no COUNT(*) runs
+    unless ``totalCount`` is selected.
+    """
+
+    def __init__(self, type_, *args, sort_key="created_at", **kwargs):
+        self.sort_key = sort_key
+        super().__init__(type_, *args, **kwargs)
+
+    def wrap_resolve(self, parent_resolver):
+        return self.with_total_count(
+            partial(
+                self.keyset_resolver,
+                self.resolver or parent_resolver,
+                self.connection_type,
+                self.get_manager(),
+                self.get_queryset_resolver(),
+                self.max_limit,
+                self.sort_key,
+            )
+        )
+
+    @classmethod
+    def keyset_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        sort_key,
+        root,
+        info,
+        **args,
+    ):
+        if args.get("offset") is not None:
+            raise Exception(f"`{info.field_name}` does not support offset pagination.")
+
+        first, last = args.get("first"), args.get("last")
+        for name, value in (("first", first), ("last", last)):
+            if value is not None and value < 0:
+                raise Exception(f"`{name}` must be a non-negative integer.")
+            if value is not None and max_limit and value > max_limit:
+                raise Exception(
+                    f"Requesting {value} records on the `{info.field_name}` "
+                    f"connection exceeds the `{name}` limit of {max_limit} records."
+                )
+        if first is None and last is None:
+            first = max_limit
+
+        # A filterset orderBy picks the keyset column; it defaults to newest first
+        descending = True
+        order_by = args.get("order_by")
+        if order_by:
+            fields = to_snake_case(order_by).split(",")
+            if len(fields) > 1:
+                raise Exception(f"`{info.field_name}` can only be ordered by one field.")
+            descending = fields[0].startswith("-")
+            sort_key = fields[0].lstrip("-")
+
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        queryset = queryset_resolver(connection, iterable, info, args)
+
+        nodes, has_previous_page, has_next_page = paginate_keyset(
+            queryset,
+            sort_key,
+            first=first,
+            after=args.get("after"),
+            last=last,
+            before=args.get("before"),
+            descending=descending,
+        )
+        edges = [
+            connection.Edge(node=node, cursor=encode_keyset_cursor(node, sort_key))
+            for node in nodes
+        ]
+        get_loaders(info).prime(nodes)
+        connection = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page,
+            ),
+        )
+        connection.iterable = queryset
+        connection.length = None
+        return connection
+
+
+def encode_keyset_cursor(instance, sort_key):
+    """Encode an instance's (sort key, pk) position as an opaque cursor"""
+    value = instance._meta.get_field(sort_key).value_to_string(instance)
+    payload = json.dumps([value, instance.pk]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_keyset_cursor(cursor, model, sort_key):
+    """Decode a cursor back into a (sort key value, pk) pair"""
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return model._meta.get_field(sort_key).to_python(value), pk
+    except Exception:
+        raise Exception("Invalid cursor.")
+
+
+def paginate_keyset(
+    queryset, sort_key, first=None, after=None, last=None, before=None, descending=True
+):
+    """Return (nodes, has_previous_page, has_next_page) for a keyset page"""
+    model = queryset.model
+    if descending:
+        queryset = queryset.order_by(f"-{sort_key}", "-pk")
+        forward, forward_or_equal, backward, backward_or_equal = "lt", "lte", "gt", "gte"
+    else:
+        queryset = queryset.order_by(sort_key, "pk")
+        forward, forward_or_equal, backward, backward_or_equal = "gt", "gte", "lt", "lte"
+
+    if after:
+        value, pk = decode_keyset_cursor(after, model, sort_key)
+        queryset = queryset.filter(
+            Q(**{f"{sort_key}__{forward_or_equal}": value})
+            & (Q(**{f"{sort_key}__{forward}": value}) | Q(**{f"pk__{forward}": pk}))
+        )
+    if before:
+        value, pk = decode_keyset_cursor(before, model, sort_key)
+        queryset = queryset.filter(
+            Q(**{f"{sort_key}__{backward_or_equal}": value})
+            & (Q(**{f"{sort_key}__{backward}": value}) | Q(**{f"pk__{backward}": pk}))
+        )
+
+    if first is not None:
+        nodes = list(queryset[: first + 1])
+        has_next_page = len(nodes) > first
+        nodes = nodes[:first]
+        has_previous_page = bool(after)
+        if last is not None:
+            has_previous_page = has_previous_page or len(nodes) > last
+            nodes = nodes[len(nodes) - last :] if last else []
+        return nodes, has_previous_page, has_next_page
+
+    nodes = list(queryset.reverse()[: last + 1])
+    has_previous_page = len(nodes) > last
+    nodes = nodes[:last][::-1]
+    return nodes, has_previous_page, bool(before)
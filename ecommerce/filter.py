@@ -1,5 +1,6 @@
 import django_filters
 from .models import (
+    LOW_STOCK_THRESHOLD,
     Category,
     Rating,
     SubCategory,
@@ -12,6 +13,7 @@ from .models import (
     Payment,
     Comment,
 ) 
+from .search import search_products
 
 
 class CategoryFilter(django_filters.FilterSet):
@@ -34,7 +36,7 @@ class SubCategoryFilter(django_filters.FilterSet):
 
 class ProductFilter(django_filters.FilterSet):
     '''Filter for Product model'''
-    name = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
+    name = django_filters.CharFilter(method='filter_name')
     category = django_filters.NumberFilter(field_name='category__id')
     subcategory = django_filters.NumberFilter(field_name='sub_category__id')
     price__gte = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
@@ -42,16 +44,25 @@ class ProductFilter(django_filters.FilterSet):
     stock__gte = django_filters.NumberFilter(field_name='amount_in_stock', lookup_expr='gte')
     stock__lte = django_filters.NumberFilter(field_name='amount_in_stock', lookup_expr='lte')
     low_stock = django_filters.BooleanFilter(method='filter_low_stock') 
+    min_rating = django_filters.NumberFilter(field_name='average_rating', lookup_expr='gte')
+    min_rating_count = django_filters.NumberFilter(field_name='rating_count', lookup_expr='gte')
+    order_by = django_filters.OrderingFilter(
+        fields=('average_rating', 'rating_count', 'price', 'created_at')
+    )
+
+    def filter_name(self, queryset, name, value):
+        '''Match word prefixes of the product name through the search index'''
+        return search_products(queryset, value, name_only=True, ranked=False)
 
     def filter_low_stock(self, queryset, name, value):
-        '''Filter products with low stock (less than 5)'''
+        '''Filter products with low stock (less than LOW_STOCK_THRESHOLD)'''
         if value:
-            return queryset.filter(amount_in_stock__lt=5)
+            return queryset.filter(amount_in_stock__lt=LOW_STOCK_THRESHOLD)
         return queryset
 
     class Meta:
         model = Product
-        fields = ['name', 'category', 'subcategory', 'price__gte', 'price__lte', 'stock__gte', 'stock__lte', 'low_stock']
+        fields = ['name', 'category', 'subcategory', 'price__gte', 'price__lte', 'stock__gte', 'stock__lte', 'low_stock', 'min_rating', 'min_rating_count']
 
 class ProductImageFilter(django_filters.FilterSet):
     '''Filter for ProductImage model'''
@@ -83,10 +94,14 @@ class CartItemFilter(django_filters.FilterSet):
 class OrderFilter(django_filters.FilterSet):
     '''Filter for Order model'''
     user_id = django_filters.NumberFilter(field_name='user__id')
-    status = django_filters.CharFilter(field_name='status', lookup_expr='iexact')
+    status = django_filters.CharFilter(method='filter_status')
     created_after = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
     created_before = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='lte')
 
+    def filter_status(self, queryset, name, value):
+        '''Case-insensitive status match that can still use the status indexes'''
+        return queryset.filter(status=value.lower())
+
     class Meta:
         model = Order
         fields = ['user_id', 'status', 'created_after', 'created_before']
@@ -129,12 +144,16 @@ class PaymentFilter(django_filters.FilterSet):
     '''Filter for Payment model'''
     user_id = django_filters.NumberFilter(field_name='user__id')
     order_id = django_filters.NumberFilter(field_name='order__id')
-    status = django_filters.CharFilter(field_name='status', lookup_expr='iexact')
+    status = django_filters.CharFilter(method='filter_status')
     amount__gte = django_filters.NumberFilter(field_name='amount', lookup_expr='gte')
     amount__lte = django_filters.NumberFilter(field_name='amount', lookup_expr='lte')
     created_after = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
     created_before = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='lte')
 
+    def filter_status(self, queryset, name, value):
+        '''Case-insensitive status match that can still use the status indexes'''
+        return queryset.filter(status=value.lower())
+
     class Meta:
         model = Payment
         fields = ['user_id', 'order_id', 'status', 'amount__gte', 'amount__lte', 'created_after', 'created_before']
@@ -0,0 +1,137 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path, PurePosixPath
+
+import django
+from django.conf import settings
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from . import response_cache
+from .models import ProductImage
+
+
+logger = logging.getLogger(__name__)
+
+# libavif's default speed encodes about 2.5x slower for a few percent smaller files
+SAVE_OPTIONS = {"avif": {"speed": 8}}
+
+
+def variant_name(name, width, image_format):
+    """Storage name of a derivative, next to the original"""
+    path = PurePosixPath(name)
+    return str(path.with_name(f"{path.stem}_{width}w.{image_format}"))
+
+
+def render_variants(path, name, widths, formats, quality):
+    """Write the resized derivatives of the image at path.
+
+    Runs in a worker process. Widths above the original's are capped at it,
+    and each size is resized from the next larger one. Returns
+    {format: {width: name}} with widths as strings.
+    """
+    with Image.open(path) as original:
+        # JPEGs decode straight at a reduced scale that still covers max(widths)
+        original.draft("RGB", (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+    variants = {image_format: {} for image_format in formats}
+    for width in sorted({min(width, image.width) for width in widths}, reverse=True):
+        if width != image.width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for image_format in formats:
+            variant = variant_name(name, width, image_format)
+            image.save(
+                Path(path).with_name(PurePosixPath(variant).name),
+                image_format,
+                quality=quality,
+                **SAVE_OPTIONS.get(image_format, {}),
+            )
+            variants[image_format][str(width)] = variant
+    return variants
+
+
+@lru_cache(maxsize=None)
+def _get_pool(workers):
+    # Spawned, not forked: the server process may be running threads
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    )
+
+
+def _job(name):
+    storage = ProductImage._meta.get_field("image").storage
+    return (
+        storage.path(name),
+        name,
+        settings.PRODUCT_IMAGE_WIDTHS,
+        settings.PRODUCT_IMAGE_FORMATS,
+        settings.PRODUCT_IMAGE_QUALITY,
+    )
+
+
+def _store(pk, name, variants):
+    # Skip rows whose image was replaced while the job ran
+    if ProductImage.objects.filter(pk=pk, image=name).update(variants=variants):
+        response_cache.invalidate(response_cache.PRODUCTS)
+
+
+def _finish(pk, name, future):
+    try:
+        variants = future.result()
+    except Exception:
+        logger.exception("Could not render variants of product image %s", pk)
+    else:
+        _store(pk, name, variants)
+
+
+def submit_variants(pk, name):
+    """Queue an image's derivatives on the process pool; returns the future.
+
+    With PRODUCT_IMAGE_WORKERS at 0 they are rendered right away and None
+    is returned.
+    """
+    workers = settings.PRODUCT_IMAGE_WORKERS
+    if not workers:
+        try:
+            _store(pk, name, render_variants(*_job(name)))
+        except Exception:
+            logger.exception("Could not render variants of product image %s", pk)
+        return None
+    future = _get_pool(workers).submit(render_variants, *_job(name))
+    future.add_done_callback(lambda future: _finish(pk, name, future))
+    return future
+
+
+def schedule_variants(image):
+    """Render an image's derivatives off the request once its row commits"""
+    pk, name = image.pk, image.image.name
+    transaction.on_commit(lambda: submit_variants(pk, name))
+
+
+def _variant_urls(image, image_format):
+    storage = image.image.storage
+    return sorted(
+        (int(width), storage.url(name))
+        for width, name in image.variants.get(image_format, {}).items()
+    )
+
+
+def thumbnail_url(image):
+    """URL of the smallest derivative, or of the original until it is rendered"""
+    urls = _variant_urls(image, settings.PRODUCT_IMAGE_FORMATS[0])
+    return urls[0][1] if urls else image.image.url
+
+
+def srcset(image, image_format=None):
+    """srcset attribute over an image's derivatives in one format"""
+    urls = _variant_urls(image, image_format or settings.PRODUCT_IMAGE_FORMATS[0])
+    if not urls:
+        return None
+    return ", ".join(f"{url} {width}w" for width, url in urls)
@@ -0,0 +1,243 @@
+import codecs
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import PurePath
+
+from django.conf import settings
+from django.db import transaction
+
+from . import inventory, response_cache
+from .cart_summary import invalidate_cart_prices
+from .counting import invalidate_counts
+from .models import Category, Product, SubCategory
+from .search import index_products
+
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+# Product fields an import overwrites when the sku already exists; the
+# file's amount_in_stock counts units still held by reservations, which
+# are taken back out after the upsert
+UPDATE_FIELDS = [
+    "name",
+    "category",
+    "sub_category",
+    "description",
+    "price",
+    "amount_in_stock",
+    "updated_at",
+]
+
+# Bad rows listed in a report; later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+SKU_MAX_LENGTH = Product._meta.get_field("sku").max_length
+NAME_MAX_LENGTH = Product._meta.get_field("name").max_length
+
+CENTS = Decimal("0.01")
+MAX_PRICE = Decimal("99999999.99")
+
+
+class BadRow(Exception):
+    """A row that cannot be imported; the import carries on without it"""
+
+
+def detect_format(name):
+    """Return "csv" or "jsonl" from a file name's extension"""
+    suffix = PurePath(name).suffix.lower()
+    if suffix not in FORMATS:
+        raise Exception(f"Cannot tell the format of {name}; use .csv or .jsonl.")
+    return FORMATS[suffix]
+
+
+def decode_lines(lines):
+    """Decode an iterable of UTF-8 byte lines, such as an uploaded file"""
+    return codecs.iterdecode(lines, "utf-8-sig")
+
+
+def read_rows(lines, file_format):
+    """Yield (line number, row) from CSV or JSONL text lines, one at a time.
+
+    A row is a dict, or a BadRow for a JSONL line that does not parse.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == "jsonl":
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, BadRow(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(row, dict):
+                row = BadRow("Expected a JSON object.")
+            yield number, row
+    else:
+        raise Exception(f"Unsupported import format {file_format!r}.")
+
+
+class CategoryLookup:
+    """Category and sub-category ids by name, loaded once per import"""
+
+    def __init__(self, create_missing=False):
+        self.create_missing = create_missing
+        self.created = False
+        self.categories = dict(Category.objects.values_list("name", "pk"))
+        self.sub_categories = {
+            (category_id, name): pk
+            for pk, category_id, name in SubCategory.objects.values_list(
+                "pk", "category_id", "name"
+            )
+        }
+
+    def category(self, name):
+        if name not in self.categories:
+            if not self.create_missing:
+                raise BadRow(f"Unknown category {name!r}.")
+            self.categories[name] = Category.objects.get_or_create(name=name)[0].pk
+            self.created = True
+        return self.categories[name]
+
+    def sub_category(self, category_id, name):
+        key = (category_id, name)
+        if key not in self.sub_categories:
+            if not self.create_missing:
+                raise BadRow(f"Unknown sub-category {name!r}.")
+            self.sub_categories[key] = SubCategory.objects.get_or_create(
+                category_id=category_id, name=name
+            )[0].pk
+            self.created = True
+        return self.sub_categories[key]
+
+
+class ImportReport:
+    """Counts of an import, and the first MAX_REPORTED_ERRORS bad rows"""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.bad_rows = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.bad_rows += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed or time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+
+def _text(row, key, required=False, max_length=None):
+    value = row.get(key)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise BadRow(f"Missing {key}.")
+    if max_length and len(value) > max_length:
+        raise BadRow(f"{key} is longer than {max_length} characters.")
+    return value
+
+
+class ProductImporter:
+    """Upserts products by sku from parsed rows, batch_size per statement.
+
+    Each batch is one bulk_create(update_conflicts=True) and its search
+    index rows, committed together; a later row with the same sku wins.
+    Bulk writes skip signals, so cached counts, responses and cart prices
+    are invalidated once at the end.
+    """
+
+    def __init__(
+        self, batch_size=None, create_missing=False, progress=None, progress_every=10_000
+    ):
+        self.batch_size = batch_size or settings.PRODUCT_IMPORT_BATCH_SIZE
+        self.lookup = CategoryLookup(create_missing)
+        self.progress = progress
+        self.progress_every = progress_every
+
+    def run(self, rows):
+        report = ImportReport()
+        batch = {}
+        for line, row in rows:
+            report.rows += 1
+            try:
+                product = self.product(row)
+            except BadRow as e:
+                report.add_error(line, str(e))
+            else:
+                report.imported += 1
+                batch[product.sku] = product
+                if len(batch) >= self.batch_size:
+                    self.write(batch)
+                    batch = {}
+            if self.progress and report.rows % self.progress_every == 0:
+                self.progress(report)
+        self.write(batch)
+        report.elapsed = time.perf_counter() - report.started
+
+        if report.imported:
+            invalidate_counts(Product)
+            response_cache.invalidate(response_cache.PRODUCTS)
+            invalidate_cart_prices()
+        if self.lookup.created:
+            invalidate_counts(Category)
+            invalidate_counts(SubCategory)
+            response_cache.invalidate(response_cache.CATEGORIES)
+        return report
+
+    def product(self, row):
+        """Build the unsaved Product of a row, or raise BadRow"""
+        if isinstance(row, BadRow):
+            raise row
+        sku = _text(row, "sku", required=True, max_length=SKU_MAX_LENGTH)
+        name = _text(row, "name", required=True, max_length=NAME_MAX_LENGTH)
+        category_id = self.lookup.category(_text(row, "category", required=True))
+        sub_category = _text(row, "sub_category")
+        sub_category_id = sub_category and self.lookup.sub_category(category_id, sub_category)
+
+        try:
+            price = Decimal(_text(row, "price", required=True)).quantize(CENTS)
+        except InvalidOperation:
+            raise BadRow(f"Invalid price {row.get('price')!r}.")
+        if not 0 <= price <= MAX_PRICE:
+            raise BadRow(f"Price {price} is out of range.")
+        try:
+            amount_in_stock = int(_text(row, "amount_in_stock") or 0)
+        except ValueError:
+            raise BadRow(f"Invalid amount_in_stock {row.get('amount_in_stock')!r}.")
+        if amount_in_stock < 0:
+            raise BadRow("amount_in_stock cannot be negative.")
+
+        return Product(
+            sku=sku,
+            name=name,
+            category_id=category_id,
+            sub_category_id=sub_category_id or None,
+            description=_text(row, "description"),
+            price=price,
+            amount_in_stock=amount_in_stock,
+        )
+
+    def write(self, batch):
+        if not batch:
+            return
+        with transaction.atomic():
+            products = Product.objects.bulk_create(
+                list(batch.values()),
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=UPDATE_FIELDS,
+            )
+            product_ids = [product.pk for product in products]
+            inventory.subtract_held(product_ids)
+            index_products(product_ids)
@@ -0,0 +1,217 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import response_cache
+from .counting import invalidate_counts
+from .models import Order, Product, StockReservation
+
+
+logger = logging.getLogger(__name__)
+
+HELD = "held"
+COMMITTED = "committed"
+RELEASED = "released"
+
+
+def _per_product(quantities):
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()]
+    )
+
+
+def _stock_changed():
+    """Expire cached counts and, once the write commits, cached product responses"""
+    invalidate_counts(Product)
+    response_cache.invalidate(response_cache.PRODUCTS)
+
+
+class _ShortStock(Exception):
+    pass
+
+
+def take_stock(quantities):
+    """Decrement {product_id: quantity} in one conditional UPDATE.
+
+    ``amount_in_stock >= quantity`` is checked by the UPDATE itself, so
+    concurrent buyers can never drive stock negative. When any product is
+    short the savepoint is rolled back and False is returned.
+    """
+    requested = _per_product(quantities)
+    try:
+        with transaction.atomic():
+            updated = Product.objects.filter(
+                pk__in=quantities, amount_in_stock__gte=requested
+            ).update(
+                amount_in_stock=F("amount_in_stock") - requested, updated_at=timezone.now()
+            )
+            if updated != len(quantities):
+                raise _ShortStock
+    except _ShortStock:
+        return False
+    _stock_changed()
+    return True
+
+
+def return_stock(quantities):
+    """Add {product_id: quantity} back to stock in one UPDATE"""
+    if quantities:
+        Product.objects.filter(pk__in=quantities).update(
+            amount_in_stock=F("amount_in_stock") + _per_product(quantities),
+            updated_at=timezone.now(),
+        )
+        _stock_changed()
+
+
+def subtract_held(product_ids):
+    """Take stock still held by reservations out of freshly set stock levels.
+
+    For counts that include held units, e.g. a supplier's stock file;
+    must run in the transaction that set them.
+    """
+    held = (
+        StockReservation.objects.filter(product=OuterRef("pk"), status=HELD)
+        .values("product")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    updated = Product.objects.filter(
+        pk__in=StockReservation.objects.filter(
+            product_id__in=product_ids, status=HELD
+        ).values("product_id")
+    ).update(amount_in_stock=Greatest(F("amount_in_stock") - Subquery(held), 0))
+    if updated:
+        _stock_changed()
+    return updated
+
+
+def _short_product(quantities):
+    requested = _per_product(quantities)
+    short = (
+        Product.objects.filter(pk__in=quantities, amount_in_stock__lt=requested)
+        .order_by("pk")
+        .values_list("name", flat=True)
+        .first()
+    )
+    if short is None:
+        return Exception("Product does not exist.")
+    return Exception(f"Insufficient stock for product {short}.")
+
+
+def reserve(order, quantities, ttl=None):
+    """Hold stock for an order until its payment commits or releases it.
+
+    Must run inside a transaction. When stock is short, reservations that
+    have already expired on those products are released and the
+    decrement is retried once before giving up.
+    """
+    if not take_stock(quantities):
+        if not release_expired(product_ids=list(quantities)) or not take_stock(quantities):
+            raise _short_product(quantities)
+
+    ttl = settings.INVENTORY_RESERVATION_TTL if ttl is None else ttl
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    return StockReservation.objects.bulk_create(
+        [
+            StockReservation(
+                order=order, product_id=product_id, quantity=quantity, expires_at=expires_at
+            )
+            for product_id, quantity in quantities.items()
+        ]
+    )
+
+
+def _release(reservations):
+    """Release the held reservations in a queryset, returning stock once"""
+    with transaction.atomic():
+        held = list(
+            reservations.select_for_update()
+            .filter(status=HELD)
+            .values_list("pk", "order_id", "product_id", "quantity")
+        )
+        if not held:
+            return 0
+        StockReservation.objects.filter(
+            pk__in=[pk for pk, _, _, _ in held], status=HELD
+        ).update(status=RELEASED)
+
+        quantities = Counter()
+        for _, _, product_id, quantity in held:
+            quantities[product_id] += quantity
+        return_stock(quantities)
+
+        Order.objects.filter(
+            pk__in={order_id for _, order_id, _, _ in held}, status__in=("created", "pending")
+        ).update(status="cancelled")
+        return len(held)
+
+
+def release_order(order):
+    """Return an order's held stock, e.g. when its payment fails"""
+    return _release(order.reservations.all())
+
+
+def release_expired(now=None, product_ids=None):
+    """Release every held reservation past its expiry; returns how many"""
+    reservations = StockReservation.objects.filter(
+        status=HELD, expires_at__lte=now or timezone.now()
+    )
+    if product_ids is not None:
+        reservations = reservations.filter(product_id__in=product_ids)
+    return _release(reservations)
+
+
+def commit_order(order):
+    """Make an order's reservations permanent once its payment succeeds.
+
+    Reservations that expired before the payment landed have returned their
+    stock, so it is taken again; an exception is raised if it has since
+    been sold to someone else.
+    """
+    with transaction.atomic():
+        reservations = order.reservations.select_for_update()
+        released = Counter()
+        for product_id, quantity in reservations.filter(status=RELEASED).values_list(
+            "product_id", "quantity"
+        ):
+            released[product_id] += quantity
+        if released and not take_stock(released):
+            raise _short_product(released)
+        return reservations.exclude(status=COMMITTED).update(status=COMMITTED)
+
+
+def release_orders(order_ids):
+    """release_order for many orders with one set of queries"""
+    return _release(StockReservation.objects.filter(order_id__in=order_ids))
+
+
+def commit_orders(order_ids):
+    """commit_order for many orders; returns the ids that could be committed.
+
+    Held reservations are committed with one UPDATE. Orders with an expired
+    hold go through commit_order one by one, and are left out (and logged)
+    when their stock has since been sold.
+    """
+    with transaction.atomic():
+        reservations = StockReservation.objects.select_for_update().filter(
+            order_id__in=order_ids
+        )
+        expired = set(reservations.filter(status=RELEASED).values_list("order_id", flat=True))
+        reservations.filter(status=HELD).exclude(order_id__in=expired).update(status=COMMITTED)
+
+        committed = set(order_ids) - expired
+        for order in Order.objects.filter(pk__in=expired):
+            try:
+                with transaction.atomic():
+                    commit_order(order)
+            except Exception:
+                logger.exception("Could not restock paid order %s", order.pk)
+            else:
+                committed.add(order.pk)
+        return committed
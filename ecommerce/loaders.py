@@ -0,0 +1,138 @@
+from collections import defaultdict
+
+from django.db import models
+
+
+class DataLoader:
+    """Request-scoped loader that fetches every queued key in one batch"""
+
+    def __init__(self, batch_load_fn):
+        self.batch_load_fn = batch_load_fn
+        self._cache = {}
+        self._queue = []
+
+    def prime(self, keys):
+        """Queue keys so they are fetched together with the next load"""
+        for key in keys:
+            if key is not None and key not in self._cache:
+                self._queue.append(key)
+
+    def load(self, key):
+        """Return the value for key, loading all queued keys if it is missing"""
+        if key is None:
+            return None
+        if key not in self._cache:
+            self._queue.append(key)
+            self.dispatch()
+        return self._cache[key]
+
+    def dispatch(self):
+        """Run the batch function once for every queued key"""
+        keys = list(dict.fromkeys(k for k in self._queue if k not in self._cache))
+        self._queue = []
+        if keys:
+            self._cache.update(zip(keys, self.batch_load_fn(keys)))
+
+
+class Loaders:
+    """Registry of relation loaders for a single GraphQL request.
+
+    Every list of instances handed to ``prime`` queues its keys on the
+    loaders of that model, so the first relation resolved on a page loads
+    the relation for the whole page with one ``IN (...)`` query.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._primed = defaultdict(list)
+
+    def load(self, instance, field_name):
+        """Load a forward or reverse relation of instance through its loader.
+
+        Relations already fetched by select_related/prefetch_related are
+        returned from the instance without touching the loader.
+        """
+        model = type(instance)
+        field = model._meta.get_field(field_name)
+        if self._is_cached(instance, field):
+            if isinstance(field, models.ManyToOneRel):
+                return self.prime(getattr(instance, field.get_accessor_name()).all())
+            return getattr(instance, field.name)
+        return self._get_loader(model, field).load(self._key(instance, field))
+
+    def prime(self, instances):
+        """Register resolved instances so their relations load in one batch"""
+        instances = [instance for instance in instances if instance is not None]
+        by_model = defaultdict(list)
+        for instance in instances:
+            by_model[type(instance)].append(instance)
+
+        for model, group in by_model.items():
+            self._primed[model].extend(group)
+            for (loader_model, _), (field, loader) in self._loaders.items():
+                if loader_model is model:
+                    self._prime_loader(loader, field, group)
+        return instances
+
+    def _get_loader(self, model, field):
+        key = (model, field.name)
+        if key not in self._loaders:
+            if isinstance(field, models.ForeignKey):
+                batch_load_fn = self._forward_batch(field)
+            elif isinstance(field, models.ManyToOneRel):
+                batch_load_fn = self._reverse_batch(field)
+            else:
+                raise ValueError(f"{model.__name__}.{field.name} is not batchable.")
+            loader = DataLoader(batch_load_fn)
+            self._prime_loader(loader, field, self._primed[model])
+            self._loaders[key] = (field, loader)
+        return self._loaders[key][1]
+
+    def _prime_loader(self, loader, field, instances):
+        loader.prime(
+            self._key(instance, field)
+            for instance in instances
+            if not self._is_cached(instance, field)
+        )
+
+    @staticmethod
+    def _is_cached(instance, field):
+        if isinstance(field, models.ManyToOneRel):
+            prefetched = getattr(instance, "_prefetched_objects_cache", {})
+            return field.get_accessor_name() in prefetched
+        return field.is_cached(instance)
+
+    @staticmethod
+    def _key(instance, field):
+        if isinstance(field, models.ManyToOneRel):
+            return instance.pk
+        return getattr(instance, field.attname)
+
+    def _forward_batch(self, field):
+        def batch_load(keys):
+            objects = field.related_model._default_manager.in_bulk(keys)
+            self.prime(objects.values())
+            return [objects.get(key) for key in keys]
+
+        return batch_load
+
+    def _reverse_batch(self, rel):
+        def batch_load(keys):
+            children = rel.related_model._default_manager.filter(
+                **{f"{rel.field.name}__in": keys}
+            ).order_by("pk")
+            grouped = defaultdict(list)
+            for child in self.prime(children):
+                grouped[getattr(child, rel.field.attname)].append(child)
+            return [grouped.get(key, []) for key in keys]
+
+        return batch_load
+
+
+def get_loaders(info):
+    """Return the loader registry attached to the current request"""
+    loaders = getattr(info.context, "loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        info.context.loaders = loaders
+    return loaders
@@ -0,0 +1,252 @@
+import asyncio
+import io
+import json
+import random
+import statistics
+import threading
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ecommerce import middleware
+from ecommerce.fake_stripe import FakeStripeServer
+from ecommerce.models import Cart, Category, Order, Product, User
+
+
+READ = """
+query ($id: Int!) {
+  productById(id: $id) { id name price category { name } }
+  cart { id }
+}
+"""
+
+PAYMENT = """
+mutation ($input: PaymentInput!) {
+  createPayment(input: $input) { ok payment { id status } }
+}
+"""
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/s and p99 latency of the WSGI and ASGI GraphQL views "
+        "under mixed read/payment traffic, with Stripe served by the local fake "
+        "(uses the configured database; cleans up after)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=600)
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="WSGI worker threads, and GRAPHQL_ASYNC_WORKERS for ASGI",
+        )
+        parser.add_argument("--payment-share", type=float, default=0.2)
+        parser.add_argument(
+            "--payment-latency", type=float, default=200, help="Stripe delay in ms"
+        )
+        parser.add_argument("--products", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not 0 <= options["payment_share"] <= 1:
+            raise CommandError("--payment-share must be between 0 and 1.")
+
+        category = Category.objects.create(name="ASGI benchmark")
+        products = Product.objects.bulk_create(
+            [
+                Product(name=f"Item {index}", category=category, price="9.99")
+                for index in range(options["products"])
+            ]
+        )
+        user = User.objects.create_user(
+            email="asgi-benchmark@example.com", username="asgi-benchmark", password="benchmark"
+        )
+        Cart.objects.create(user=user)
+        token = str(RefreshToken.for_user(user).access_token)
+
+        rng = random.Random(options["seed"])
+        bodies = []
+        for _ in range(options["requests"]):
+            if rng.random() < options["payment_share"]:
+                # One order per payment, so no two requests share an idempotency key
+                order = Order.objects.create(user=user, status="pending", total="9.99")
+                variables = {
+                    "input": {
+                        "userId": user.pk,
+                        "orderId": order.pk,
+                        "stripePaymentIntent": "",
+                        "amount": "9.99",
+                        "currency": "usd",
+                        "status": "pending",
+                    }
+                }
+                bodies.append(("payment", json.dumps({"query": PAYMENT, "variables": variables})))
+            else:
+                variables = {"id": rng.choice(products).pk}
+                bodies.append(("read", json.dumps({"query": READ, "variables": variables})))
+
+        self.stdout.write(
+            f"{'server':>6} {'req/s':>8} {'read p50':>9} {'read p99':>9} "
+            f"{'pay p50':>8} {'pay p99':>8} {'errors':>7}"
+        )
+        try:
+            server = FakeStripeServer(latency=options["payment_latency"] / 1000)
+            with server, override_settings(
+                GRAPHQL_ASYNC_WORKERS=options["threads"],
+                STRIPE_SECRET_KEY="sk_test_benchmark",
+                STRIPE_API_BASE=server.url,
+            ):
+                for name, run in (("wsgi", self.run_wsgi), ("asgi", self.run_asgi)):
+                    middleware.user_cache.clear()
+                    started = time.perf_counter()
+                    results = run(bodies, token, options)
+                    self.report(name, results, time.perf_counter() - started)
+        finally:
+            user.delete()
+            category.delete()
+
+    def report(self, name, results, elapsed):
+        latencies = {"read": [], "payment": []}
+        errors = 0
+        for kind, status, payload, latency in results:
+            latencies[kind].append(latency * 1000)
+            if status != 200 or b'"errors"' in payload:
+                errors += 1
+
+        def stats(values):
+            if not values:
+                return f"{'-':>8} {'-':>8}"
+            return f"{statistics.median(values):>8.1f} {percentile(values, 0.99):>8.1f}"
+
+        self.stdout.write(
+            f"{name:>6} {len(results) / elapsed:>8.1f}  {stats(latencies['read'])} "
+            f"{stats(latencies['payment'])} {errors:>7}"
+        )
+
+    def run_wsgi(self, bodies, token, options):
+        """Closed loop of clients against a server with a fixed thread count"""
+        application = get_wsgi_application()
+        server_threads = threading.Semaphore(options["threads"])
+        pending = iter(bodies)
+        lock = threading.Lock()
+        results = []
+
+        def call(body):
+            encoded = body.encode()
+            environ = {
+                "REQUEST_METHOD": "POST",
+                "PATH_INFO": "/graphql-api/",
+                "QUERY_STRING": "",
+                "SERVER_NAME": "localhost",
+                "SERVER_PORT": "80",
+                "HTTP_HOST": "localhost",
+                "HTTP_AUTHORIZATION": f"Bearer {token}",
+                "CONTENT_TYPE": "application/json",
+                "CONTENT_LENGTH": str(len(encoded)),
+                "wsgi.input": io.BytesIO(encoded),
+                "wsgi.url_scheme": "http",
+                "wsgi.errors": io.StringIO(),
+            }
+            status = []
+            response = application(environ, lambda line, headers, exc_info=None: status.append(line))
+            try:
+                payload = b"".join(response)
+            finally:
+                response.close()
+            return int(status[0].split()[0]), payload
+
+        def client():
+            while True:
+                with lock:
+                    item = next(pending, None)
+                if item is None:
+                    return
+                kind, body = item
+                started = time.perf_counter()
+                with server_threads:
+                    status, payload = call(body)
+                with lock:
+                    results.append((kind, status, payload, time.perf_counter() - started))
+
+        clients = [threading.Thread(target=client) for _ in range(options["concurrency"])]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return results
+
+    def run_asgi(self, bodies, token, options):
+        """Closed loop of clients against the async view on one event loop"""
+        application = get_asgi_application()
+
+        async def call(body):
+            encoded = body.encode()
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "POST",
+                "scheme": "http",
+                "path": "/graphql-api/async/",
+                "raw_path": b"/graphql-api/async/",
+                "root_path": "",
+                "query_string": b"",
+                "headers": [
+                    (b"host", b"localhost"),
+                    (b"authorization", f"Bearer {token}".encode()),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(encoded)).encode()),
+                ],
+                "client": ("127.0.0.1", 0),
+                "server": ("localhost", 80),
+            }
+            request_sent = False
+            finished = asyncio.Event()
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {"type": "http.request", "body": encoded, "more_body": False}
+                await finished.wait()
+                return {"type": "http.disconnect"}
+
+            status, chunks = [], []
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+                elif message["type"] == "http.response.body":
+                    chunks.append(message.get("body", b""))
+                    if not message.get("more_body"):
+                        finished.set()
+
+            await application(scope, receive, send)
+            return status[0], b"".join(chunks)
+
+        async def main():
+            pending = iter(bodies)
+            results = []
+
+            async def client():
+                for kind, body in pending:
+                    started = time.perf_counter()
+                    status, payload = await call(body)
+                    results.append((kind, status, payload, time.perf_counter() - started))
+
+            await asyncio.gather(*(client() for _ in range(options["concurrency"])))
+            return results
+
+        return asyncio.run(main())
@@ -0,0 +1,72 @@
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from ecommerce.models import Cart, CartItem, Category, Product, User
+from ecommerceApiProject.schema import schema
+
+
+CREATE_ORDER = """
+mutation { createOrder(status: "created") { ok order { id total } } }
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Time CreateOrder and count its queries as the cart grows "
+        "(all writes are rolled back)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1, 5, 10, 30, 100, 300]
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'lines':>6} {'queries':>8} {'median ms':>10}")
+        with transaction.atomic():
+            category = Category.objects.create(name="Checkout benchmark")
+            products = Product.objects.bulk_create(
+                [
+                    Product(
+                        name=f"Item {index}",
+                        category=category,
+                        price="9.99",
+                        amount_in_stock=1_000_000,
+                    )
+                    for index in range(max(options["sizes"]))
+                ]
+            )
+            user = User.objects.create_user(
+                email="checkout-benchmark@example.com",
+                username="checkout-benchmark",
+                password="benchmark",
+            )
+            cart = Cart.objects.create(user=user)
+
+            for size in options["sizes"]:
+                timings, queries = [], 0
+                for _ in range(options["repeat"]):
+                    CartItem.objects.bulk_create(
+                        [
+                            CartItem(cart=cart, product=product, quantity=2)
+                            for product in products[:size]
+                        ]
+                    )
+                    context = SimpleNamespace(user=user, _jwt_authenticated=True)
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        result = schema.execute(CREATE_ORDER, context_value=context)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    if result.errors:
+                        raise result.errors[0]
+                    queries = len(captured)
+                self.stdout.write(
+                    f"{size:>6} {queries:>8} {statistics.median(timings):>10.2f}"
+                )
+            transaction.set_rollback(True)
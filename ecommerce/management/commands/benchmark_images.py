@@ -0,0 +1,104 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from PIL import Image, ImageDraw
+
+from ecommerce.images import _get_pool, submit_variants
+from ecommerce.models import Category, Product, ProductImage
+
+
+def make_photo(path, width, height, rng):
+    """Write a JPEG with enough detail to compress like a product photo"""
+    image = Image.radial_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(200):
+        x, y = rng.randrange(width), rng.randrange(height)
+        size = rng.randrange(10, width // 4)
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x, y, x + size, y + size), fill=colour)
+    noise = Image.effect_noise((width, height), 24).convert("RGB")
+    Image.blend(image, noise, 0.15).save(path, "JPEG", quality=90)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure bulk product image ingestion with derivatives rendered inline "
+        "and on the process pool (writes to a temporary MEDIA_ROOT; uses the "
+        "configured database and cleans up after)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=24)
+        parser.add_argument("--width", type=int, default=2400)
+        parser.add_argument("--height", type=int, default=1800)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        category = Category.objects.create(name="Image benchmark")
+        product = Product.objects.create(name="Photographed", category=category, price="1.00")
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root
+            ):
+                sources = Path(media_root) / "sources"
+                sources.mkdir()
+                for index in range(options["images"]):
+                    make_photo(
+                        sources / f"photo{index}.jpg", options["width"], options["height"], rng
+                    )
+
+                self.stdout.write(
+                    f"{'mode':>8} {'images/s':>9} {'request p50 ms':>15} {'request p99 ms':>15}"
+                )
+                for mode, workers in (("inline", 0), ("pool", options["workers"])):
+                    with override_settings(PRODUCT_IMAGE_WORKERS=workers):
+                        if workers:
+                            list(_get_pool(workers).map(abs, range(workers)))
+                        self.run(mode, product, sorted(sources.iterdir()))
+
+                self.report_sizes(product)
+        finally:
+            category.delete()
+
+    def run(self, mode, product, paths):
+        latencies, ids = [], []
+        started = time.perf_counter()
+        for path in paths:
+            request_started = time.perf_counter()
+            with path.open("rb") as source:
+                product_image = ProductImage.objects.create(
+                    product=product, image=File(source, name=path.name)
+                )
+            submit_variants(product_image.pk, product_image.image.name)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            ids.append(product_image.pk)
+        while ProductImage.objects.filter(pk__in=ids, variants={}).exists():
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+
+        ordered = sorted(latencies)
+        self.stdout.write(
+            f"{mode:>8} {len(paths) / elapsed:>9.1f} {statistics.median(latencies):>15.1f} "
+            f"{ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]:>15.1f}"
+        )
+
+    def report_sizes(self, product):
+        sizes = {}
+        for product_image in ProductImage.objects.filter(product=product):
+            storage = product_image.image.storage
+            sizes.setdefault("original", []).append(storage.size(product_image.image.name))
+            for image_format, names in product_image.variants.items():
+                for width, name in names.items():
+                    sizes.setdefault(f"{width}w {image_format}", []).append(storage.size(name))
+        self.stdout.write("\nmean bytes per image")
+        for label, values in sizes.items():
+            self.stdout.write(f"{label:>14} {statistics.mean(values) / 1024:>9.1f} KiB")
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from ecommerce.checkout import checkout
+from ecommerce.models import (
+    Cart,
+    CartItem,
+    Category,
+    Order,
+    Product,
+    StockReservation,
+    User,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Race concurrent checkouts for one low-stock product and verify that "
+        "nothing is oversold (uses the configured database; cleans up after)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stock", type=int, default=200)
+        parser.add_argument("--buyers", type=int, default=400)
+        parser.add_argument(
+            "--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32]
+        )
+
+    def handle(self, *args, **options):
+        stock, buyers = options["stock"], options["buyers"]
+        category = Category.objects.create(name="Inventory benchmark")
+        product = Product.objects.create(
+            name="Hot SKU", category=category, price="19.99", amount_in_stock=stock
+        )
+        users = User.objects.bulk_create(
+            [
+                User(email=f"inventory-benchmark-{index}@example.com", username=f"ib{index}")
+                for index in range(buyers)
+            ]
+        )
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+
+        self.stdout.write(
+            f"{'threads':>7} {'sold':>6} {'refused':>8} {'left':>6} {'oversold':>9} {'checkouts/s':>12}"
+        )
+        try:
+            for threads in options["threads"]:
+                Product.objects.filter(pk=product.pk).update(amount_in_stock=stock)
+                CartItem.objects.bulk_create(
+                    [CartItem(cart=cart, product=product, quantity=1) for cart in carts]
+                )
+                sold, refused, elapsed = self.race(carts, threads)
+
+                left = Product.objects.get(pk=product.pk).amount_in_stock
+                reserved = StockReservation.objects.filter(product=product).count()
+                oversold = max(0, sold - stock) + max(0, -left)
+                self.stdout.write(
+                    f"{threads:>7} {sold:>6} {refused:>8} {left:>6} {oversold:>9} "
+                    f"{buyers / elapsed:>12.1f}"
+                )
+                if oversold or sold + left != stock or reserved != sold:
+                    raise CommandError(f"Inventory invariant broken with {threads} threads.")
+
+                Order.objects.filter(user__in=users).delete()
+                CartItem.objects.filter(product=product).delete()
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            category.delete()
+
+    def race(self, carts, threads):
+        pending = queue.Queue()
+        for cart in carts:
+            pending.put(cart)
+        results = {"sold": 0, "refused": 0}
+        lock = threading.Lock()
+
+        def buyer():
+            try:
+                while True:
+                    try:
+                        cart = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        with transaction.atomic():
+                            checkout(cart)
+                        outcome = "sold"
+                    except Exception as e:
+                        if not str(e).startswith("Insufficient stock"):
+                            raise
+                        outcome = "refused"
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buyer) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results["sold"], results["refused"], time.perf_counter() - started
@@ -0,0 +1,372 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from graphene_django.settings import graphene_settings
+from graphene_django.views import instantiate_middleware
+from graphql import execute, get_operation_ast
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ecommerce import middleware
+from ecommerce.cost import analyze
+from ecommerce.fake_stripe import FakeStripeServer
+from ecommerce.models import Cart, Category, Order, Product, SubCategory
+from ecommerce.persisted_queries import frontend_documents, get_document
+from ecommerce.seeding import PASSWORD, WORDS, CatalogSeeder
+from ecommerce.tracing import OperationTrace
+from ecommerceApiProject.schema import schema
+
+
+# Variables of each frontend operation, as the pages send them. Each
+# builder gets the seeded Fixture and the run's Random.
+VARIABLES = {
+    "LoginUser": lambda f, rng: {"email": f.user.email, "password": PASSWORD},
+    "CreateUser": lambda f, rng: {
+        "input": {"email": "new-buyer@example.com", "username": "new-buyer", "password": PASSWORD}
+    },
+    "GetUser": lambda f, rng: {"id": f.user.pk},
+    "AddToCart": lambda f, rng: {
+        "input": {"cartId": f.cart.pk, "productId": rng.choice(f.product_ids), "quantity": 1}
+    },
+    "UpdateCartItem": lambda f, rng: {"id": rng.choice(f.cart_item_ids), "quantity": 2},
+    "RemoveCartItem": lambda f, rng: {"id": rng.choice(f.cart_item_ids)},
+    "GetOrders": lambda f, rng: {"first": 20},
+    "CreateOrder": lambda f, rng: {"status": "created"},
+    "CreatePayment": lambda f, rng: {
+        "input": {
+            "userId": f.user.pk,
+            "orderId": rng.choice(f.order_ids),
+            "stripePaymentIntent": "",
+            "amount": "49.99",
+            "currency": "usd",
+            "status": "pending",
+        }
+    },
+    "GetPayments": lambda f, rng: {"first": 20},
+    "GetAllProducts": lambda f, rng: {"first": 50},
+    "GetProductById": lambda f, rng: {"id": rng.choice(f.product_ids)},
+    "GetSubCategories": lambda f, rng: {"categoryId": rng.choice(f.category_ids)},
+    "SearchProducts": lambda f, rng: {
+        "filter": {"name": rng.choice(WORDS), "category": rng.choice(f.category_ids)}
+    },
+    "CreateCategory": lambda f, rng: {"input": {"name": "Benchmark new"}},
+    "UpdateCategory": lambda f, rng: {"id": f.spare_category.pk, "input": {"name": "Benchmark renamed"}},
+    "DeleteCategory": lambda f, rng: {"id": f.spare_category.pk},
+    "CreateSubCategory": lambda f, rng: {
+        "input": {"name": "Benchmark new", "categoryId": rng.choice(f.category_ids)}
+    },
+    "UpdateSubCategory": lambda f, rng: {
+        "id": f.spare_sub_category.pk,
+        "input": {"name": "Benchmark renamed", "categoryId": f.spare_category.pk},
+    },
+    "DeleteSubCategory": lambda f, rng: {"id": f.spare_sub_category.pk},
+    "CreateProduct": lambda f, rng: {"input": f.product_input(rng)},
+    "UpdateProduct": lambda f, rng: {"id": rng.choice(f.product_ids), "input": f.product_input(rng)},
+    "DeleteProduct": lambda f, rng: {"id": rng.choice(f.product_ids)},
+    "CreateRating": lambda f, rng: {
+        "input": {
+            "productId": rng.choice(f.product_ids),
+            "ratingFromId": f.user.pk,
+            "stars": rng.randint(1, 5),
+            "comment": "Benchmark rating",
+        }
+    },
+    "CreateComment": lambda f, rng: {
+        "input": {
+            "productId": rng.choice(f.product_ids),
+            "commentFromId": f.user.pk,
+            "body": "Benchmark comment",
+        }
+    },
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Fixture:
+    """The seeded rows the operations' variables point at"""
+
+    def __init__(self, user, cart, category_ids, product_ids, order_ids):
+        self.user = user
+        self.cart = cart
+        self.category_ids = category_ids
+        self.product_ids = product_ids
+        self.order_ids = order_ids
+        self.cart_item_ids = list(cart.cart_items.values_list("pk", flat=True))
+        self.token = str(RefreshToken.for_user(user).access_token)
+        self.spare_category = Category.objects.create(name="Benchmark spare")
+        self.spare_sub_category = SubCategory.objects.create(
+            name="Benchmark spare", category=self.spare_category
+        )
+
+    def product_input(self, rng):
+        return {
+            "name": " ".join(rng.sample(WORDS, 2))[:20],
+            "categoryId": rng.choice(self.category_ids),
+            "description": " ".join(rng.choices(WORDS, k=8)),
+            "price": "19.99",
+            "amountInStock": rng.randint(0, 500),
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay every operation in the frontend's GraphQL documents against a "
+        "seeded catalog and write p50/p95/p99 latency, SQL queries and peak "
+        "memory per operation to JSON (Stripe is served by the local fake; "
+        "everything is rolled back when the benchmark finishes)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            default=str(settings.BASE_DIR / "frontend" / "src" / "graphql"),
+            help="Directory holding the frontend's *.ts GraphQL documents",
+        )
+        parser.add_argument("--output", default="benchmark-operations.json")
+        parser.add_argument(
+            "--compare", help="Earlier --output file to print the change against"
+        )
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--operation", action="append", help="Only run these operations (repeatable)"
+        )
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--orders", type=int, default=1000)
+        parser.add_argument("--ratings", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        operations = self.load_operations(Path(options["source"]), options["operation"])
+
+        results = {}
+        with transaction.atomic():
+            started = time.perf_counter()
+            fixture = self.populate(options)
+            self.stdout.write(f"Seeded the catalog in {time.perf_counter() - started:.1f}s")
+
+            server = FakeStripeServer()
+            with server, override_settings(
+                STRIPE_SECRET_KEY="sk_test_benchmark", STRIPE_API_BASE=server.url
+            ):
+                self.stdout.write(
+                    f"{'operation':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                    f"{'queries':>8} {'peak KiB':>9} {'errors':>7}"
+                )
+                for name, (path, document) in operations.items():
+                    results[name] = self.run_operation(name, path, document, fixture, options)
+                    self.report(name, results[name])
+            transaction.set_rollback(True)
+
+        output = {
+            "revision": git_revision(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+            },
+            "options": {
+                key: options[key]
+                for key in (
+                    "iterations", "warmup", "categories", "products", "users",
+                    "orders", "ratings", "seed",
+                )
+            },
+            "operations": results,
+        }
+        with open(options["output"], "w") as output_file:
+            json.dump(output, output_file, indent=2, sort_keys=True)
+            output_file.write("\n")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def load_operations(self, source, only):
+        operations = {}
+        for path, text in frontend_documents(source):
+            document, errors = get_document(schema.graphql_schema, query=text)
+            name = get_operation_ast(document).name.value
+            if errors:
+                self.stderr.write(
+                    self.style.WARNING(
+                        f"Skipped {path.name}: {name} does not validate: {errors[0].message}"
+                    )
+                )
+                continue
+            operations[name] = (path, document)
+        if not operations:
+            raise CommandError(f"No GraphQL sources found in {source}.")
+
+        if only:
+            unknown = set(only) - set(operations)
+            if unknown:
+                raise CommandError(f"Unknown operations: {', '.join(sorted(unknown))}")
+            return {name: operations[name] for name in only}
+
+        for name, (_, document) in operations.items():
+            if name not in VARIABLES and get_operation_ast(document).variable_definitions:
+                raise CommandError(f"No benchmark variables for {name}; add them to VARIABLES.")
+        return operations
+
+    def run_operation(self, name, path, document, fixture, options):
+        rng = random.Random(f"{options['seed']}:{name}")
+        operation = get_operation_ast(document)
+        build = VARIABLES.get(name, lambda f, rng: {})
+        query_cost = analyze(schema.graphql_schema, document, operation, build(fixture, rng))
+
+        timings, queries, errors = [], [], []
+        for iteration in range(options["warmup"] + options["iterations"]):
+            elapsed, sql_count, error = self.run_once(
+                document, operation, build(fixture, rng), fixture
+            )
+            if iteration < options["warmup"]:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(sql_count)
+            if error:
+                errors.append(error)
+
+        # tracemalloc slows allocation down, so memory is measured on its own run
+        tracemalloc.start()
+        try:
+            self.run_once(document, operation, build(fixture, rng), fixture)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "file": path.name,
+            "type": operation.operation.value,
+            "cost": query_cost and query_cost.cost,
+            "p50_ms": round(percentile(timings, 0.5), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "p99_ms": round(percentile(timings, 0.99), 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "sql_queries": statistics.median_low(queries),
+            "sql_queries_max": max(queries),
+            "peak_memory_kib": round(peak / 1024, 1),
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+        }
+
+    def run_once(self, document, operation, variables, fixture):
+        """Run the operation once as the fixture's user, then roll it back"""
+        request = RequestFactory().post(
+            "/graphql-api/", HTTP_AUTHORIZATION=f"Bearer {fixture.token}"
+        )
+        with transaction.atomic():
+            trace = OperationTrace(operation).start()
+            started = time.perf_counter()
+            result = execute(
+                schema.graphql_schema,
+                document,
+                context_value=request,
+                variable_values=variables,
+                middleware=list(instantiate_middleware(graphene_settings.MIDDLEWARE)),
+            )
+            elapsed = time.perf_counter() - started
+            trace.finish(result)
+            transaction.set_rollback(True)
+        error = result.errors and result.errors[0].message
+        return elapsed, trace.sql_count, error
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<20} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['sql_queries']:>8} "
+            f"{result['peak_memory_kib']:>9.1f} {result['errors']:>7}"
+        )
+        if result["errors"]:
+            self.stderr.write(self.style.WARNING(f"{name}: {result['first_error']}"))
+
+    def compare(self, path, results):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.stdout.write(
+            f"\nAgainst {path} ({baseline.get('revision') or 'unknown revision'}):\n"
+            f"{'operation':<20} {'p50':>8} {'p95':>8} {'queries':>8} {'peak KiB':>9}"
+        )
+        for name, result in results.items():
+            before = baseline["operations"].get(name)
+            if before is None:
+                self.stdout.write(f"{name:<20} {'new':>8}")
+                continue
+
+            def change(key):
+                if not before[key]:
+                    return "-"
+                return f"{(result[key] - before[key]) / before[key]:+.0%}"
+
+            self.stdout.write(
+                f"{name:<20} {change('p50_ms'):>8} {change('p95_ms'):>8} "
+                f"{result['sql_queries'] - before['sql_queries']:>+8} "
+                f"{change('peak_memory_kib'):>9}"
+            )
+
+    def populate(self, options):
+        seeder = CatalogSeeder(
+            seed=options["seed"],
+            label="benchmark",
+            categories=options["categories"],
+            products=options["products"],
+            users=options["users"],
+            orders=options["orders"],
+            ratings=options["ratings"],
+            comments=options["ratings"] // 2,
+        )
+        seeder.run()
+        middleware.user_cache.clear()
+
+        # Every seeded cart has items; its owner runs the operations
+        cart = Cart.objects.filter(pk__in=seeder.cart_ids).order_by("pk").first()
+        if cart is None:
+            raise CommandError("--users is too small to seed a cart.")
+        # Sold-out lines would make every CreateOrder fail
+        Product.objects.filter(cart_items__cart=cart).update(
+            amount_in_stock=F("amount_in_stock") + 1000
+        )
+        return Fixture(
+            user=cart.user,
+            cart=cart,
+            category_ids=seeder.category_ids,
+            product_ids=seeder.product_ids,
+            # CreatePayment only accepts the caller's own orders
+            order_ids=list(cart.user.orders.values_list("pk", flat=True))
+            or [Order.objects.create(user=cart.user, status="pending", total="49.99").pk],
+        )
@@ -0,0 +1,121 @@
+import statistics
+import threading
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from ecommerce.fake_stripe import FakeStripeServer
+from ecommerce.models import Order, Payment, User
+from ecommerceApiProject.schema import schema
+
+
+CREATE_PAYMENT = """
+mutation ($input: PaymentInput!) {
+  createPayment(input: $input) { ok payment { stripePaymentIntent } }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive CreatePayment against the local fake Stripe server with injected "
+        "latency and failures (uses the configured database; cleans up after)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=200)
+        parser.add_argument(
+            "--attempts", type=int, default=2, help="Times each order is paid, as client retries"
+        )
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--latency", type=float, default=50, help="Stripe delay in ms")
+        parser.add_argument(
+            "--failure-rates", type=float, nargs="+", default=[0, 0.05, 0.2]
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(
+            email="payments-benchmark@example.com",
+            username="payments-benchmark",
+            password="benchmark",
+        )
+        self.stdout.write(
+            f"{'failures':>8} {'calls/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'stripe reqs':>11} {'errors':>7} {'intents':>8} {'payments':>9}"
+        )
+        try:
+            for failure_rate in options["failure_rates"]:
+                orders = Order.objects.bulk_create(
+                    [
+                        Order(user=user, status="pending", total="10.00")
+                        for _ in range(options["orders"])
+                    ]
+                )
+                server = FakeStripeServer(
+                    latency=options["latency"] / 1000,
+                    failure_rate=failure_rate,
+                    seed=options["seed"],
+                )
+                with server, override_settings(
+                    STRIPE_SECRET_KEY="sk_test_benchmark",
+                    STRIPE_API_BASE=server.url,
+                    STRIPE_RETRY_BACKOFF=0.05,
+                ):
+                    calls = [order for order in orders for _ in range(options["attempts"])]
+                    latencies, errors, elapsed = self.race(user, calls, options["threads"])
+
+                payments = Payment.objects.filter(order__in=orders).count()
+                self.stdout.write(
+                    f"{failure_rate:>8.2f} {len(calls) / elapsed:>8.1f} "
+                    f"{statistics.median(latencies):>8.1f} "
+                    f"{statistics.quantiles(latencies, n=100)[98]:>8.1f} "
+                    f"{server.requests:>11} {errors:>7} {len(server.intents):>8} {payments:>9}"
+                )
+                Order.objects.filter(pk__in=[order.pk for order in orders]).delete()
+        finally:
+            user.delete()
+
+    def race(self, user, orders, threads):
+        pending = iter(orders)
+        lock = threading.Lock()
+        latencies, errors = [], [0]
+
+        def payer():
+            try:
+                while True:
+                    with lock:
+                        order = next(pending, None)
+                    if order is None:
+                        return
+                    variables = {
+                        "input": {
+                            "userId": user.pk,
+                            "orderId": order.pk,
+                            "stripePaymentIntent": "",
+                            "amount": "10.00",
+                            "currency": "usd",
+                            "status": "pending",
+                        }
+                    }
+                    context = SimpleNamespace(user=user, _jwt_authenticated=True)
+                    started = time.perf_counter()
+                    result = schema.execute(
+                        CREATE_PAYMENT, variable_values=variables, context_value=context
+                    )
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        errors[0] += bool(result.errors)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=payer) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return latencies, errors[0], time.perf_counter() - started
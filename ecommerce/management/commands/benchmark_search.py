@@ -0,0 +1,118 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecommerce.models import Category, Product, SubCategory
+from ecommerce.search import index_products, search_products
+
+
+WORDS = (
+    "red blue green black white steel wooden leather cotton linen smart mini "
+    "pro max ultra classic vintage modern compact portable wireless digital "
+    "solar organic premium travel kitchen garden office sport outdoor kids "
+    "lamp chair table shoe boot jacket shirt phone watch speaker kettle mug "
+    "bottle bag backpack desk sofa pillow blanket drill hammer bike helmet"
+).split()
+
+RARE_WORDS = ("zephyr", "quokka", "obsidian")
+
+PAGE_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare indexed product search with the name__icontains scan on a "
+        "generated catalog (rolled back when the benchmark finishes)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--terms",
+            nargs="+",
+            default=["red", "wireless kettle", "zephyr", "obsid", "nothingmatches"],
+            help="Search inputs to time",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.populate(options["products"], options["seed"])
+            self.stdout.write(
+                f"{'query':<18} {'path':<10} {'page ms':>9} {'count ms':>9} {'matches':>9}"
+            )
+            for text in options["terms"]:
+                name_only = search_products(
+                    Product.objects.all(), text, name_only=True, ranked=False
+                )
+                for path, queryset in (
+                    ("icontains", self.icontains(text)),
+                    ("name", name_only.order_by("-created_at", "-id")),
+                    ("ranked", search_products(Product.objects.all(), text)),
+                ):
+                    page_ms = self.time(
+                        lambda: list(queryset[:PAGE_SIZE]), options["repeat"]
+                    )
+                    count_ms = self.time(queryset.count, options["repeat"])
+                    self.stdout.write(
+                        f"{text:<18} {path:<10} {page_ms:>9.2f} {count_ms:>9.2f} "
+                        f"{queryset.count():>9}"
+                    )
+            transaction.set_rollback(True)
+
+    def icontains(self, text):
+        queryset = Product.objects.all()
+        for term in text.split():
+            queryset = queryset.filter(name__icontains=term)
+        return queryset.order_by("-created_at", "-id")
+
+    def time(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def populate(self, count, seed):
+        rng = random.Random(seed)
+        categories = [
+            Category.objects.create(name=f"Benchmark {word}") for word in WORDS[:8]
+        ]
+        sub_categories = [
+            SubCategory.objects.create(name=word, category=rng.choice(categories))
+            for word in WORDS[8:24]
+        ]
+
+        started = time.perf_counter()
+        batch = []
+        for index in range(count):
+            words = rng.sample(WORDS, 2)
+            if index % 10_000 == 0:
+                words[0] = rng.choice(RARE_WORDS)
+            sub_category = rng.choice(sub_categories)
+            batch.append(
+                Product(
+                    name=" ".join(words)[:20],
+                    category=sub_category.category,
+                    sub_category=sub_category,
+                    description=" ".join(rng.choices(WORDS, k=8)),
+                    price=rng.randint(100, 100_000) / 100,
+                    amount_in_stock=rng.randint(0, 500),
+                )
+            )
+            if len(batch) == 5_000:
+                self.insert(batch)
+                batch = []
+        self.insert(batch)
+        self.stdout.write(
+            f"Inserted {count} products in {time.perf_counter() - started:.1f}s"
+        )
+
+    def insert(self, batch):
+        products = Product.objects.bulk_create(batch)
+        index_products(product.pk for product in products)
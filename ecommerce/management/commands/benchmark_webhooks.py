@@ -0,0 +1,167 @@
+import asyncio
+import random
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from ecommerce.fake_stripe import make_event, sign_payload
+from ecommerce.models import Order, Payment, User, WebhookEvent
+from ecommerce.webhooks import apply_events
+
+
+SECRET = "whsec_benchmark"
+
+EVENT_TYPES = [
+    "payment_intent.processing",
+    "payment_intent.succeeded",
+    "payment_intent.payment_failed",
+    "payment_intent.canceled",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure Stripe webhook ingestion with and without group commit, and "
+        "the throughput of applying the stored events (uses the configured "
+        "database; cleans up after)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=2000)
+        parser.add_argument("--payments", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--duplicate-share", type=float, default=0.1)
+        parser.add_argument("--threads", type=int, default=8, help="GRAPHQL_ASYNC_WORKERS")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(
+            email="webhook-benchmark@example.com", username="webhook-benchmark", password="x"
+        )
+        orders = Order.objects.bulk_create(
+            [Order(user=user, status="pending", total="9.99") for _ in range(options["payments"])]
+        )
+        Payment.objects.bulk_create(
+            [
+                Payment(
+                    user=user,
+                    order=order,
+                    stripe_payment_intent=f"pi_bench_{order.pk}",
+                    amount="9.99",
+                    status="pending",
+                )
+                for order in orders
+            ]
+        )
+
+        rng = random.Random(options["seed"])
+        now = time.time()
+        payloads = []
+        for index in range(options["events"]):
+            if payloads and rng.random() < options["duplicate_share"]:
+                # Stripe redelivers an event when the acknowledgement is lost
+                payloads.append(rng.choice(payloads))
+                continue
+            order = rng.choice(orders)
+            payloads.append(
+                make_event(
+                    rng.choice(EVENT_TYPES),
+                    {"id": f"pi_bench_{order.pk}"},
+                    created=now - rng.uniform(0, 60),
+                )
+            )
+        bodies = [(payload.encode(), sign_payload(payload, SECRET).encode()) for payload in payloads]
+
+        self.stdout.write(f"{'stage':>18} {'events/s':>9} {'queries':>8} {'stored':>7}")
+        try:
+            with override_settings(
+                STRIPE_WEBHOOK_SECRET=SECRET, GRAPHQL_ASYNC_WORKERS=options["threads"]
+            ):
+                for name, batch in (("ingest unbatched", 1), ("ingest batched", None)):
+                    WebhookEvent.objects.all().delete()
+                    overrides = {"STRIPE_WEBHOOK_INGEST_BATCH": batch} if batch else {}
+                    with override_settings(**overrides):
+                        started = time.perf_counter()
+                        statuses = self.ingest(bodies, options["concurrency"])
+                        elapsed = time.perf_counter() - started
+                    errors = sum(status != 200 for status in statuses)
+                    self.stdout.write(
+                        f"{name:>18} {len(bodies) / elapsed:>9.0f} {'-':>8} "
+                        f"{WebhookEvent.objects.count():>7}"
+                        + (f"  ({errors} errors)" if errors else "")
+                    )
+
+                stored = WebhookEvent.objects.count()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    while apply_events():
+                        pass
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{'apply':>18} {stored / elapsed:>9.0f} {len(queries):>8} {stored:>7}"
+                )
+        finally:
+            WebhookEvent.objects.filter(object_id__startswith="pi_bench_").delete()
+            user.delete()
+
+    def ingest(self, bodies, concurrency):
+        """Post every body to the webhook endpoint from concurrent clients"""
+        application = get_asgi_application()
+
+        async def call(body, signature):
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "POST",
+                "scheme": "http",
+                "path": "/stripe/webhook/",
+                "raw_path": b"/stripe/webhook/",
+                "root_path": "",
+                "query_string": b"",
+                "headers": [
+                    (b"host", b"localhost"),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"stripe-signature", signature),
+                ],
+                "client": ("127.0.0.1", 0),
+                "server": ("localhost", 80),
+            }
+            request_sent = False
+            finished = asyncio.Event()
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                await finished.wait()
+                return {"type": "http.disconnect"}
+
+            status = []
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+                elif not message.get("more_body"):
+                    finished.set()
+
+            await application(scope, receive, send)
+            return status[0]
+
+        async def main():
+            pending = iter(bodies)
+            statuses = []
+
+            async def client():
+                for body, signature in pending:
+                    statuses.append(await call(body, signature))
+
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            return statuses
+
+        return asyncio.run(main())
@@ -0,0 +1,76 @@
+import sys
+import time
+from pathlib import PurePath
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.exports import EXPORTS, WRITERS, stream_export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream products, orders with their items, or payments to a CSV, "
+        "JSONL or Parquet file in constant memory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=list(EXPORTS))
+        parser.add_argument(
+            "--output", "-o", help="File to write; standard output by default"
+        )
+        parser.add_argument(
+            "--format", choices=list(WRITERS), help="Taken from --output's extension, else csv"
+        )
+        parser.add_argument(
+            "--after", type=int, help="Resume past this value of the export's key column"
+        )
+        parser.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            metavar="NAME=VALUE",
+            help="A filter of the matching API query, e.g. status=paid; repeatable",
+        )
+        parser.add_argument("--chunk-size", type=int, help="Rows per fetch (EXPORT_CHUNK_SIZE)")
+
+    def handle(self, *args, **options):
+        file_format = options["format"]
+        if file_format is None and options["output"]:
+            file_format = PurePath(options["output"]).suffix.lstrip(".").lower()
+        file_format = file_format or "csv"
+
+        filters = {}
+        for item in options["filter"]:
+            name, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Expected NAME=VALUE, got {item!r}.")
+            filters[name] = value
+
+        try:
+            chunks = stream_export(
+                options["name"], file_format, filters, options["after"], options["chunk_size"]
+            )
+        except Exception as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        written = 0
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                output.close()
+            else:
+                output.flush()
+
+        if options["output"]:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Wrote {written / 2**20:.1f} MiB of {options['name']} to {options['output']} "
+                    f"in {elapsed:.1f}s (resume key column: {EXPORTS[options['name']].key})"
+                )
+            )
@@ -0,0 +1,26 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.images import submit_variants
+from ecommerce.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = "Render thumbnails and WebP/AVIF derivatives for product images that lack them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Re-render images that already have derivatives"
+        )
+
+    def handle(self, *args, **options):
+        product_images = ProductImage.objects.exclude(image="")
+        if not options["all"]:
+            product_images = product_images.filter(variants={})
+        futures = [
+            submit_variants(pk, name)
+            for pk, name in product_images.values_list("pk", "image").iterator()
+        ]
+        wait([future for future in futures if future is not None])
+        self.stdout.write(self.style.SUCCESS(f"Rendered variants for {len(futures)} images"))
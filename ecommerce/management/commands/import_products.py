@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.importing import ProductImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a supplier CSV or JSONL file into the catalog, upserting "
+        "products by sku in batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format", choices=("csv", "jsonl"), help="Taken from the extension by default"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Products per upsert (PRODUCT_IMPORT_BATCH_SIZE)"
+        )
+        parser.add_argument(
+            "--create-categories",
+            action="store_true",
+            help="Create unknown categories and sub-categories instead of rejecting the row",
+        )
+        parser.add_argument("--progress-every", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        try:
+            file_format = options["format"] or detect_format(options["path"])
+        except Exception as e:
+            raise CommandError(str(e))
+
+        importer = ProductImporter(
+            batch_size=options["batch_size"],
+            create_missing=options["create_categories"],
+            progress=self.progress,
+            progress_every=options["progress_every"],
+        )
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as lines:
+                report = importer.run(read_rows(lines, file_format))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for line, message in report.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if report.bad_rows > len(report.errors):
+            self.stderr.write(f"... and {report.bad_rows - len(report.errors)} more bad rows")
+        style = self.style.WARNING if report.bad_rows else self.style.SUCCESS
+        self.stdout.write(
+            style(
+                f"Imported {report.imported} of {report.rows} rows, {report.bad_rows} bad, "
+                f"in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s)"
+            )
+        )
+
+    def progress(self, report):
+        self.stdout.write(
+            f"{report.rows} rows, {report.imported} imported, {report.bad_rows} bad "
+            f"({report.rows_per_second:.0f} rows/s)"
+        )
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.webhooks import apply_events
+
+
+class Command(BaseCommand):
+    help = "Apply stored Stripe webhook events to payments and orders in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument(
+            "--poll", type=float, default=1.0, help="Seconds to wait when the queue is empty"
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue and exit instead of polling"
+        )
+
+    def handle(self, *args, **options):
+        applied = 0
+        while True:
+            count = apply_events(options["batch_size"])
+            applied += count
+            if count:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["poll"])
+        self.stdout.write(self.style.SUCCESS(f"Applied {applied} webhook events"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute every product's rating count, sum, average and histogram"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Products written per bulk update",
+        )
+
+    def handle(self, *args, **options):
+        rated = rebuild_rating_aggregates(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt rating aggregates for {rated} rated products")
+        )
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from graphql import GraphQLError, parse, print_ast
+from graphql.validation import validate
+
+from ecommerce.persisted_queries import (
+    document_cache,
+    frontend_documents,
+    hash_document,
+    manifest,
+)
+from ecommerceApiProject.schema import schema
+
+
+class Command(BaseCommand):
+    help = "Extract the gql documents from the frontend and register them as persisted queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            default=str(settings.BASE_DIR / "frontend" / "src" / "graphql"),
+            help="Directory holding the frontend's *.ts GraphQL documents",
+        )
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Fail instead of skipping documents that do not validate",
+        )
+
+    def handle(self, *args, **options):
+        source = Path(options["source"])
+        if not any(source.glob("*.ts")):
+            raise CommandError(f"No GraphQL sources found in {source}.")
+
+        queries = {}
+        for path, text in frontend_documents(source):
+            if "${" in text:
+                raise CommandError(f"{path.name}: interpolated documents are not supported.")
+            try:
+                document = parse(text)
+            except GraphQLError as e:
+                raise CommandError(f"{path.name}: {e.message}")
+
+            name = document.definitions[0].name.value
+            errors = validate(schema.graphql_schema, document)
+            if errors:
+                message = f"{path.name}: {name} does not validate: {errors[0].message}"
+                if options["strict"]:
+                    raise CommandError(message)
+                self.stderr.write(self.style.WARNING(f"Skipped {message}"))
+                continue
+
+            queries[hash_document(document)] = print_ast(document)
+            self.stdout.write(f"{path.name}: {name}")
+
+        manifest.write(queries)
+        document_cache.clear()
+        self.stdout.write(
+            self.style.SUCCESS(f"Registered {len(queries)} queries in {manifest.path}")
+        )
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.fake_stripe import FakeStripeServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local stand-in for Stripe's PaymentIntent API; set "
+        "STRIPE_API_BASE to the printed URL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument("--latency", type=float, default=0, help="Delay per request in ms")
+        parser.add_argument(
+            "--failure-rate", type=float, default=0, help="Share of requests answered with a 500"
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(
+            options["host"],
+            options["port"],
+            latency=options["latency"] / 1000,
+            failure_rate=options["failure_rate"],
+            seed=options["seed"],
+        )
+        with server:
+            self.stdout.write(self.style.SUCCESS(f"Fake Stripe listening on {server.url}"))
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(f"Served {server.requests} requests, created {len(server.intents)} intents")
@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.models import Category
+from ecommerce.seeding import CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large, deterministic catalog with Zipfian product popularity "
+        "and power-law ratings, bulk inserted in chunked transactions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--label",
+            default="catalog",
+            help="Prefix of generated names and emails; use a new one to seed again",
+        )
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument(
+            "--sub-categories", type=int, default=5, help="Sub-categories per category"
+        )
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument("--images", type=int, default=2, help="Average images per product")
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument(
+            "--carts", type=float, default=0.3, help="Share of users with a filled cart"
+        )
+        parser.add_argument("--orders", type=int, default=5_000)
+        parser.add_argument("--items", type=int, default=4, help="Most lines in one order")
+        parser.add_argument("--ratings", type=int, default=20_000)
+        parser.add_argument("--comments", type=int, default=10_000)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Zipf exponent of product popularity; users use 0.7 of it",
+        )
+        parser.add_argument("--batch-size", type=int, default=2_000, help="Rows per INSERT")
+        parser.add_argument(
+            "--chunk-size", type=int, default=50_000, help="Rows per transaction"
+        )
+
+    def handle(self, *args, **options):
+        if options["products"] < 1 or options["users"] < 1 or options["categories"] < 1:
+            raise CommandError("--categories, --products and --users must be at least 1.")
+        if options["sub_categories"] < 1 or options["items"] < 1 or options["images"] < 1:
+            raise CommandError("--sub-categories, --items and --images must be at least 1.")
+        if not 0 <= options["carts"] <= 1:
+            raise CommandError("--carts must be between 0 and 1.")
+        if Category.objects.filter(name=f"{options['label']} 0").exists():
+            raise CommandError(
+                f"A catalog labelled {options['label']!r} was already seeded; pass --label."
+            )
+
+        seeder = CatalogSeeder(
+            seed=options["seed"],
+            label=options["label"],
+            categories=options["categories"],
+            sub_categories=options["sub_categories"],
+            products=options["products"],
+            images=options["images"],
+            users=options["users"],
+            carts=options["carts"],
+            orders=options["orders"],
+            items=options["items"],
+            ratings=options["ratings"],
+            comments=options["comments"],
+            skew=options["skew"],
+            batch_size=options["batch_size"],
+            chunk_size=options["chunk_size"],
+            log=self.stdout.write,
+        )
+        started = time.perf_counter()
+        counts = seeder.run()
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)"
+            )
+        )
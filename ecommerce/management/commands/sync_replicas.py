@@ -0,0 +1,53 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the SQLite read replicas, "
+        "once or every --every seconds, to stand in for replication locally"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every", type=float, help="Keep copying with this many seconds between copies"
+        )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = [
+            alias
+            for alias in settings.DATABASE_REPLICAS
+            if connections[alias].vendor == "sqlite"
+        ]
+        if primary.vendor != "sqlite" or not replicas:
+            raise CommandError(
+                "sync_replicas copies a SQLite primary onto SQLite replicas; set "
+                "DATABASE_REPLICA_PATHS, or use the database's own replication."
+            )
+
+        while True:
+            for alias in replicas:
+                started = time.perf_counter()
+                self.copy(primary, connections[alias].settings_dict["NAME"])
+                self.stdout.write(
+                    f"Copied {DEFAULT_DB_ALIAS} to {alias} "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+            if not options["every"]:
+                break
+            time.sleep(options["every"])
+
+    @staticmethod
+    def copy(primary, path):
+        """Online backup of the primary: a consistent snapshot, even under writes"""
+        primary.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
@@ -1,28 +1,90 @@
 # Custom middleware to extract JWT from headers for GraphQL requests
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
 
 
-class JWTGrapQLMiddleware:
-    '''Attach user to info.context in GraphQL from JWT Bearer token.'''
+class UserCache:
+    '''Short-lived LRU of authenticated users keyed by (user id, token jti).'''
 
-    def resolve(self, next, root, info, **kwargs):
-        request = info.context
-
-        auth_header = request.META.get("HTTP_AUTHORIZATION", "")
-        if auth_header.startswith("Bearer "):
-            raw_token = auth_header.split(" ")[1]
-            auth = JWTAuthentication()
-            try:
-                validated_token = auth.get_validated_token(raw_token)
-                user = auth.get_user(validated_token)
-                request.user = user
-            except Exception:
-                request.user = AnonymousUser()
-        else:
-                request.user = AnonymousUser()
-        return next(root, info, **kwargs)
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._users.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._users[key]
+                return None
+            self._users.move_to_end(key)
+            return user
+
+    def put(self, key, user):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._users[key] = (user, time.monotonic() + self.ttl)
+            self._users.move_to_end(key)
+            while len(self._users) > self.maxsize:
+                self._users.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+jwt_authentication = JWTAuthentication()
+user_cache = UserCache(settings.JWT_USER_CACHE_SIZE, settings.JWT_USER_CACHE_TTL)
 
 
+def authenticate_request(request):
+    '''Return the user for the request's Bearer token, or AnonymousUser.'''
+    auth_header = request.META.get("HTTP_AUTHORIZATION", "")
+    if not auth_header.startswith("Bearer "):
+        return AnonymousUser()
 
+    raw_token = auth_header.split(" ")[1]
+    try:
+        validated_token = jwt_authentication.get_validated_token(raw_token)
+        key = (
+            validated_token[api_settings.USER_ID_CLAIM],
+            validated_token.get(api_settings.JTI_CLAIM),
+        )
+        user = user_cache.get(key)
+        if user is None:
+            user = jwt_authentication.get_user(validated_token)
+            user_cache.put(key, user)
+        return user
+    except Exception:
+        return AnonymousUser()
 
+
+def attach_user(request):
+    '''Authenticate the request once and memoize the user on it.'''
+    if not getattr(request, "_jwt_authenticated", False):
+        request.user = authenticate_request(request)
+        request._jwt_authenticated = True
+    return request.user
+
+
+class JWTGrapQLMiddleware:
+    '''Attach user to info.context in GraphQL from JWT Bearer token.
+
+    The token is checked on the first resolved field only; the result is
+    memoized on the request for every other field.
+    '''
+
+    def resolve(self, next, root, info, **kwargs):
+        attach_user(info.context)
+        return next(root, info, **kwargs)
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+
+# The index rows are maintained by ecommerce.search; triggers are avoided
+# because SQLite drops them whenever a migration rebuilds the product table.
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE ecommerce_product_search USING fts5(
+        name, description, category, sub_category,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO ecommerce_product_search (rowid, name, description, category, sub_category)
+    SELECT p.id, p.name, coalesce(p.description, ''), coalesce(c.name, ''), coalesce(s.name, '')
+    FROM ecommerce_product p
+    LEFT JOIN ecommerce_category c ON c.id = p.category_id
+    LEFT JOIN ecommerce_subcategory s ON s.id = p.sub_category_id
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS ecommerce_product_search",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE TABLE ecommerce_product_search (
+        product_id bigint PRIMARY KEY
+            REFERENCES ecommerce_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX ecommerce_product_search_document ON ecommerce_product_search USING GIN (document)",
+    "CREATE INDEX ecommerce_product_name_trgm ON ecommerce_product USING GIN (name gin_trgm_ops)",
+    """
+    INSERT INTO ecommerce_product_search (product_id, document)
+    SELECT p.id,
+           setweight(to_tsvector('simple', p.name), 'A')
+           || setweight(to_tsvector('simple', coalesce(c.name, '') || ' ' || coalesce(s.name, '')), 'B')
+           || setweight(to_tsvector('simple', coalesce(p.description, '')), 'C')
+    FROM ecommerce_product p
+    LEFT JOIN ecommerce_category c ON c.id = p.category_id
+    LEFT JOIN ecommerce_subcategory s ON s.id = p.sub_category_id
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS ecommerce_product_name_trgm",
+    "DROP TABLE IF EXISTS ecommerce_product_search",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, ()):
+            schema_editor.execute(sql, params=None)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:14
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('ecommerce', 'Product')
+    Rating = apps.get_model('ecommerce', 'Rating')
+    buckets = {f'rating_{stars}_count': Count('id', filter=Q(rating=stars)) for stars in range(1, 6)}
+    rows = Rating.objects.order_by().values('product_id').annotate(
+        count=Count('id'), total=Sum('rating'), **buckets
+    )
+    products = [
+        Product(
+            pk=row['product_id'],
+            rating_count=row['count'],
+            rating_sum=row['total'],
+            average_rating=row['total'] / row['count'],
+            **{field: row[field] for field in buckets},
+        )
+        for row in rows
+    ]
+    Product.objects.bulk_update(
+        products,
+        ['rating_count', 'rating_sum', 'average_rating', *buckets],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0006_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='average_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-average_rating', '-id'], name='product_avg_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_count', '-id'], name='product_rating_count_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
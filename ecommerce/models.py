@@ -5,10 +5,20 @@ from django.contrib.auth.models import AbstractUser
 ORDER_STATUS_CHOICES =[
     ('created', 'Created'),
     ('pending', 'Pending'),
+    ('paid', 'Paid'),
     ('cancelled', 'Cancelled'),
     ('delivered', 'Delivered'),
 ]
 
+RESERVATION_STATUS_CHOICES = [
+    ('held', 'Held'),
+    ('committed', 'Committed'),
+    ('released', 'Released'),
+]
+
+# Products with fewer units in stock than this count as low stock
+LOW_STOCK_THRESHOLD = 5
+
 PAYMENT_STATUS_CHOICE = [
     ('successful', 'Successful'),
     ('pending', 'Pending'),
@@ -47,6 +57,8 @@ class SubCategory(models.Model):
 class Product(models.Model):
     '''Represent a product in a store'''
     name = models.CharField(max_length=20)
+    # Supplier stock-keeping unit; catalog imports upsert on it
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     sub_category = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     description = models.TextField(blank=True, null=True)
@@ -55,6 +67,32 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized rating aggregates, maintained by ecommerce.ratings
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(fields=['-average_rating', '-id'], name='product_avg_rating_idx'),
+            models.Index(fields=['-rating_count', '-id'], name='product_rating_count_idx'),
+            # ProductFilter: category + price range, price range, stock range, low stock
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['amount_in_stock'], name='product_stock_idx'),
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='product_low_stock_idx',
+                condition=models.Q(amount_in_stock__lt=LOW_STOCK_THRESHOLD),
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -62,6 +100,8 @@ class ProductImage(models.Model):
     '''Hold image for product'''
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='product_images/')
+    # Resized derivatives stored next to the original: {format: {width: name}}
+    variants = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"Image for {self.product.name}"
@@ -89,8 +129,19 @@ class Order(models.Model):
     '''Represent a customer order'''
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     status = models.CharField(max_length=10, default='created', choices=ORDER_STATUS_CHOICES)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            # OrderFilter: user + status + created range, and status alone
+            models.Index(
+                fields=['user', 'status', '-created_at', '-id'], name='order_user_status_idx'
+            ),
+            models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.email} - {self.status.upper( )}"
 
@@ -107,6 +158,24 @@ class OrderItem(models.Model):
         return f"{self.product.name} x {self.quantity} in order #{self.order.id}"
 
 
+class StockReservation(models.Model):
+    '''Stock taken out of a product for an order until its payment settles'''
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, default='held', choices=RESERVATION_STATUS_CHOICES)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for order #{self.order_id} ({self.status})"
+
+
 class Rating(models.Model):
     '''Represent product review by users'''
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='rating')
@@ -125,6 +194,12 @@ class Rating(models.Model):
                 name="valid_rating_range"
             )
         ]
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='rating_created_id_idx'),
+            models.Index(
+                fields=['product', '-created_at', '-id'], name='rating_product_created_idx'
+            ),
+        ]
 
 class Comment(models.Model):
     '''User comments on the a product'''
@@ -133,6 +208,14 @@ class Comment(models.Model):
     body = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='comment_created_id_idx'),
+            models.Index(
+                fields=['product', '-created_at', '-id'], name='comment_product_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return f"Comment by {self.comment_from.email} on {self.product.name}"
     
@@ -146,10 +229,46 @@ class Payment(models.Model):
     status = models.CharField(max_length=50, default='processing', choices=PAYMENT_STATUS_CHOICE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='payment_created_id_idx'),
+            # PaymentFilter: user + status + created range, status alone, amount range
+            models.Index(
+                fields=['user', 'status', '-created_at', '-id'], name='payment_user_status_idx'
+            ),
+            models.Index(
+                fields=['status', '-created_at', '-id'], name='payment_status_created_idx'
+            ),
+            models.Index(fields=['amount'], name='payment_amount_idx'),
+        ]
+
     def __str__(self):
         return f"Payment {self.status.upper()} - {self.amount} {self.currency}"
 
 
+class WebhookEvent(models.Model):
+    '''Stripe webhook event, stored on receipt and applied in batches'''
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=255)
+    created = models.DateTimeField()
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='webhook_event_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
+
+
 
 
 
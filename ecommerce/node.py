@@ -1,6 +1,8 @@
 import graphene
 from graphene import relay
 
+from .counting import EXACT, count_queryset
+
 
 class CustomNode(graphene.Node):
     class Meta:
@@ -13,3 +15,18 @@ class CustomNode(graphene.Node):
     @staticmethod
     def from_global_id(to_global_id):
         return "", to_global_id
+
+
+class CountableConnection(relay.Connection):
+    """Connection whose totalCount is only computed when it is selected"""
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(self, info):
+        if getattr(self, "length", None) is not None:
+            return self.length
+        strategy = getattr(self, "total_count_strategy", EXACT)
+        return count_queryset(self.iterable, strategy)
@@ -0,0 +1,111 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql import FieldNode, FragmentSpreadNode, get_argument_values, get_named_type
+
+
+PAGINATION_ARGS = ("first", "last", "before", "after", "offset")
+
+
+def optimize_queryset(queryset, info):
+    """Apply select_related/prefetch_related for the relations selected in info.
+
+    Forward foreign keys are joined with ``select_related``; reverse relations
+    become ``Prefetch`` objects whose querysets are optimized recursively for
+    the nested selection. Works for connection, list and single-object fields.
+    """
+    graphql_type, selection_sets = _unwrap_connection(
+        info.return_type, [node.selection_set for node in info.field_nodes], info
+    )
+    select, prefetch = _relations(queryset.model, graphql_type, selection_sets, info)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def collect_fields(selection_sets, fragments):
+    """Yield every field node in selection_sets, expanding fragments"""
+    for selection_set in selection_sets:
+        if selection_set is None:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = fragments[selection.name.value]
+                yield from collect_fields([fragment.selection_set], fragments)
+            else:
+                yield from collect_fields([selection.selection_set], fragments)
+
+
+def _unwrap_connection(graphql_type, selection_sets, info):
+    """Return the node type and node selections of a connection or list"""
+    graphql_type = get_named_type(graphql_type)
+    fields = getattr(graphql_type, "fields", {})
+    if "edges" not in fields or "pageInfo" not in fields:
+        return graphql_type, selection_sets
+
+    edge_type = get_named_type(fields["edges"].type)
+    edges = [
+        field.selection_set
+        for field in collect_fields(selection_sets, info.fragments)
+        if field.name.value == "edges"
+    ]
+    nodes = [
+        field.selection_set
+        for field in collect_fields(edges, info.fragments)
+        if field.name.value == "node"
+    ]
+    return get_named_type(edge_type.fields["node"].type), nodes
+
+
+def _relations(model, graphql_type, selection_sets, info, prefix=""):
+    """Collect select_related paths and Prefetch objects for a selection"""
+    select, prefetch = [], []
+    for field_node in collect_fields(selection_sets, info.fragments):
+        graphql_field = graphql_type.fields.get(field_node.name.value)
+        if graphql_field is None or field_node.selection_set is None:
+            continue
+        try:
+            model_field = model._meta.get_field(to_snake_case(field_node.name.value))
+        except FieldDoesNotExist:
+            continue
+
+        if isinstance(model_field, models.ForeignKey):
+            path = prefix + model_field.name
+            select.append(path)
+            nested_select, nested_prefetch = _relations(
+                model_field.related_model,
+                get_named_type(graphql_field.type),
+                [field_node.selection_set],
+                info,
+                prefix=path + "__",
+            )
+            select += nested_select
+            prefetch += nested_prefetch
+        elif isinstance(model_field, models.ManyToOneRel) and not model_field.one_to_one:
+            arguments = get_argument_values(
+                graphql_field, field_node, info.variable_values
+            )
+            if any(v is not None for k, v in arguments.items() if k not in PAGINATION_ARGS):
+                # Filtered connections are resolved through their filterset
+                continue
+            node_type, node_selection = _unwrap_connection(
+                graphql_field.type, [field_node.selection_set], info
+            )
+            child_model = model_field.related_model
+            nested_select, nested_prefetch = _relations(
+                child_model, node_type, node_selection, info
+            )
+            queryset = child_model._default_manager.order_by("pk")
+            if nested_select:
+                queryset = queryset.select_related(*nested_select)
+            if nested_prefetch:
+                queryset = queryset.prefetch_related(*nested_prefetch)
+            path = prefix + model_field.get_accessor_name()
+            if all(lookup.prefetch_to != path for lookup in prefetch):
+                prefetch.append(Prefetch(path, queryset=queryset))
+    return select, prefetch
@@ -0,0 +1,91 @@
+import itertools
+import random
+import time
+from decimal import Decimal
+from functools import lru_cache
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+# Statuses Stripe documents as safe to retry with the same idempotency key
+RETRYABLE_STATUSES = {409, 429, 500, 502, 503, 504}
+
+
+def to_minor_units(amount):
+    """Convert a decimal amount to the integer cents Stripe expects"""
+    return int((Decimal(amount) * 100).quantize(Decimal("1")))
+
+
+def payment_intent_key(order_id):
+    """Idempotency key for an order's PaymentIntent"""
+    return f"order-{order_id}-payment-intent"
+
+
+def is_retryable(error):
+    """Return whether a failed Stripe request may be sent again"""
+    if isinstance(error, stripe.APIConnectionError):
+        return True
+    should_retry = (error.headers or {}).get("Stripe-Should-Retry")
+    if should_retry is not None:
+        return should_retry == "true"
+    return error.http_status in RETRYABLE_STATUSES
+
+
+class StripeGateway:
+    """Stripe client with a pooled session, timeouts, retries and idempotency keys"""
+
+    def __init__(self, api_key, api_base, timeout, max_retries, backoff, pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self.client = stripe.StripeClient(
+            api_key,
+            base_addresses={"api": api_base},
+            http_client=stripe.RequestsClient(timeout=timeout, session=session),
+            max_network_retries=0,
+        )
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def call(self, method, *args, **kwargs):
+        """Call a Stripe method, retrying transient failures with jittered backoff"""
+        for attempt in itertools.count():
+            try:
+                return method(*args, **kwargs)
+            except stripe.StripeError as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+            time.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1))
+
+    def create_payment_intent(self, order, amount, currency, metadata=None):
+        """Create the order's PaymentIntent; repeated calls return the same intent"""
+        return self.call(
+            self.client.v1.payment_intents.create,
+            params={
+                "amount": to_minor_units(amount),
+                "currency": currency,
+                "metadata": {"order_id": order.id, **(metadata or {})},
+            },
+            options={"idempotency_key": payment_intent_key(order.id)},
+        )
+
+
+@lru_cache(maxsize=8)
+def _get_gateway(*config):
+    return StripeGateway(*config)
+
+
+def get_gateway():
+    """Return the process-wide gateway for the current Stripe settings"""
+    return _get_gateway(
+        settings.STRIPE_SECRET_KEY,
+        settings.STRIPE_API_BASE,
+        (settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        settings.STRIPE_MAX_RETRIES,
+        settings.STRIPE_RETRY_BACKOFF,
+        settings.STRIPE_POOL_SIZE,
+    )
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql import parse, print_ast
+from graphql.validation import validate
+
+
+# A gql`...` template literal in the frontend's TypeScript sources
+GQL_TEMPLATE = re.compile(r"gql`(.*?)`", re.DOTALL)
+
+
+class PersistedQueryNotFound(Exception):
+    """Raised when a client sends a hash that was never registered"""
+
+    def __init__(self):
+        super().__init__("PersistedQueryNotFound")
+
+
+def hash_document(document):
+    """Return the sha256 hash a client sends for a parsed document"""
+    return hash_query(print_ast(document))
+
+
+def hash_query(query):
+    """Return the sha256 hex digest of a query string"""
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def frontend_documents(source):
+    """Yield (path, text) for every gql template in the *.ts files under source"""
+    for path in sorted(source.glob("*.ts")):
+        for text in GQL_TEMPLATE.findall(path.read_text(encoding="utf-8")):
+            yield path, text
+
+
+class DocumentCache:
+    """Thread-safe LRU cache of parsed and validated documents"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def put(self, key, document):
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+
+class Manifest:
+    """Registered documents keyed by hash, reloaded when the file changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def get(self, query_hash):
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                self._mtime, self._queries = None, {}
+                return None
+            if mtime != self._mtime:
+                with open(self.path, encoding="utf-8") as manifest_file:
+                    self._queries = json.load(manifest_file)
+                self._mtime = mtime
+            return self._queries.get(query_hash)
+
+    def write(self, queries):
+        with open(self.path, "w", encoding="utf-8") as manifest_file:
+            json.dump(queries, manifest_file, indent=2, sort_keys=True)
+            manifest_file.write("\n")
+
+
+document_cache = DocumentCache(settings.PERSISTED_QUERIES_CACHE_SIZE)
+manifest = Manifest(settings.PERSISTED_QUERIES_MANIFEST)
+
+
+def get_document(
+    schema, query=None, query_hash=None, validation_rules=None, max_errors=None
+):
+    """Return a parsed, validated document and any validation errors.
+
+    Persisted queries are looked up by hash in the manifest; plain query
+    strings are cached under the hash of their text. Only documents that
+    validate are cached, so the lookup is a dictionary hit afterwards.
+    """
+    if query is None:
+        key = query_hash
+    else:
+        key = hash_query(query)
+
+    cache_key = (id(schema), tuple(validation_rules or ()), key)
+    document = document_cache.get(cache_key)
+    if document is not None:
+        return document, []
+
+    if query is None:
+        query = manifest.get(query_hash)
+        if query is None:
+            raise PersistedQueryNotFound()
+
+    document = parse(query)
+    errors = validate(schema, document, validation_rules, max_errors)
+    if not errors:
+        document_cache.put(cache_key, document)
+    return document, errors
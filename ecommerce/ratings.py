@@ -0,0 +1,122 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, pre_delete
+
+from . import response_cache
+from .counting import invalidate_counts
+from .models import Product, Rating, User
+
+
+STARS = range(1, 6)
+
+HISTOGRAM_FIELDS = tuple(f"rating_{stars}_count" for stars in STARS)
+
+
+def histogram_field(stars):
+    return f"rating_{stars}_count"
+
+
+def apply_rating(product_id, stars, delta=1):
+    """Add (delta=1) or remove (delta=-1) one rating in a single UPDATE"""
+    count = F("rating_count") + delta
+    total = F("rating_sum") + stars * delta
+    Product.objects.filter(pk=product_id).update(
+        rating_count=count,
+        rating_sum=total,
+        average_rating=Case(
+            When(rating_count=-delta, then=Value(0.0)),
+            default=Cast(total, FloatField()) / Cast(count, FloatField()),
+            output_field=FloatField(),
+        ),
+        **{histogram_field(stars): F(histogram_field(stars)) + delta},
+    )
+    invalidate_counts(Product)
+
+
+def rebuild_rating_aggregates(batch_size=1000, product_ids=None):
+    """Recompute the aggregates of product_ids, or of every product, in one grouped query.
+
+    Returns the number of rated products.
+    """
+    ratings = Rating.objects.order_by()
+    products = Product.objects.all()
+    if product_ids is not None:
+        ratings = ratings.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+    rows = (
+        ratings
+        .values("product_id")
+        .annotate(
+            count=Count("id"),
+            total=Sum("rating"),
+            **{
+                histogram_field(stars): Count("id", filter=Q(rating=stars))
+                for stars in STARS
+            },
+        )
+    )
+    fields = ["rating_count", "rating_sum", "average_rating", *HISTOGRAM_FIELDS]
+    rated = 0
+    with transaction.atomic():
+        products.exclude(rating_count=0).update(
+            rating_count=0,
+            rating_sum=0,
+            average_rating=0,
+            **{field: 0 for field in HISTOGRAM_FIELDS},
+        )
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            product = Product(
+                pk=row["product_id"],
+                rating_count=row["count"],
+                rating_sum=row["total"],
+                average_rating=row["total"] / row["count"],
+                **{field: row[field] for field in HISTOGRAM_FIELDS},
+            )
+            batch.append(product)
+            if len(batch) == batch_size:
+                Product.objects.bulk_update(batch, fields)
+                rated += len(batch)
+                batch = []
+        Product.objects.bulk_update(batch, fields)
+        rated += len(batch)
+        response_cache.invalidate(response_cache.PRODUCTS)
+    invalidate_counts(Product)
+    return rated
+
+
+def remove_deleted_rating(sender, instance, origin=None, **kwargs):
+    """Signal receiver that takes a deleted rating out of its product's aggregates.
+
+    Ratings cascading from a deleted product go with it, and those of a
+    deleted user are recounted once per product by rebuild_user_ratings.
+    """
+    if origin is not None and getattr(origin, "model", type(origin)) is not Rating:
+        return
+    apply_rating(instance.product_id, instance.rating, delta=-1)
+    response_cache.invalidate(response_cache.PRODUCTS)
+
+
+def collect_user_ratings(sender, instance, **kwargs):
+    """Signal receiver noting which products a user about to be deleted has rated"""
+    ratings = Rating.objects.filter(rating_from=instance).order_by()
+    instance._rated_product_ids = list(ratings.values_list("product_id", flat=True).distinct())
+
+
+def rebuild_user_ratings(sender, instance, **kwargs):
+    """Signal receiver recounting the products a deleted user had rated"""
+    product_ids = getattr(instance, "_rated_product_ids", None)
+    if product_ids:
+        rebuild_rating_aggregates(product_ids=product_ids)
+
+
+post_delete.connect(
+    remove_deleted_rating, sender=Rating, dispatch_uid="rating_aggregates_post_delete"
+)
+pre_delete.connect(
+    collect_user_ratings, sender=User, dispatch_uid="rating_aggregates_user_pre_delete"
+)
+post_delete.connect(
+    rebuild_user_ratings, sender=User, dispatch_uid="rating_aggregates_user_post_delete"
+)
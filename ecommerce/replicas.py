@@ -0,0 +1,198 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.recorder import MigrationRecorder
+from graphql import OperationType
+
+from .middleware import attach_user
+
+
+# The replica alias the current GraphQL operation reads from, if any
+current_replica = ContextVar("read_replica", default=None)
+
+# Set while reads fill a shared cache, which must not hold replica lag
+reading_primary = ContextVar("read_primary", default=False)
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, including operations started in it.
+
+    For reads whose results are cached for everyone until an invalidation:
+    filled from a lagging replica, the cache would keep the data the
+    invalidation was meant to replace.
+    """
+    token = reading_primary.set(True)
+    try:
+        yield
+    finally:
+        reading_primary.reset(token)
+
+
+def check(alias):
+    """Whether a database is reachable and has the schema, i.e. a migrations table.
+
+    Raises SynchronousOnlyOperation on an event loop, where it cannot tell.
+    """
+    table = MigrationRecorder.Migration._meta.db_table
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM {table} LIMIT 1")
+        return True
+    except SynchronousOnlyOperation:
+        raise
+    except Exception:
+        try:
+            connections[alias].close()
+        except Exception:
+            pass
+        return False
+
+
+class ReplicaPool:
+    """Round-robin over the replicas in DATABASE_REPLICAS.
+
+    Each replica's health is checked at most once every
+    DATABASE_REPLICA_CHECK_INTERVAL seconds per process; replicas that
+    failed their last check are skipped until they pass again. Checks
+    cannot run on an event loop, so async callers refresh() on a thread
+    first; a check still due there keeps the replica's last result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = 0
+        self._checked = {}
+
+    def _due(self, state, now):
+        return state is None or now - state[1] >= settings.DATABASE_REPLICA_CHECK_INTERVAL
+
+    def healthy(self, alias):
+        now = time.monotonic()
+        state = self._checked.get(alias)
+        if self._due(state, now):
+            try:
+                state = (check(alias), now)
+            except SynchronousOnlyOperation:
+                return state is not None and state[0]
+            self._checked[alias] = state
+        return state[0]
+
+    def due(self):
+        """Whether any replica's health check has to run again"""
+        now = time.monotonic()
+        return any(
+            self._due(self._checked.get(alias), now) for alias in settings.DATABASE_REPLICAS
+        )
+
+    def refresh(self):
+        """Run the health checks that are due"""
+        for alias in settings.DATABASE_REPLICAS:
+            self.healthy(alias)
+
+    def choose(self):
+        """Return the next healthy replica, or None to read from the primary"""
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return None
+        with self._lock:
+            start = self._next
+            self._next = (start + 1) % len(replicas)
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            if self.healthy(alias):
+                return alias
+        return None
+
+    def reset(self):
+        with self._lock:
+            self._next = 0
+            self._checked.clear()
+
+
+pool = ReplicaPool()
+
+
+def _pin_key(user):
+    return f"replicas:pinned:{user.pk}"
+
+
+def pin(user):
+    """Send the user's reads to the primary for DATABASE_REPLICA_STICKY_SECONDS"""
+    if user.is_authenticated and settings.DATABASE_REPLICA_STICKY_SECONDS > 0:
+        cache.set(_pin_key(user), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(_pin_key(user), False)
+
+
+class OperationRouting:
+    """Where one GraphQL operation reads from.
+
+    Query operations read from a replica unless their user ran a mutation
+    in the last DATABASE_REPLICA_STICKY_SECONDS; everything else reads and
+    writes on the primary, and a finished mutation pins its user there.
+    """
+
+    def __init__(self, operation_type, request):
+        self.operation_type = operation_type
+        self.request = request
+        self.replica = None
+        self._token = None
+
+    def start(self):
+        if (
+            self.operation_type == OperationType.QUERY
+            and settings.DATABASE_REPLICAS
+            and not reading_primary.get()
+            and not is_pinned(attach_user(self.request))
+        ):
+            self.replica = pool.choose()
+        self._token = current_replica.set(self.replica)
+        return self
+
+    def finish(self):
+        current_replica.reset(self._token)
+        if self.operation_type == OperationType.MUTATION and settings.DATABASE_REPLICAS:
+            pin(attach_user(self.request))
+
+
+class ReplicaRouter:
+    """Reads of a GraphQL query operation go to its replica; all else to the primary.
+
+    Reads inside transaction.atomic() stay on the primary, so a
+    transaction sees its own writes and select_for_update() locks there;
+    so do reads inside primary().
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = current_replica.get()
+        if (
+            replica is None
+            or reading_primary.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import (
+    FragmentDefinitionNode,
+    OperationType,
+    get_operation_ast,
+    print_ast,
+)
+
+from .optimizer import collect_fields
+
+
+PRODUCTS = "products"
+CATEGORIES = "categories"
+
+# Root query fields whose responses are shared by every anonymous client,
+# with the tags that invalidate them.
+CACHEABLE_FIELDS = {
+    "allProducts": (PRODUCTS, CATEGORIES),
+    "allCategories": (CATEGORIES,),
+    "allSubCategories": (CATEGORIES,),
+    "productById": (PRODUCTS, CATEGORIES),
+    "searchProducts": (PRODUCTS, CATEGORIES),
+}
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.GRAPHQL_RESPONSE_CACHE]
+
+
+def get_tags(document, operation_name):
+    """Return the tags of a cacheable query operation, or None"""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.operation != OperationType.QUERY:
+        return None
+
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    tags = set()
+    for field_node in collect_fields([operation.selection_set], fragments):
+        if field_node.name.value == "__typename":
+            continue
+        field_tags = CACHEABLE_FIELDS.get(field_node.name.value)
+        if field_tags is None:
+            return None
+        tags.update(field_tags)
+    return sorted(tags) or None
+
+
+def _tag_key(tag):
+    return f"graphql:tag:{tag}"
+
+
+def _tag_versions(tags):
+    cache = get_cache()
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock so an evicted tag never revives old entries
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def make_key(document, operation_name, variables, auth_state, tags):
+    """Build the cache key for a normalized query, its variables and tag versions"""
+    payload = json.dumps(
+        [
+            print_ast(document),
+            operation_name,
+            variables or {},
+            auth_state,
+            _tag_versions(tags),
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return "graphql:response:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def invalidate(*tags):
+    """Expire every cached response carrying one of tags once the write commits"""
+
+    def bump():
+        cache = get_cache()
+        for tag in tags:
+            try:
+                cache.incr(_tag_key(tag))
+            except ValueError:
+                cache.set(_tag_key(tag), time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def get_or_compute(key, compute):
+    """Return the cached value for key, computing it once across callers.
+
+    compute returns ``(value, cacheable)``. Concurrent misses on the same
+    key wait for the first caller instead of all executing the query.
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_timeout = settings.GRAPHQL_RESPONSE_CACHE_LOCK_TIMEOUT
+    with _KeyLock(key):
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        lock_key = key + ":lock"
+        if not cache.add(lock_key, 1, lock_timeout):
+            # Another worker is computing the same key; wait for its result
+            deadline = time.monotonic() + lock_timeout
+            delay = 0.005
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                value = cache.get(key)
+                if value is not None:
+                    return value
+                delay = min(delay * 2, 0.1)
+            value, _ = compute()
+            return value
+
+        try:
+            value, cacheable = compute()
+            if cacheable:
+                cache.set(key, value, settings.GRAPHQL_RESPONSE_CACHE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+
+async def aget_or_compute(key, compute):
+    """get_or_compute for the async view; compute is a coroutine function.
+
+    Callers on one event loop are serialized by the cache-level lock alone,
+    waiting with asyncio.sleep so the loop keeps serving other requests.
+    """
+    cache = get_cache()
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    lock_timeout = settings.GRAPHQL_RESPONSE_CACHE_LOCK_TIMEOUT
+    lock_key = key + ":lock"
+    if not await cache.aadd(lock_key, 1, lock_timeout):
+        deadline = time.monotonic() + lock_timeout
+        delay = 0.005
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            value = await cache.aget(key)
+            if value is not None:
+                return value
+            delay = min(delay * 2, 0.1)
+        value, _ = await compute()
+        return value
+
+    try:
+        value, cacheable = await compute()
+        if cacheable:
+            await cache.aset(key, value, settings.GRAPHQL_RESPONSE_CACHE_TIMEOUT)
+    finally:
+        await cache.adelete(lock_key)
+    return value
+
+
+class _KeyLock:
+    """Per-key lock so threads of one worker share a single computation"""
+
+    def __init__(self, key):
+        with _local_locks_guard:
+            lock, users = _local_locks.get(key, (threading.Lock(), 0))
+            _local_locks[key] = (lock, users + 1)
+        self.key = key
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+        with _local_locks_guard:
+            lock, users = _local_locks[self.key]
+            if users == 1:
+                del _local_locks[self.key]
+            else:
+                _local_locks[self.key] = (lock, users - 1)
@@ -1,15 +1,20 @@
 from decimal import Decimal
 
 import graphene
-import stripe
 from django.contrib.auth import authenticate
 from django.db import transaction
 from graphene.types.decimal import Decimal
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from graphene_file_upload.scalars import Upload
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from . import images, response_cache
+from .cart_summary import get_cart_summary, invalidate_cart_prices, invalidate_cart_summary
+from .carts import add_lines, merge_lines, replace_lines
+from .checkout import checkout
+from .counting import APPROXIMATE, CACHED
+from .fields import BatchedFilterConnectionField, KeysetFilterConnectionField
+from .importing import ProductImporter, decode_lines, detect_format, read_rows
 from .filter import (
     CartFilter,
     CartItemFilter,
@@ -23,7 +28,9 @@ from .filter import (
     RatingFilter,
     SubCategoryFilter,
 )
+from .loaders import get_loaders
 from .models import (
+    LOW_STOCK_THRESHOLD,
     Cart,
     CartItem,
     Category,
@@ -37,7 +44,11 @@ from .models import (
     SubCategory,
     User,
 )
-from .node import CustomNode
+from .node import CountableConnection, CustomNode
+from .optimizer import optimize_queryset
+from .payments import get_gateway
+from .ratings import HISTOGRAM_FIELDS, apply_rating
+from .search import search_products
 
 
 # ==========================
@@ -58,6 +69,7 @@ class CategoryType(DjangoObjectType):
         model = Category
         filterset_class = CategoryFilter
         interfaces = (CustomNode,)
+        connection_class = CountableConnection
         fields = ("id", "name")
 
 
@@ -68,18 +80,33 @@ class SubCategoryType(DjangoObjectType):
         model = SubCategory
         filterset_class = SubCategoryFilter
         interfaces = (CustomNode,)
+        connection_class = CountableConnection
         fields = ("id", "name", "category")
 
+    def resolve_category(self, info):
+        return get_loaders(info).load(self, "category")
+
 
 class ProductType(DjangoObjectType):
     """GraphQL type for the Product model"""
 
+    images = BatchedFilterConnectionField(lambda: ProductImageType, required=True)
+    rating = BatchedFilterConnectionField(lambda: RatingType, required=True)
+    comments = BatchedFilterConnectionField(lambda: CommentType, required=True)
+    rating_histogram = graphene.List(
+        graphene.NonNull(graphene.Int),
+        required=True,
+        description="Number of 1 to 5 star ratings, in that order",
+    )
+
     class Meta:
         model = Product
         filterset_class = ProductFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
         fields = (
             "id",
+            "sku",
             "name",
             "category",
             "sub_category",
@@ -88,8 +115,31 @@ class ProductType(DjangoObjectType):
             "amount_in_stock",
             "created_at",
             "updated_at",
+            "images",
+            "rating",
+            "comments",
+            "average_rating",
+            "rating_count",
         )
 
+    def resolve_category(self, info):
+        return get_loaders(info).load(self, "category")
+
+    def resolve_sub_category(self, info):
+        return get_loaders(info).load(self, "sub_category")
+
+    def resolve_images(self, info, **kwargs):
+        return get_loaders(info).load(self, "images")
+
+    def resolve_rating(self, info, **kwargs):
+        return get_loaders(info).load(self, "rating")
+
+    def resolve_comments(self, info, **kwargs):
+        return get_loaders(info).load(self, "comments")
+
+    def resolve_rating_histogram(self, info):
+        return [getattr(self, field) for field in HISTOGRAM_FIELDS]
+
 
 class ProductImageType(DjangoObjectType):
     """GraphQL type for the ProductImage model"""
@@ -98,16 +148,57 @@ class ProductImageType(DjangoObjectType):
         model = ProductImage
         filterset_class = ProductImageFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
         fields = ("id", "product", "image")
 
+    thumbnail_url = graphene.String()
+    srcset = graphene.String(format=graphene.String())
+
+    def resolve_thumbnail_url(self, info):
+        return images.thumbnail_url(self)
+
+    def resolve_srcset(self, info, format=None):
+        return images.srcset(self, format)
+
+
+class CartSummaryLineType(graphene.ObjectType):
+    """Priced line of a cart summary"""
+
+    product_id = graphene.Int(required=True)
+    name = graphene.String(required=True)
+    quantity = graphene.Int(required=True)
+    unit_price = graphene.Decimal(required=True)
+    line_total = graphene.Decimal(required=True)
+
+
+class CartSummaryType(graphene.ObjectType):
+    """Item count and totals of a cart, cached per user"""
+
+    item_count = graphene.Int(required=True)
+    line_count = graphene.Int(required=True)
+    subtotal = graphene.Decimal(required=True)
+    lines = graphene.List(graphene.NonNull(CartSummaryLineType), required=True)
+
 
 class CartType(DjangoObjectType):
     """GraphQL type for Cart model"""
 
+    cart_items = BatchedFilterConnectionField(lambda: CartItemType, required=True)
+    cart_summary = graphene.Field(CartSummaryType, required=True)
+
     class Meta:
         model = Cart
         filterset_class = CartFilter
-        fields = ("id", "user")
+        fields = ("id", "user", "cart_items")
+
+    def resolve_user(self, info):
+        return get_loaders(info).load(self, "user")
+
+    def resolve_cart_items(self, info, **kwargs):
+        return get_loaders(info).load(self, "cart_items")
+
+    def resolve_cart_summary(self, info):
+        return get_cart_summary(self.user_id)
 
 
 class CartItemType(DjangoObjectType):
@@ -117,17 +208,37 @@ class CartItemType(DjangoObjectType):
         model = CartItem
         filterset_class = CartItemFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
         fields = ("id", "cart", "product", "quantity")
 
+    def resolve_cart(self, info):
+        return get_loaders(info).load(self, "cart")
+
+    def resolve_product(self, info):
+        return get_loaders(info).load(self, "product")
+
 
 class OrderType(DjangoObjectType):
     """GraphQL type for Order model"""
 
+    items = BatchedFilterConnectionField(lambda: OrderItemType, required=True)
+    payments = BatchedFilterConnectionField(lambda: PaymentType, required=True)
+
     class Meta:
         model = Order
         filterset_class = OrderFilter
         interfaces = (graphene.relay.Node,)
-        fields = ("id", "user", "status", "created_at")
+        connection_class = CountableConnection
+        fields = ("id", "user", "status", "total", "created_at", "items", "payments")
+
+    def resolve_user(self, info):
+        return get_loaders(info).load(self, "user")
+
+    def resolve_items(self, info, **kwargs):
+        return get_loaders(info).load(self, "items")
+
+    def resolve_payments(self, info, **kwargs):
+        return get_loaders(info).load(self, "payments")
 
 
 class OrderItemType(DjangoObjectType):
@@ -137,8 +248,15 @@ class OrderItemType(DjangoObjectType):
         model = OrderItem
         filterset_class = OrderItemFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
         fields = ("id", "order", "product", "quantity")
 
+    def resolve_order(self, info):
+        return get_loaders(info).load(self, "order")
+
+    def resolve_product(self, info):
+        return get_loaders(info).load(self, "product")
+
 
 class RatingType(DjangoObjectType):
     """GrapghQL type for Rating model"""
@@ -147,7 +265,14 @@ class RatingType(DjangoObjectType):
         model = Rating
         filterset_class = RatingFilter
         interfaces = (graphene.relay.Node,)
-        fields = ("id", "product", "rating_from", "stars", "comment")
+        connection_class = CountableConnection
+        fields = ("id", "product", "rating_from", "rating", "comment", "created_at")
+
+    def resolve_product(self, info):
+        return get_loaders(info).load(self, "product")
+
+    def resolve_rating_from(self, info):
+        return get_loaders(info).load(self, "rating_from")
 
 
 class CommentType(DjangoObjectType):
@@ -157,7 +282,14 @@ class CommentType(DjangoObjectType):
         model = Comment
         filterset_class = CommentFilter
         interfaces = (graphene.relay.Node,)
-        fields = ("id", "product", "comment_from", "body")
+        connection_class = CountableConnection
+        fields = ("id", "product", "comment_from", "body", "created_at")
+
+    def resolve_product(self, info):
+        return get_loaders(info).load(self, "product")
+
+    def resolve_comment_from(self, info):
+        return get_loaders(info).load(self, "comment_from")
 
 
 class PaymentType(DjangoObjectType):
@@ -167,6 +299,7 @@ class PaymentType(DjangoObjectType):
         model = Payment
         filterset_class = PaymentFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
         fields = (
             "id",
             "user",
@@ -175,6 +308,7 @@ class PaymentType(DjangoObjectType):
             "amount",
             "currency",
             "status",
+            "created_at",
         )
 
 
@@ -458,6 +592,7 @@ class CreateCategory(graphene.Mutation):
             raise Exception("Category with this name already exists.")
         category = Category(name=name)
         category.save()
+        response_cache.invalidate(response_cache.CATEGORIES)
         return CreateCategory(category=category, ok=True)
 
 
@@ -481,6 +616,7 @@ class UpdateCategory(graphene.Mutation):
 
         category.name = input.name
         category.save()
+        response_cache.invalidate(response_cache.CATEGORIES)
         return UpdateCategory(category=category, ok=True)
 
 
@@ -501,6 +637,7 @@ class DeleteCategory(graphene.Mutation):
             raise Exception("Category does not exist.")
 
         category.delete()
+        response_cache.invalidate(response_cache.CATEGORIES)
         return DeleteCategory(ok=True)
 
 
@@ -526,6 +663,7 @@ class CreateSubCategory(graphene.Mutation):
 
         sub_category = SubCategory(name=name, category=category)
         sub_category.save()
+        response_cache.invalidate(response_cache.CATEGORIES)
         return CreateSubCategory(sub_category=sub_category, ok=True)
 
 
@@ -555,6 +693,7 @@ class UpdateSubCategory(graphene.Mutation):
             raise Exception("Category does not exist.")
 
         sub_category.save()
+        response_cache.invalidate(response_cache.CATEGORIES)
         return UpdateSubCategory(sub_category=sub_category, ok=True)
 
 
@@ -575,6 +714,7 @@ class DeleteSubCategory(graphene.Mutation):
             raise Exception("Sub-category does not exist.")
 
         sub_category.delete()
+        response_cache.invalidate(response_cache.CATEGORIES)
         return DeleteSubCategory(ok=True)
 
 
@@ -618,6 +758,7 @@ class CreateProduct(graphene.Mutation):
             amount_in_stock=amount_in_stock,
         )
         product.save()
+        response_cache.invalidate(response_cache.PRODUCTS)
         return CreateProduct(product=product, ok=True)
 
 
@@ -639,6 +780,7 @@ class UpdateProduct(graphene.Mutation):
         except Product.DoesNotExist:
             raise Exception("Product does not exist.")
 
+        priced = (product.name, product.price)
         product.name = input.name
         try:
             category = Category.objects.get(pk=input.categoryId)
@@ -659,6 +801,9 @@ class UpdateProduct(graphene.Mutation):
         product.price = input.price
         product.amount_in_stock = input.amountInStock
         product.save()
+        response_cache.invalidate(response_cache.PRODUCTS)
+        if (product.name, product.price) != priced:
+            invalidate_cart_prices()
         return UpdateProduct(product=product, ok=True)
 
 
@@ -679,9 +824,56 @@ class DeleteProduct(graphene.Mutation):
             raise Exception("Product does not exist.")
 
         product.delete()
+        response_cache.invalidate(response_cache.PRODUCTS)
+        invalidate_cart_prices()
         return DeleteProduct(ok=True)
 
 
+class ImportErrorType(graphene.ObjectType):
+    """Row of an import file that was skipped"""
+
+    line = graphene.Int(required=True)
+    message = graphene.String(required=True)
+
+
+class ImportProducts(graphene.Mutation):
+    """Mutation to upsert products by sku from an uploaded CSV or JSONL file"""
+
+    class Arguments:
+        file = Upload(required=True)
+        format = graphene.String()  # "csv" or "jsonl"; taken from the file name by default
+        create_categories = graphene.Boolean(default_value=False)
+
+    rows = graphene.Int()
+    imported = graphene.Int()
+    bad_rows = graphene.Int()
+    errors = graphene.List(graphene.NonNull(ImportErrorType))
+    rows_per_second = graphene.Float()
+    ok = graphene.Boolean()
+
+    @staticmethod
+    def mutate(root, info, file, format=None, create_categories=False):
+        """Stream the upload through the importer row by row"""
+        user = info.context.user
+        if user.is_anonymous:
+            raise Exception("Authentication required.")
+        if not user.is_staff:
+            raise Exception("Not authorized to import products.")
+
+        file_format = format or detect_format(file.name)
+        report = ProductImporter(create_missing=create_categories).run(
+            read_rows(decode_lines(file), file_format)
+        )
+        return ImportProducts(
+            rows=report.rows,
+            imported=report.imported,
+            bad_rows=report.bad_rows,
+            errors=[ImportErrorType(line=line, message=message) for line, message in report.errors],
+            rows_per_second=report.rows_per_second,
+            ok=True,
+        )
+
+
 class CreateProductImage(graphene.Mutation):
     """Mutation to create a new product image"""
 
@@ -701,6 +893,8 @@ class CreateProductImage(graphene.Mutation):
 
         product_image = ProductImage(product=product, image=input.image)
         product_image.save()
+        images.schedule_variants(product_image)
+        response_cache.invalidate(response_cache.PRODUCTS)
         return CreateProductImage(product_image=product_image, ok=True)
 
 
@@ -721,6 +915,7 @@ class DeleteProductImageById(graphene.Mutation):
             raise Exception("Product image does not exist.")
 
         product_image.delete()
+        response_cache.invalidate(response_cache.PRODUCTS)
         return DeleteProductImageById(ok=True)
 
 
@@ -743,6 +938,8 @@ class AddProductImageToProduct(graphene.Mutation):
 
         product_image = ProductImage(product=product, image=input.image)
         product_image.save()
+        images.schedule_variants(product_image)
+        response_cache.invalidate(response_cache.PRODUCTS)
         return AddProductImageToProduct(product_image=product_image, ok=True)
 
 
@@ -779,10 +976,59 @@ class AddToCart(graphene.Mutation):
         else:
             cart_item.quantity = input.quantity
         cart_item.save()
+        invalidate_cart_summary(user.id)
 
         return AddToCart(cart_item=cart_item, ok=True)
 
 
+class AddToCartBatch(graphene.Mutation):
+    """Mutation to add several products to a user's cart at once"""
+
+    class Arguments:
+        items = graphene.List(graphene.NonNull(CartItemInput), required=True)
+
+    cart = graphene.Field(CartType)
+    ok = graphene.Boolean()
+
+    @staticmethod
+    def mutate(root, info, items):
+        """Add every line to the cart, summing with quantities already there"""
+        user = info.context.user
+        if user.is_anonymous:
+            raise Exception("Authentication required.")
+
+        quantities = merge_lines(items)
+        with transaction.atomic():
+            cart, _ = Cart.objects.get_or_create(user=user)
+            add_lines(cart, quantities)
+        invalidate_cart_summary(user.id)
+        return AddToCartBatch(cart=cart, ok=True)
+
+
+class ReplaceCart(graphene.Mutation):
+    """Mutation to replace the whole content of a user's cart"""
+
+    class Arguments:
+        items = graphene.List(graphene.NonNull(CartItemInput), required=True)
+
+    cart = graphene.Field(CartType)
+    ok = graphene.Boolean()
+
+    @staticmethod
+    def mutate(root, info, items):
+        """Make the cart hold exactly the given lines"""
+        user = info.context.user
+        if user.is_anonymous:
+            raise Exception("Authentication required.")
+
+        quantities = merge_lines(items)
+        with transaction.atomic():
+            cart, _ = Cart.objects.get_or_create(user=user)
+            replace_lines(cart, quantities)
+        invalidate_cart_summary(user.id)
+        return ReplaceCart(cart=cart, ok=True)
+
+
 class UpdateCartItem(graphene.Mutation):
     """Mutation to update the quantity of a cart item"""
 
@@ -810,6 +1056,7 @@ class UpdateCartItem(graphene.Mutation):
 
         cart_item.quantity = quantity
         cart_item.save()
+        invalidate_cart_summary(user.id)
         return UpdateCartItem(cart_item=cart_item, ok=True)
 
 
@@ -834,6 +1081,7 @@ class RemoveCartItem(graphene.Mutation):
             raise Exception("Cart item does not exist.")
 
         cart_item.delete()
+        invalidate_cart_summary(user.id)
         return RemoveCartItem(ok=True)
 
 
@@ -861,41 +1109,10 @@ class CreateOrder(graphene.Mutation):
         except Cart.DoesNotExist:
             raise Exception("Cart does not exist.")
 
-        if not cart or not cart.cart_items.exists():
-            raise Exception("Cart is empty.")
-
         with transaction.atomic():
-            # Pre-check stock availability
-            for item in cart.cart_items.all():
-                if item.product.amount_in_stock < item.quantity:
-                    raise Exception(
-                        f"Insufficient stock for product {item.product.name}."
-                    )
-
-            order = Order(user=user, status=status, total=Decimal("0.00"))
-            order.save()
-
-            order_total = Decimal("0.00")
-            for item in cart.cart_items.all():
-                # Decrement stock
-                item.product.amount_in_stock -= item.quantity
-                item.product.save()
-
-                # Create order item
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                )
-                order_total += item.product.price * item.quantity
-
-            # Save computed total
-            order.total = order_total
-            order.save()
-
-            # Clear user cart
-            cart.cart_items.all().delete()
+            order = checkout(cart, status)
 
+        invalidate_cart_summary(user.id)
         return CreateOrder(order=order, ok=True)
 
 
@@ -931,7 +1148,10 @@ class CreateRating(graphene.Mutation):
             rating=input.stars,
             comment=input.comment,
         )
-        rating.save()
+        with transaction.atomic():
+            rating.save()
+            apply_rating(product.pk, rating.rating)
+        response_cache.invalidate(response_cache.PRODUCTS)
         return CreateRating(rating=rating, ok=True)
 
 
@@ -965,6 +1185,7 @@ class CreateComment(graphene.Mutation):
             body=input.body,
         )
         comment.save()
+        response_cache.invalidate(response_cache.PRODUCTS)
         return CreateComment(comment=comment, ok=True)
 
 
@@ -993,32 +1214,29 @@ class CreatePayment(graphene.Mutation):
             order = Order.objects.get(pk=input.order_id)
         except Order.DoesNotExist:
             raise Exception("Order does not exist.")
+        if order.user_id != user.id:
+            raise Exception("Not authorized to pay for another user's order.")
 
-        # Create Stripe PaymentIntent here
+        # The order total is charged whatever amount the client sent. The
+        # idempotency key is derived from the order, so a retried request
+        # gets the same PaymentIntent back instead of a new one
         try:
-            intent = stripe.PaymentIntent.create(
-                amount=int(Decimal(input.amount) * Decimal(100)).quantize(
-                    Decimal("1")
-                ),  # amount in cents
-                currency=input.currency,
-                metadata={
-                    "user_id": user.id,
-                    "order_id": order.id,
-                    "cart_id": cart.id,
-                },
+            intent = get_gateway().create_payment_intent(
+                order, order.total, input.currency, metadata={"user_id": user.id}
             )
         except Exception as e:
             raise Exception(f"Stripe PaymentIntent creation failed: {str(e)}")
 
-        payment = Payment(
-            user=user,
-            order=order,
+        payment, _ = Payment.objects.get_or_create(
             stripe_payment_intent=intent["id"],
-            amount=input.amount,
-            currency=input.currency,
-            status="processing",  # initial status,
+            defaults={
+                "user": user,
+                "order": order,
+                "amount": order.total,
+                "currency": input.currency,
+                "status": "processing",  # initial status
+            },
         )
-        payment.save()
         return CreatePayment(
             payment=payment, client_secret=intent["client_secret"], ok=True
         )
@@ -1031,18 +1249,18 @@ class Query(graphene.ObjectType):
     """GraphQl Query to fetch user"""
 
     user = graphene.Field(UserType, id=graphene.Int(required=True))
-    all_categories = DjangoFilterConnectionField(CategoryType)
-    all_sub_categories = DjangoFilterConnectionField(SubCategoryType)
-    all_products = DjangoFilterConnectionField(ProductType)
+    all_categories = BatchedFilterConnectionField(CategoryType, total_count=CACHED)
+    all_sub_categories = BatchedFilterConnectionField(SubCategoryType, total_count=CACHED)
+    all_products = KeysetFilterConnectionField(ProductType, total_count=CACHED)
     product_by_id = graphene.Field(
         ProductType,
         id=graphene.Int(required=True),
     )
-    product_by_category = DjangoFilterConnectionField(
+    product_by_category = BatchedFilterConnectionField(
         ProductType,
         category_id=graphene.Int(required=True),
     )
-    product_by_sub_category = DjangoFilterConnectionField(
+    product_by_sub_category = BatchedFilterConnectionField(
         ProductType,
         sub_category_id=graphene.Int(required=True),
     )
@@ -1060,9 +1278,10 @@ class Query(graphene.ObjectType):
     )
 
     # Search queries can be added here
-    search_products = graphene.List(
+    search_products = BatchedFilterConnectionField(
         ProductType,
-        name=graphene.String(required=True),
+        query=graphene.String(required=True),
+        total_count=CACHED,
     )
     product_by_price_range = graphene.List(
         ProductType,
@@ -1079,35 +1298,42 @@ class Query(graphene.ObjectType):
     )
 
     cart = graphene.Field(CartType)
-    cart_items = DjangoFilterConnectionField(CartItemType)
-    all_cart_items = DjangoFilterConnectionField(CartItemType)
+    cart_items = BatchedFilterConnectionField(CartItemType)
+    all_cart_items = BatchedFilterConnectionField(CartItemType)
 
-    orders = DjangoFilterConnectionField(OrderType)
-    order_items = DjangoFilterConnectionField(OrderItemType)
+    orders = KeysetFilterConnectionField(OrderType)
+    order_items = BatchedFilterConnectionField(OrderItemType)
 
-    all_ratings = DjangoFilterConnectionField(RatingType)
-    all_comments = DjangoFilterConnectionField(CommentType)
-    all_payments = DjangoFilterConnectionField(PaymentType)
+    all_ratings = KeysetFilterConnectionField(RatingType, total_count=APPROXIMATE)
+    all_comments = KeysetFilterConnectionField(CommentType, total_count=APPROXIMATE)
+    all_payments = KeysetFilterConnectionField(PaymentType)
 
     def resolve_products(self, info, filter=None):
         """
         Resolver to fetch products with optional filtering.
         Supports:
-          - name (icontains)
+          - name (word prefix search)
           - category (exact)
           - subcategory (exact)
           - price__gte / price__lte
           - stock__gte / stock__lte
-          - low_stock (True → amount_in_stock < 10)
+          - low_stock (True → amount_in_stock < LOW_STOCK_THRESHOLD)
         """
+        return get_loaders(info).prime(Query.filter_products(info, filter))
+
+    @staticmethod
+    def filter_products(info, filter):
+        """Build the products queryset for resolve_products"""
         qs = Product.objects.all()
 
+        qs = optimize_queryset(qs, info)
+
         if not filter:
             return qs
 
         # name
         if filter.get("name"):
-            qs = qs.filter(name__icontains=filter["name"])
+            qs = search_products(qs, filter["name"], name_only=True, ranked=False)
 
         # category
         if filter.get("category"):
@@ -1131,14 +1357,21 @@ class Query(graphene.ObjectType):
 
         # low_stock flag
         if filter.get("low_stock"):
-            qs = qs.filter(amount_in_stock__lt=10)
+            qs = qs.filter(amount_in_stock__lt=LOW_STOCK_THRESHOLD)
 
         return qs
 
+    def resolve_cart(self, info):
+        """Resolver to fetch the authenticated user's cart"""
+        user = info.context.user
+        if user.is_anonymous:
+            raise Exception("Authentication required.")
+        return Cart.objects.filter(user=user).first()
+
     def resolve_product_by_id(self, info, id):
         """Resolver to fetch a product by ID"""
         try:
-            return Product.objects.filter(pk=id)
+            return optimize_queryset(Product.objects, info).get(pk=id)
         except Product.DoesNotExist:
             return None
 
@@ -1146,6 +1379,10 @@ class Query(graphene.ObjectType):
         """Resolver to fetch all products with optional filtering"""
         return Product.objects.all()
 
+    def resolve_search_products(self, info, query, **kwargs):
+        """Resolver to fetch products ranked by relevance to the search query"""
+        return search_products(Product.objects.all(), query)
+
     def resolve_user(self, info, id):
         """Resolver to felch a user by ID"""
         user = info.context.user
@@ -1159,12 +1396,44 @@ class Query(graphene.ObjectType):
         except User.DoesNotExist:
             return None
 
-    def resolve_products(self, info, filters=None):
+
+class AsyncQuery(Query):
+    """Query for the async view, with the hot reads on Django's async ORM"""
+
+    class Meta:
+        name = "Query"
+
+    async def resolve_products(self, info, filter=None):
         """Resolver to fetch products with optional filtering"""
-        # return Product.objects.get(id=id)
-        if filters:
-            return Product.objects.filter(**filters)
-        return Product.objects.all()
+        products = [product async for product in Query.filter_products(info, filter)]
+        return get_loaders(info).prime(products)
+
+    async def resolve_cart(self, info):
+        """Resolver to fetch the authenticated user's cart"""
+        user = info.context.user
+        if user.is_anonymous:
+            raise Exception("Authentication required.")
+        return await Cart.objects.filter(user=user).afirst()
+
+    async def resolve_product_by_id(self, info, id):
+        """Resolver to fetch a product by ID"""
+        try:
+            return await optimize_queryset(Product.objects, info).aget(pk=id)
+        except Product.DoesNotExist:
+            return None
+
+    async def resolve_user(self, info, id):
+        """Resolver to felch a user by ID"""
+        user = info.context.user
+
+        if user.is_anonymous:
+            raise Exception("Authentication required.")
+        if user.id != id:
+            raise Exception("Not authorized to view this user.")
+        try:
+            return await User.objects.aget(pk=id)
+        except User.DoesNotExist:
+            return None
 
 
 class Mutation(graphene.ObjectType):
@@ -1184,12 +1453,15 @@ class Mutation(graphene.ObjectType):
     create_product = CreateProduct.Field()
     update_product = UpdateProduct.Field()
     delete_product = DeleteProduct.Field()
+    import_products = ImportProducts.Field()
 
     create_product_image = CreateProductImage.Field()
     delete_product_image = DeleteProductImageById.Field()
     add_product_image_to_product = AddProductImageToProduct.Field()
 
     add_to_cart = AddToCart.Field()
+    add_to_cart_batch = AddToCartBatch.Field()
+    replace_cart = ReplaceCart.Field()
     update_cart_item = UpdateCartItem.Field()
     remove_cart_item = RemoveCartItem.Field()
 
@@ -0,0 +1,207 @@
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from .models import Category, Product, SubCategory
+
+
+SEARCH_TABLE = "ecommerce_product_search"
+
+# Product columns copied into the index; saves touching none of them skip it
+INDEXED_FIELDS = {"name", "description", "category", "sub_category"}
+
+CHUNK_SIZE = 500
+
+SQLITE_DOCUMENT = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, name, description, category, sub_category)
+    SELECT p.id, p.name, coalesce(p.description, ''), coalesce(c.name, ''), coalesce(s.name, '')
+    FROM ecommerce_product p
+    LEFT JOIN ecommerce_category c ON c.id = p.category_id
+    LEFT JOIN ecommerce_subcategory s ON s.id = p.sub_category_id
+    WHERE p.id IN ({{ids}})
+"""
+
+POSTGRES_DOCUMENT = f"""
+    INSERT INTO {SEARCH_TABLE} (product_id, document)
+    SELECT p.id,
+           setweight(to_tsvector('simple', p.name), 'A')
+           || setweight(to_tsvector('simple', coalesce(c.name, '') || ' ' || coalesce(s.name, '')), 'B')
+           || setweight(to_tsvector('simple', coalesce(p.description, '')), 'C')
+    FROM ecommerce_product p
+    LEFT JOIN ecommerce_category c ON c.id = p.category_id
+    LEFT JOIN ecommerce_subcategory s ON s.id = p.sub_category_id
+    WHERE p.id IN ({{ids}})
+    ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document
+"""
+
+# bm25 column weights for name, description, category and subcategory
+SQLITE_WEIGHTS = (10.0, 1.0, 5.0, 5.0)
+
+TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(text):
+    """Split user input into lowercase search terms"""
+    return [term.lower() for term in TERM.findall(text or "")]
+
+
+def _sqlite_match(terms, name_only):
+    column = "name : " if name_only else ""
+    return " ".join(f'{column}"{term}"*' for term in terms)
+
+
+def _postgres_tsquery(terms, name_only):
+    weight = "A" if name_only else ""
+    return " & ".join(f"{term}:*{weight}" for term in terms)
+
+
+def search_products(queryset, text, name_only=False, ranked=True):
+    """Filter a product queryset through the search index.
+
+    Every term must match as a word prefix of the product name, description
+    or category/subcategory names (only the name when name_only is set).
+    When ranked, rows carry ``search_rank`` and are ordered best match first.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+
+    table = queryset.model._meta.db_table
+    vendor = connections[queryset.db].vendor
+
+    if vendor == "sqlite":
+        match = _sqlite_match(terms, name_only)
+        queryset = queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f"{SEARCH_TABLE} MATCH %s", f"{SEARCH_TABLE}.rowid = {table}.id"],
+            params=[match],
+        )
+        if ranked:
+            weights = ", ".join(str(weight) for weight in SQLITE_WEIGHTS)
+            queryset = queryset.extra(
+                select={"search_rank": f"bm25({SEARCH_TABLE}, {weights})"},
+                order_by=["search_rank", "-id"],
+            )
+        return queryset
+
+    if vendor == "postgresql":
+        tsquery = _postgres_tsquery(terms, name_only)
+        queryset = queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[
+                f"{SEARCH_TABLE}.document @@ to_tsquery('simple', %s)",
+                f"{SEARCH_TABLE}.product_id = {table}.id",
+            ],
+            params=[tsquery],
+        )
+        if ranked:
+            queryset = queryset.extra(
+                select={
+                    "search_rank": f"ts_rank({SEARCH_TABLE}.document, to_tsquery('simple', %s))"
+                },
+                select_params=[tsquery],
+                order_by=["-search_rank", "-id"],
+            )
+        return queryset
+
+    # Backends without a search index fall back to substring matching
+    fields = ["name"]
+    if not name_only:
+        fields += ["description", "category__name", "sub_category__name"]
+    for term in terms:
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f"{field}__icontains": term})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def _chunks(product_ids):
+    chunk = []
+    for product_id in product_ids:
+        chunk.append(product_id)
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def index_products(product_ids):
+    """(Re)build the index rows of the given products.
+
+    Saves keep the index current through signals; bulk_create and
+    queryset.update() skip those, so bulk writers call this themselves.
+    """
+    connection = connections[router.db_for_write(Product)]
+    if connection.vendor not in ("sqlite", "postgresql"):
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            ids = ", ".join(["%s"] * len(chunk))
+            if connection.vendor == "sqlite":
+                cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({ids})", chunk)
+                cursor.execute(SQLITE_DOCUMENT.format(ids=ids), chunk)
+            else:
+                cursor.execute(POSTGRES_DOCUMENT.format(ids=ids), chunk)
+
+
+def remove_products(product_ids):
+    """Drop the index rows of deleted products"""
+    connection = connections[router.db_for_write(Product)]
+    if connection.vendor == "sqlite":
+        key = "rowid"
+    elif connection.vendor == "postgresql":
+        key = "product_id"
+    else:
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            ids = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {key} IN ({ids})", chunk)
+
+
+def index_saved_product(sender, instance, update_fields=None, **kwargs):
+    """Signal receiver that reindexes a product when an indexed column is saved"""
+    if update_fields is None or INDEXED_FIELDS.intersection(update_fields):
+        index_products([instance.pk])
+
+
+def unindex_deleted_product(sender, instance, **kwargs):
+    """Signal receiver that removes a deleted product from the index"""
+    remove_products([instance.pk])
+
+
+def index_renamed_category(sender, instance, created, **kwargs):
+    """Signal receiver that reindexes the products filed under a saved category"""
+    if created:
+        return
+    if sender is Category:
+        products = Product.objects.filter(category=instance)
+    else:
+        products = Product.objects.filter(sub_category=instance)
+    index_products(products.values_list("pk", flat=True).iterator())
+
+
+def collect_subcategory_products(sender, instance, **kwargs):
+    """Signal receiver that remembers which products lose a deleted subcategory"""
+    instance._search_product_ids = list(instance.products.values_list("pk", flat=True))
+
+
+def index_detached_products(sender, instance, **kwargs):
+    """Signal receiver that reindexes products whose subcategory was deleted"""
+    index_products(getattr(instance, "_search_product_ids", ()))
+
+
+post_save.connect(index_saved_product, sender=Product, dispatch_uid="search_product_saved")
+post_delete.connect(unindex_deleted_product, sender=Product, dispatch_uid="search_product_deleted")
+post_save.connect(index_renamed_category, sender=Category, dispatch_uid="search_category_saved")
+post_save.connect(index_renamed_category, sender=SubCategory, dispatch_uid="search_subcategory_saved")
+pre_delete.connect(
+    collect_subcategory_products, sender=SubCategory, dispatch_uid="search_subcategory_deleting"
+)
+post_delete.connect(
+    index_detached_products, sender=SubCategory, dispatch_uid="search_subcategory_deleted"
+)
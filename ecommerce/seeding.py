@@ -0,0 +1,386 @@
+import bisect
+import itertools
+import random
+import time
+from array import array
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from . import response_cache
+from .counting import invalidate_counts
+from .models import (
+    Cart,
+    CartItem,
+    Category,
+    Comment,
+    Order,
+    OrderItem,
+    Payment,
+    Product,
+    ProductImage,
+    Rating,
+    SubCategory,
+    User,
+)
+from .ratings import STARS, histogram_field
+from .search import index_products
+
+
+WORDS = (
+    "red blue green black white steel wooden leather cotton linen smart mini "
+    "pro max ultra classic vintage modern compact portable wireless digital "
+    "solar organic premium travel kitchen garden office sport outdoor kids "
+    "lamp chair table shoe boot jacket shirt phone watch speaker kettle mug "
+    "bottle bag backpack desk sofa pillow drill hammer bike helmet"
+).split()
+
+PASSWORD = "catalog"
+
+# Share of orders in each status; every order but a fresh "created" one has a payment
+ORDER_STATUSES = (
+    ("created", 10),
+    ("pending", 10),
+    ("paid", 55),
+    ("delivered", 20),
+    ("cancelled", 5),
+)
+PAYMENT_STATUSES = {
+    "pending": "processing",
+    "paid": "successful",
+    "delivered": "successful",
+    "cancelled": "cancelled",
+}
+# Reviews lean towards five stars, with a smaller bump at one
+STAR_WEIGHTS = (8, 4, 8, 20, 60)
+
+CENTS = Decimal("0.01")
+
+
+def zipf_weights(count, skew):
+    """Cumulative weights of ranks 1..count under a Zipf law with exponent skew"""
+    return list(itertools.accumulate(1 / rank**skew for rank in range(1, count + 1)))
+
+
+class ZipfSampler:
+    """Draws items so the k-th most popular is picked with weight 1/k**skew.
+
+    Popularity ranks are shuffled over the items, so the popular ones are
+    spread over the id range instead of being the oldest rows.
+    """
+
+    def __init__(self, rng, items, skew):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = zipf_weights(len(self.items), skew)
+        self.total = self.cum_weights[-1]
+
+    def __call__(self):
+        index = bisect.bisect(self.cum_weights, self.rng.random() * self.total)
+        return self.items[min(index, len(self.items) - 1)]
+
+    def draw(self, count):
+        """Draw count items at once"""
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=count)
+
+    def relabel(self, labels):
+        """Replace every item by labels[item], keeping its popularity"""
+        self.items = [labels[item] for item in self.items]
+
+    def sample(self, count):
+        """Draw count distinct items, sorted"""
+        count = min(count, len(self.items))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.add(self())
+        return sorted(chosen)
+
+
+class CatalogSeeder:
+    """Generates a deterministic catalog with realistic skew.
+
+    The same seed and sizes always produce the same rows. Rows are written
+    with bulk_create in batches of batch_size, committing every chunk_size
+    rows, so a large catalog never holds more than one chunk in memory or
+    in an open transaction. Ratings are drawn before the products, so each
+    product is inserted with its rating aggregates; signals are skipped, so
+    the search index is built per chunk and cached counts expire at the end.
+    """
+
+    def __init__(
+        self,
+        seed=0,
+        label="catalog",
+        categories=20,
+        sub_categories=5,
+        products=10_000,
+        images=2,
+        users=1_000,
+        carts=0.3,
+        orders=5_000,
+        items=4,
+        ratings=20_000,
+        comments=10_000,
+        skew=1.1,
+        batch_size=2_000,
+        chunk_size=50_000,
+        log=None,
+    ):
+        self.rng = random.Random(seed)
+        self.label = label
+        self.sizes = {
+            "categories": categories,
+            "sub_categories": sub_categories,
+            "products": products,
+            "images": images,
+            "users": users,
+            "carts": carts,
+            "orders": orders,
+            "items": items,
+            "ratings": ratings,
+            "comments": comments,
+        }
+        self.skew = skew
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.log = log or (lambda message: None)
+        self.counts = {}
+
+    def run(self):
+        """Seed every table; returns {model name: rows inserted}"""
+        sizes = self.sizes
+        self.category_ids = self.insert(
+            Category,
+            (Category(name=f"{self.label} {index}") for index in range(sizes["categories"])),
+            returning=True,
+        )
+        self.sub_category_ids = self.insert(
+            SubCategory,
+            (
+                SubCategory(name=f"{self.label} {category_id}.{index}", category_id=category_id)
+                for category_id in self.category_ids
+                for index in range(sizes["sub_categories"])
+            ),
+            returning=True,
+        )
+        categories = dict(
+            SubCategory.objects.filter(pk__in=self.sub_category_ids).values_list(
+                "pk", "category_id"
+            )
+        )
+
+        # Popularity is drawn over product positions and relabelled with ids once inserted
+        popular_products = ZipfSampler(self.rng, range(sizes["products"]), self.skew)
+        histograms = self.draw_ratings(popular_products)
+        prices = []
+        self.product_ids = self.insert(
+            Product,
+            self.products(categories, prices, histograms),
+            on_chunk=index_products,
+            returning=True,
+        )
+        self.prices = dict(zip(self.product_ids, prices))
+        popular_products.relabel(self.product_ids)
+        self.insert(
+            ProductImage,
+            (
+                ProductImage(
+                    product_id=product_id,
+                    image=f"product_images/{self.label}_{product_id}_{index}.jpg",
+                )
+                for product_id in self.product_ids
+                for index in range(self.rng.randint(1, 2 * sizes["images"] - 1))
+            ),
+        )
+
+        password = make_password(PASSWORD)
+        self.user_ids = self.insert(
+            User,
+            (
+                User(
+                    email=f"{self.label}-{index}@example.com",
+                    username=f"{self.label}-{index}",
+                    password=password,
+                )
+                for index in range(sizes["users"])
+            ),
+            returning=True,
+        )
+        active_users = ZipfSampler(self.rng, self.user_ids, self.skew * 0.7)
+
+        cart_users = self.rng.sample(self.user_ids, round(len(self.user_ids) * sizes["carts"]))
+        self.cart_ids = self.insert(
+            Cart, (Cart(user_id=user_id) for user_id in sorted(cart_users)), returning=True
+        )
+        self.insert(
+            CartItem,
+            (
+                CartItem(cart_id=cart_id, product_id=product_id, quantity=self.rng.randint(1, 3))
+                for cart_id in self.cart_ids
+                for product_id in popular_products.sample(self.rng.randint(1, 5))
+            ),
+        )
+
+        self.insert_orders(popular_products, active_users)
+        self.insert(Rating, self.ratings(histograms, active_users))
+        self.insert(
+            Comment,
+            (
+                Comment(
+                    product_id=popular_products(),
+                    comment_from_id=active_users(),
+                    body=self.words(12),
+                )
+                for _ in range(sizes["comments"])
+            ),
+        )
+
+        for model in (Category, SubCategory, Product, ProductImage, Rating, Comment):
+            invalidate_counts(model)
+        response_cache.invalidate(response_cache.PRODUCTS, response_cache.CATEGORIES)
+        return self.counts
+
+    def words(self, count):
+        return " ".join(self.rng.choices(WORDS, k=count))
+
+    def draw_ratings(self, popular_products):
+        """Count each product's ratings per star; returns one array per star"""
+        histograms = [array("l", [0]) * self.sizes["products"] for _ in STARS]
+        remaining = self.sizes["ratings"]
+        while remaining:
+            count = min(remaining, self.chunk_size)
+            stars = self.rng.choices(range(len(STARS)), weights=STAR_WEIGHTS, k=count)
+            for index, star in zip(popular_products.draw(count), stars):
+                histograms[star][index] += 1
+            remaining -= count
+        return histograms
+
+    def ratings(self, histograms, active_users):
+        for index, product_id in enumerate(self.product_ids):
+            for stars, histogram in zip(STARS, histograms):
+                for _ in range(histogram[index]):
+                    yield Rating(
+                        product_id=product_id,
+                        rating_from_id=active_users(),
+                        rating=stars,
+                        comment=self.words(6),
+                    )
+
+    def products(self, categories, prices, histograms):
+        sub_category_ids = sorted(categories)
+        for index in range(self.sizes["products"]):
+            counts = [histogram[index] for histogram in histograms]
+            rating_count = sum(counts)
+            rating_sum = sum(stars * count for stars, count in zip(STARS, counts))
+            sub_category_id = self.rng.choice(sub_category_ids)
+            # Prices are log-normal: most items are cheap, a few are very dear
+            price = Decimal(min(self.rng.lognormvariate(3.2, 1.0), 99_999)).quantize(CENTS)
+            prices.append(max(price, CENTS))
+            yield Product(
+                name=" ".join(self.rng.sample(WORDS, 2))[:20],
+                category_id=categories[sub_category_id],
+                sub_category_id=sub_category_id,
+                description=self.words(20),
+                price=prices[-1],
+                # Mostly a handful in stock, a long tail of bulk items, some sold out
+                amount_in_stock=min(int(self.rng.paretovariate(1.2) * 5) - 5, 10_000),
+                rating_count=rating_count,
+                rating_sum=rating_sum,
+                average_rating=rating_sum / rating_count if rating_count else 0,
+                **{histogram_field(stars): count for stars, count in zip(STARS, counts)},
+            )
+
+    def insert_orders(self, popular_products, active_users):
+        """Orders with their items and payments, committed one chunk of orders at a time"""
+        statuses, weights = zip(*ORDER_STATUSES)
+        per_chunk = max(1, self.chunk_size // self.sizes["items"])
+        started = time.perf_counter()
+        self.order_ids = []
+        for offset in range(0, self.sizes["orders"], per_chunk):
+            orders = []
+            for _ in range(min(per_chunk, self.sizes["orders"] - offset)):
+                lines = [
+                    (product_id, self.rng.randint(1, 3))
+                    for product_id in popular_products.sample(
+                        self.rng.randint(1, self.sizes["items"])
+                    )
+                ]
+                # Totals come from the stored prices, as checkout computes them
+                total = sum(self.prices[product_id] * quantity for product_id, quantity in lines)
+                orders.append(
+                    Order(
+                        user_id=active_users(),
+                        status=self.rng.choices(statuses, weights)[0],
+                        total=total,
+                    )
+                )
+                orders[-1].lines = lines
+
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(orders, batch_size=self.batch_size)
+                OrderItem.objects.bulk_create(
+                    [
+                        OrderItem(order_id=order.pk, product_id=product_id, quantity=quantity)
+                        for order in orders
+                        for product_id, quantity in order.lines
+                    ],
+                    batch_size=self.batch_size,
+                )
+                Payment.objects.bulk_create(
+                    [
+                        Payment(
+                            user_id=order.user_id,
+                            order_id=order.pk,
+                            stripe_payment_intent=f"pi_{self.label}_{order.pk}",
+                            amount=order.total,
+                            status=PAYMENT_STATUSES[order.status],
+                        )
+                        for order in orders
+                        if order.status in PAYMENT_STATUSES
+                    ],
+                    batch_size=self.batch_size,
+                )
+            self.order_ids.extend(order.pk for order in orders)
+            self.count(OrderItem, sum(len(order.lines) for order in orders))
+            self.count(Payment, sum(order.status in PAYMENT_STATUSES for order in orders))
+
+        self.count(Order, len(self.order_ids))
+        rows = sum(self.counts.get(model.__name__, 0) for model in (Order, OrderItem, Payment))
+        self.report("Order, OrderItem, Payment", rows, started)
+
+    def count(self, model, rows):
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + rows
+
+    def report(self, name, rows, started):
+        elapsed = time.perf_counter() - started
+        self.log(f"{name}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+
+    def insert(self, model, rows, on_chunk=None, returning=False):
+        """bulk_create rows chunk by chunk, each chunk in its own transaction.
+
+        on_chunk gets each chunk's new primary keys inside its transaction.
+        Returns the new primary keys when returning is set, else the count.
+        """
+        started = time.perf_counter()
+        pks = []
+        inserted = 0
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                created = model.objects.bulk_create(chunk, batch_size=self.batch_size)
+                if on_chunk is not None or returning:
+                    chunk_pks = [row.pk for row in created]
+                if on_chunk is not None:
+                    on_chunk(chunk_pks)
+            if returning:
+                pks.extend(chunk_pks)
+            inserted += len(chunk)
+
+        self.count(model, inserted)
+        self.report(model.__name__, inserted, started)
+        return pks if returning else inserted
@@ -1,3 +1,2243 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Count, Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import graphene
+import pyarrow.parquet
+from PIL import Image
+from prometheus_client import REGISTRY
+from graphql import OperationType, execute as graphql_execute, get_operation_ast, parse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ecommerceApiProject.schema import async_schema, schema
+
+from . import (
+    cart_summary, counting, inventory, middleware, persisted_queries, replicas, response_cache,
+    webhooks,
+)
+from .checkout import checkout
+from .cost import analyze
+from .executor import AsyncExecutionContext, run_sync
+from .exports import stream_export
+from .importing import ProductImporter, read_rows
+from .search import search_products
+from .seeding import CatalogSeeder
+from .filter import (
+    CartItemFilter,
+    CommentFilter,
+    OrderFilter,
+    OrderItemFilter,
+    PaymentFilter,
+    ProductFilter,
+    ProductImageFilter,
+    RatingFilter,
+    SubCategoryFilter,
+)
+from .webhooks import apply_events
+from .fake_stripe import FakeStripeServer, make_event, sign_payload
+from .models import (
+    Cart,
+    CartItem,
+    Category,
+    Comment,
+    Order,
+    OrderItem,
+    Payment,
+    Product,
+    ProductImage,
+    Rating,
+    SubCategory,
+    User,
+    WebhookEvent,
+)
+
+
+ALL_PRODUCTS_QUERY = """
+query GetAllProducts($first: Int) {
+  allProducts(first: $first) {
+    edges {
+      node {
+        id
+        name
+        category { id name }
+        subCategory { id name }
+        images { edges { node { id image } } }
+        rating { edges { node { id rating ratingFrom { id username } } } }
+        comments { edges { node { id body commentFrom { id username } } } }
+      }
+    }
+  }
+}
+"""
+
+ORDERS_QUERY = """
+query GetOrders($first: Int) {
+  orders(first: $first) {
+    edges {
+      node {
+        id
+        status
+        user { id email }
+        items { edges { node { id quantity product { ...ProductCard } } } }
+        payments { edges { node { id amount status } } }
+      }
+    }
+  }
+}
+
+fragment ProductCard on ProductType {
+  id
+  name
+  category { name }
+  images { edges { node { id image } } }
+}
+"""
+
+
+def execute(query, variables=None, user=None):
+    """Run a document against the schema with a fresh request as context"""
+    request = RequestFactory().post("/graphql-api/")
+    request.user = user or AnonymousUser()
+    return schema.execute(query, variable_values=variables, context_value=request)
+
+
+class ProductLoaderTests(TestCase):
+    """Relations on a product page load in batches, not once per product"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email="buyer@example.com", username="buyer", password="secret"
+        )
+        for index in range(25):
+            category = Category.objects.create(name=f"Category {index}")
+            sub_category = SubCategory.objects.create(
+                name=f"Sub {index}", category=category
+            )
+            product = Product.objects.create(
+                name=f"Product {index}",
+                category=category,
+                sub_category=sub_category,
+                price="9.99",
+                amount_in_stock=10,
+            )
+            ProductImage.objects.create(product=product, image=f"p{index}.png")
+            Rating.objects.create(
+                product=product, rating_from=user, rating=4, comment="Good"
+            )
+            Comment.objects.create(product=product, comment_from=user, body="Nice")
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        # keyset page joined with category/sub_category, then one prefetch
+        # each for images, rating (with rating_from) and comments
+        for first in (1, 5, 25):
+            with self.assertNumQueries(4):
+                result = execute(ALL_PRODUCTS_QUERY, {"first": first})
+            self.assertIsNone(result.errors)
+            edges = result.data["allProducts"]["edges"]
+            self.assertEqual(len(edges), first)
+
+    def test_batched_relations_match_each_product(self):
+        result = execute(ALL_PRODUCTS_QUERY, {"first": 25})
+        self.assertIsNone(result.errors)
+        for edge in result.data["allProducts"]["edges"]:
+            node = edge["node"]
+            index = node["name"].split()[-1]
+            self.assertEqual(node["category"]["name"], f"Category {index}")
+            self.assertEqual(node["subCategory"]["name"], f"Sub {index}")
+            images = node["images"]["edges"]
+            self.assertEqual([e["node"]["image"] for e in images], [f"p{index}.png"])
+            self.assertEqual(len(node["rating"]["edges"]), 1)
+            self.assertEqual(len(node["comments"]["edges"]), 1)
+
+
+class QueryOptimizerTests(TestCase):
+    """Nested selections are fetched with joins and prefetches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books")
+        products = [
+            Product.objects.create(
+                name=f"Book {index}", category=category, price="5.00"
+            )
+            for index in range(3)
+        ]
+        for product in products:
+            ProductImage.objects.create(product=product, image=f"{product.pk}.png")
+        for index in range(10):
+            user = User.objects.create_user(
+                email=f"user{index}@example.com", username=f"user{index}"
+            )
+            order = Order.objects.create(user=user)
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=2)
+            Payment.objects.create(
+                user=user,
+                order=order,
+                stripe_payment_intent=f"pi_{index}",
+                amount="30.00",
+            )
+
+    def test_nested_order_selection_uses_fixed_query_count(self):
+        # keyset page joined with user, items joined with product/category,
+        # item product images and payments
+        for first in (1, 10):
+            with self.assertNumQueries(4):
+                result = execute(ORDERS_QUERY, {"first": first})
+            self.assertIsNone(result.errors)
+            edges = result.data["orders"]["edges"]
+            self.assertEqual(len(edges), first)
+
+        node = edges[0]["node"]
+        self.assertEqual(len(node["items"]["edges"]), 3)
+        product = node["items"]["edges"][0]["node"]["product"]
+        self.assertEqual(product["category"]["name"], "Books")
+        self.assertEqual(len(product["images"]["edges"]), 1)
+        self.assertEqual(len(node["payments"]["edges"]), 1)
+
+    def test_filtered_nested_connection_is_not_prefetched(self):
+        query = """
+        query {
+          allProducts(first: 3) {
+            edges { node { id rating(minRating: 4) { edges { node { id } } } } }
+          }
+        }
+        """
+        result = execute(query)
+        self.assertIsNone(result.errors)
+        for edge in result.data["allProducts"]["edges"]:
+            self.assertEqual(edge["node"]["rating"]["edges"], [])
+
+
+class PersistedQueryTests(TestCase):
+    """Registered documents are served by hash from the document cache"""
+
+    query = "query GetCategories { allCategories { edges { node { id name } } } }"
+
+    def setUp(self):
+        Category.objects.create(name="Games")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.query_hash = persisted_queries.hash_document(parse(self.query))
+        manifest = persisted_queries.Manifest(Path(directory.name) / "queries.json")
+        manifest.write({self.query_hash: self.query})
+        patcher = mock.patch.object(persisted_queries, "manifest", manifest)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        persisted_queries.document_cache.clear()
+        self.addCleanup(persisted_queries.document_cache.clear)
+        response_cache.get_cache().clear()
+
+    def post(self, body):
+        return self.client.post(
+            "/graphql-api/", json.dumps(body), content_type="application/json"
+        )
+
+    def persisted(self, query_hash):
+        return {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}}
+
+    def test_hash_executes_registered_document(self):
+        response = self.post(self.persisted(self.query_hash))
+        self.assertEqual(response.status_code, 200)
+        edges = response.json()["data"]["allCategories"]["edges"]
+        self.assertEqual(edges[0]["node"]["name"], "Games")
+
+    def test_unknown_hash_is_reported(self):
+        response = self.post(self.persisted("0" * 64))
+        self.assertEqual(
+            response.json()["errors"][0]["message"], "PersistedQueryNotFound"
+        )
+
+    def test_documents_are_parsed_once(self):
+        with mock.patch.object(
+            persisted_queries, "parse", wraps=persisted_queries.parse
+        ) as parse_mock:
+            for _ in range(3):
+                self.post(self.persisted(self.query_hash))
+                self.post({"query": self.query})
+        self.assertEqual(parse_mock.call_count, 2)
+
+    def test_plain_queries_can_be_rejected(self):
+        with self.settings(PERSISTED_QUERIES_ONLY=True):
+            response = self.post({"query": self.query})
+            self.assertEqual(
+                response.json()["errors"][0]["message"],
+                "Only persisted queries are accepted.",
+            )
+            response = self.post(self.persisted(self.query_hash))
+            self.assertIn("data", response.json())
+
+
+class ResponseCacheTests(TestCase):
+    """Anonymous catalog queries are cached until a catalog write"""
+
+    query = "query { allCategories { edges { node { name } } } }"
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.category = Category.objects.create(name="Garden")
+
+    def post(self, body, **extra):
+        return self.client.post(
+            "/graphql-api/", json.dumps(body), content_type="application/json", **extra
+        )
+
+    def names(self, response):
+        edges = response.json()["data"]["allCategories"]["edges"]
+        return [edge["node"]["name"] for edge in edges]
+
+    def test_repeated_query_is_served_from_cache(self):
+        self.post({"query": self.query})
+        with self.assertNumQueries(0):
+            response = self.post({"query": self.query})
+        self.assertEqual(self.names(response), ["Garden"])
+
+    def test_catalog_mutation_invalidates_cached_responses(self):
+        self.assertEqual(self.names(self.post({"query": self.query})), ["Garden"])
+        mutation = """
+        mutation { createCategory(input: {name: "Kitchen"}) { ok } }
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post({"query": mutation})
+        response = self.post({"query": self.query})
+        self.assertEqual(sorted(self.names(response)), ["Garden", "Kitchen"])
+
+    def test_authenticated_and_non_catalog_queries_bypass_cache(self):
+        self.post({"query": self.query}, HTTP_AUTHORIZATION="Bearer token")
+        with self.assertNumQueries(1):
+            self.post({"query": self.query}, HTTP_AUTHORIZATION="Bearer token")
+
+        query = """
+        query {
+          allCategories { edges { node { name } } }
+          orders { edges { node { id } } }
+        }
+        """
+        self.post({"query": query})
+        with self.assertNumQueries(2):
+            self.post({"query": query})
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return "response", True
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    response_cache.get_or_compute("stampede", compute)
+                )
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["response"] * 8)
+
+
+class JWTMiddlewareTests(TestCase):
+    """The Bearer token is verified once per request, not once per field"""
+
+    query = """
+    query ($id: Int!) {
+      user(id: $id) { id email username }
+      allCategories { edges { node { id name } } }
+    }
+    """
+
+    def setUp(self):
+        middleware.user_cache.clear()
+        self.addCleanup(middleware.user_cache.clear)
+        self.user = User.objects.create_user(
+            email="jwt@example.com", username="jwt", password="secret"
+        )
+        for index in range(5):
+            Category.objects.create(name=f"Category {index}")
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def post(self):
+        return self.client.post(
+            "/graphql-api/",
+            json.dumps({"query": self.query, "variables": {"id": self.user.pk}}),
+            content_type="application/json",
+            **self.auth,
+        )
+
+    def test_token_is_validated_once_per_request(self):
+        with mock.patch.object(
+            middleware.jwt_authentication,
+            "get_validated_token",
+            wraps=middleware.jwt_authentication.get_validated_token,
+        ) as validate_mock:
+            response = self.post()
+        self.assertIsNone(response.json().get("errors"))
+        self.assertEqual(response.json()["data"]["user"]["email"], "jwt@example.com")
+        self.assertEqual(validate_mock.call_count, 1)
+
+    def test_cached_user_skips_lookup(self):
+        # user lookup, user field and category page
+        with self.assertNumQueries(3):
+            self.post()
+        with self.assertNumQueries(2):
+            self.post()
+
+    def test_invalid_token_is_anonymous(self):
+        self.auth = {"HTTP_AUTHORIZATION": "Bearer not-a-token"}
+        response = self.post()
+        self.assertEqual(
+            response.json()["errors"][0]["message"], "Authentication required."
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    """Keyset connections page newest first without OFFSET or COUNT"""
+
+    query = """
+    query ($first: Int, $after: String, $last: Int, $before: String, $categoryId: Decimal) {
+      allProducts(
+        first: $first, after: $after, last: $last, before: $before, category: $categoryId
+      ) {
+        edges { cursor node { name } }
+        pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.toys = Category.objects.create(name="Toys")
+        cls.tools = Category.objects.create(name="Tools")
+        for index in range(12):
+            Product.objects.create(
+                name=f"Product {index}",
+                category=cls.toys if index % 2 else cls.tools,
+                price="1.00",
+            )
+        # Give half the products identical timestamps to exercise the id tiebreak
+        Product.objects.filter(pk__lte=6).update(
+            created_at=Product.objects.get(pk=1).created_at
+        )
+
+    def fetch(self, **variables):
+        result = execute(self.query, variables)
+        self.assertIsNone(result.errors)
+        return result.data["allProducts"]
+
+    def names(self, page):
+        return [edge["node"]["name"] for edge in page["edges"]]
+
+    def test_forward_pages_cover_every_row_once(self):
+        expected = [
+            product.name for product in Product.objects.order_by("-created_at", "-pk")
+        ]
+        seen, after = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = self.fetch(first=5, after=after)
+            seen += self.names(page)
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+        self.assertEqual(seen, expected)
+
+    def test_backward_page_mirrors_forward_page(self):
+        forward = self.fetch(first=6)
+        second = self.fetch(first=3, after=forward["edges"][2]["cursor"])
+        backward = self.fetch(last=3, before=second["pageInfo"]["startCursor"])
+        self.assertEqual(self.names(backward), self.names(forward)[:3])
+        self.assertFalse(backward["pageInfo"]["hasPreviousPage"])
+        self.assertTrue(backward["pageInfo"]["hasNextPage"])
+
+    def test_filterset_applies_to_keyset_pages(self):
+        page = self.fetch(first=10, categoryId=self.toys.pk)
+        self.assertEqual(len(page["edges"]), 6)
+        self.assertFalse(page["pageInfo"]["hasNextPage"])
+
+    def test_offset_is_rejected(self):
+        result = execute("query { allProducts(offset: 5) { edges { cursor } } }")
+        self.assertIn("does not support offset", result.errors[0].message)
+
+
+class TotalCountTests(TestCase):
+    """totalCount is only computed when selected, with a per-field strategy"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Toys")
+        for index in range(5):
+            Product.objects.create(
+                name=f"Product {index}", category=cls.category, price="1.00"
+            )
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+
+    def test_unselected_total_count_skips_count_query(self):
+        query = """
+        query ($categoryId: Int!) { productByCategory(categoryId: $categoryId, first: 2) {
+          edges { node { name } } pageInfo { hasNextPage }
+        } }
+        """
+        with self.assertNumQueries(1) as context:
+            result = execute(query, {"categoryId": self.category.pk})
+        self.assertIsNone(result.errors)
+        self.assertTrue(result.data["productByCategory"]["pageInfo"]["hasNextPage"])
+        self.assertNotIn("COUNT", context.captured_queries[0]["sql"])
+
+    def test_exact_total_count(self):
+        query = """
+        query ($categoryId: Int!) { productByCategory(categoryId: $categoryId, first: 2) {
+          totalCount edges { node { name } }
+        } }
+        """
+        with self.assertNumQueries(2):
+            result = execute(query, {"categoryId": self.category.pk})
+        self.assertEqual(result.data["productByCategory"]["totalCount"], 5)
+        self.assertEqual(len(result.data["productByCategory"]["edges"]), 2)
+
+    def test_cached_total_count_is_reused_until_a_write(self):
+        query = "query { allProducts(first: 1) { totalCount } }"
+        self.assertEqual(execute(query).data["allProducts"]["totalCount"], 5)
+        with self.assertNumQueries(1):
+            result = execute(query)
+        self.assertEqual(result.data["allProducts"]["totalCount"], 5)
+
+        # Until the write commits, a count computed now could miss it
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="New", category=self.category, price="1.00")
+            self.assertEqual(execute(query).data["allProducts"]["totalCount"], 5)
+        self.assertEqual(execute(query).data["allProducts"]["totalCount"], 6)
+
+    def test_approximate_count_extrapolates_past_threshold(self):
+        with self.settings(GRAPHQL_APPROXIMATE_COUNT_THRESHOLD=100):
+            self.assertEqual(counting.approximate_count(Product.objects.all()), 5)
+        with self.settings(GRAPHQL_APPROXIMATE_COUNT_THRESHOLD=2):
+            queryset = Product.objects.all()
+            low = queryset.order_by("pk").first().pk
+            queryset.filter(pk=low + 1).delete()
+            self.assertEqual(counting.approximate_count(queryset), 3)
+
+
+class ProductSearchTests(TestCase):
+    """searchProducts ranks indexed matches and follows product writes"""
+
+    query = """
+    query ($query: String!) {
+      searchProducts(query: $query, first: 10) { edges { node { name } } }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name="Shoes")
+        cls.running = SubCategory.objects.create(name="Running", category=cls.shoes)
+        cls.runner = Product.objects.create(
+            name="Red runner", category=cls.shoes, sub_category=cls.running,
+            price="1.00", description="Light trainer",
+        )
+        cls.boot = Product.objects.create(
+            name="Blue boot", category=cls.shoes, price="1.00",
+            description="Leather boot with red laces",
+        )
+
+    def search(self, text):
+        result = execute(self.query, {"query": text})
+        self.assertIsNone(result.errors)
+        return [edge["node"]["name"] for edge in result.data["searchProducts"]["edges"]]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search("red"), ["Red runner", "Blue boot"])
+
+    def test_terms_match_word_prefixes_across_fields(self):
+        self.assertEqual(self.search("run shoe"), ["Red runner"])
+        self.assertEqual(self.search("leath"), ["Blue boot"])
+        self.assertEqual(self.search("ed"), [])
+        self.assertEqual(self.search("  "), [])
+
+    def test_index_follows_product_and_category_writes(self):
+        self.boot.name = "Green galosh"
+        self.boot.save()
+        self.assertEqual(self.search("galosh"), ["Green galosh"])
+        self.assertEqual(self.search("boot"), ["Green galosh"])
+
+        self.running.name = "Trail"
+        self.running.save()
+        self.assertEqual(self.search("trail"), ["Red runner"])
+
+        self.running.delete()
+        self.assertEqual(self.search("trail"), [])
+        self.assertEqual(self.search("red runner"), ["Red runner"])
+
+        self.runner.delete()
+        self.assertEqual(self.search("red"), ["Green galosh"])
+
+    def test_product_filter_name_matches_name_only(self):
+        result = execute('query { allProducts(name: "red") { edges { node { name } } } }')
+        self.assertIsNone(result.errors)
+        names = [edge["node"]["name"] for edge in result.data["allProducts"]["edges"]]
+        self.assertEqual(names, ["Red runner"])
+
+
+class RatingAggregateTests(TestCase):
+    """Product rating aggregates follow rating writes without loading ratings"""
+
+    mutation = """
+    mutation ($productId: Int!, $userId: Int!, $stars: Int!) {
+      createRating(input: {
+        productId: $productId, ratingFromId: $userId, stars: $stars, comment: "ok"
+      }) { ok }
+    }
+    """
+
+    products_query = """
+    query ($orderBy: String, $minRating: Decimal, $first: Int, $after: String) {
+      allProducts(orderBy: $orderBy, minRating: $minRating, first: $first, after: $after) {
+        edges { cursor node { name averageRating ratingCount ratingHistogram } }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Games")
+        cls.products = [
+            Product.objects.create(name=f"Game {index}", category=category, price="5.00")
+            for index in range(3)
+        ]
+        cls.users = [
+            User.objects.create_user(
+                email=f"rater{index}@example.com", username=f"rater{index}", password="x"
+            )
+            for index in range(3)
+        ]
+
+    def rate(self, product, user, stars):
+        variables = {"productId": product.pk, "userId": user.pk, "stars": stars}
+        with self.captureOnCommitCallbacks(execute=True):
+            result = execute(self.mutation, variables, user=user)
+        self.assertIsNone(result.errors)
+
+    def fetch(self, **variables):
+        result = execute(self.products_query, variables)
+        self.assertIsNone(result.errors)
+        return [edge["node"] for edge in result.data["allProducts"]["edges"]]
+
+    def test_create_and_delete_update_aggregates(self):
+        game = self.products[0]
+        self.rate(game, self.users[0], 5)
+        self.rate(game, self.users[1], 2)
+        game.refresh_from_db()
+        self.assertEqual((game.rating_count, game.rating_sum), (2, 7))
+        self.assertEqual(game.average_rating, 3.5)
+
+        Rating.objects.filter(rating=5).delete()
+        game.refresh_from_db()
+        self.assertEqual((game.rating_count, game.average_rating), (1, 2.0))
+
+        Rating.objects.all().delete()
+        game.refresh_from_db()
+        self.assertEqual((game.rating_count, game.average_rating), (0, 0.0))
+        self.assertEqual(game.rating_2_count, 0)
+
+    def test_fields_sort_and_filter(self):
+        self.rate(self.products[0], self.users[0], 3)
+        self.rate(self.products[1], self.users[0], 5)
+        self.rate(self.products[1], self.users[1], 4)
+
+        with self.assertNumQueries(1):
+            nodes = self.fetch(orderBy="-averageRating")
+        self.assertEqual([node["name"] for node in nodes], ["Game 1", "Game 0", "Game 2"])
+        self.assertEqual(nodes[0]["averageRating"], 4.5)
+        self.assertEqual(nodes[0]["ratingCount"], 2)
+        self.assertEqual(nodes[0]["ratingHistogram"], [0, 0, 0, 1, 1])
+
+        first = execute(self.products_query, {"orderBy": "averageRating", "first": 1})
+        after = first.data["allProducts"]["edges"][0]["cursor"]
+        names = [node["name"] for node in self.fetch(orderBy="averageRating", after=after)]
+        self.assertEqual(names, ["Game 0", "Game 1"])
+
+        nodes = self.fetch(minRating=4)
+        self.assertEqual([node["name"] for node in nodes], ["Game 1"])
+
+    def test_rebuild_recomputes_from_ratings(self):
+        Rating.objects.bulk_create(
+            [
+                Rating(product=self.products[2], rating_from=user, rating=stars, comment="")
+                for user, stars in zip(self.users, (1, 1, 4))
+            ]
+        )
+        Product.objects.filter(pk=self.products[0].pk).update(rating_count=9, rating_sum=9)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("rebuild_rating_aggregates", stdout=StringIO())
+
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].rating_count, 0)
+        self.products[2].refresh_from_db()
+        self.assertEqual(self.products[2].rating_count, 3)
+        self.assertEqual(self.products[2].average_rating, 2.0)
+        self.assertEqual(self.products[2].rating_1_count, 2)
+
+    def test_cascade_deletes_recount_once(self):
+        for product in self.products:
+            for user, stars in zip(self.users, (5, 3, 1)):
+                self.rate(product, user, stars)
+
+        def delete(instance):
+            with CaptureQueriesContext(connection) as queries:
+                instance.delete()
+            return [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+
+        # A deleted product's ratings go with it
+        self.assertEqual(delete(self.products[2]), [])
+
+        # A deleted user's products are recounted together
+        self.assertEqual(len(delete(self.users[0])), 2)
+        for product in self.products[:2]:
+            product.refresh_from_db()
+            self.assertEqual((product.rating_count, product.rating_sum), (2, 4))
+            self.assertEqual(product.average_rating, 2.0)
+            self.assertEqual(product.rating_5_count, 0)
+
+
+class CheckoutTests(TestCase):
+    """CreateOrder runs a fixed number of queries whatever the cart size"""
+
+    mutation = 'mutation { createOrder(status: "created") { ok order { id total } } }'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="shopper@example.com", username="shopper", password="secret"
+        )
+        cls.cart = Cart.objects.create(user=cls.user)
+        category = Category.objects.create(name="Pantry")
+        cls.products = [
+            Product.objects.create(
+                name=f"Jar {index}", category=category, price="2.50", amount_in_stock=10
+            )
+            for index in range(30)
+        ]
+
+    def fill_cart(self, size, quantity=2):
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=self.cart, product=product, quantity=quantity)
+                for product in self.products[:size]
+            ]
+        )
+
+    def checkout(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return execute(self.mutation, user=self.user)
+
+    def test_query_count_does_not_grow_with_cart(self):
+        query_counts = []
+        for size in (1, 30):
+            self.fill_cart(size)
+            with CaptureQueriesContext(connection) as captured:
+                result = self.checkout()
+            self.assertIsNone(result.errors)
+            query_counts.append(len(captured))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_order_total_stock_and_cart(self):
+        self.fill_cart(3)
+        result = self.checkout()
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["createOrder"]["order"]["total"], "15.00")
+
+        order = Order.objects.get()
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products[:3]])
+                 .values_list("amount_in_stock", flat=True)),
+            [8, 8, 8],
+        )
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_short_line_rolls_back_everything(self):
+        self.fill_cart(2)
+        CartItem.objects.filter(product=self.products[1]).update(quantity=11)
+        result = self.checkout()
+        self.assertEqual(
+            result.errors[0].message, "Insufficient stock for product Jar 1."
+        )
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].amount_in_stock, 10)
+
+
+class InventoryReservationTests(TestCase):
+    """Checkout holds stock until payment commits or releases it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Limited")
+        cls.product = Product.objects.create(
+            name="Hot SKU", category=category, price="10.00", amount_in_stock=3
+        )
+        cls.users = [
+            User.objects.create_user(
+                email=f"buyer{index}@example.com", username=f"buyer{index}", password="x"
+            )
+            for index in range(2)
+        ]
+
+    def buy(self, user, quantity):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=quantity)
+        with transaction.atomic():
+            return checkout(cart)
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.amount_in_stock
+
+    def test_checkout_holds_stock_until_released(self):
+        order = self.buy(self.users[0], 2)
+        reservation = order.reservations.get()
+        self.assertEqual((reservation.status, reservation.quantity), ("held", 2))
+        self.assertEqual(self.stock(), 1)
+
+        self.assertEqual(inventory.release_order(order), 1)
+        self.assertEqual(inventory.release_order(order), 0)
+        self.assertEqual(self.stock(), 3)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "cancelled")
+
+    def test_expired_holds_are_released_for_the_next_buyer(self):
+        first = self.buy(self.users[0], 3)
+        first.reservations.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        second = self.buy(self.users[1], 2)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(first.reservations.get().status, "released")
+        self.assertEqual(second.reservations.get().status, "held")
+
+    def test_held_stock_is_not_sold_twice(self):
+        self.buy(self.users[0], 3)
+        with self.assertRaisesMessage(Exception, "Insufficient stock for product Hot SKU."):
+            self.buy(self.users[1], 1)
+        self.assertEqual(self.stock(), 0)
+
+    def test_commit_retakes_stock_released_by_expiry(self):
+        order = self.buy(self.users[0], 2)
+        inventory.release_expired(now=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.stock(), 3)
+
+        inventory.commit_order(order)
+        self.assertEqual(order.reservations.get().status, "committed")
+        self.assertEqual(self.stock(), 1)
+
+    def test_stock_changes_expire_cached_product_responses(self):
+        tags = [response_cache.PRODUCTS]
+        order = self.buy(self.users[0], 2)
+        for change in (
+            lambda: inventory.release_expired(now=timezone.now() + timedelta(days=1)),
+            lambda: inventory.commit_orders({order.pk}),
+        ):
+            before = response_cache._tag_versions(tags)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertNotEqual(response_cache._tag_versions(tags), before)
+
+
+class BatchCartTests(TestCase):
+    """Batch cart mutations validate and upsert every line at once"""
+
+    add = """
+    mutation ($items: [CartItemInput!]!) {
+      addToCartBatch(items: $items) {
+        ok
+        cart { cartItems { edges { node { quantity product { name } } } } }
+      }
+    }
+    """
+
+    replace = """
+    mutation ($items: [CartItemInput!]!) {
+      replaceCart(items: $items) {
+        cart { cartItems { edges { node { quantity product { name } } } } }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="batch@example.com", username="batch", password="secret"
+        )
+        cls.cart = Cart.objects.create(user=cls.user)
+        category = Category.objects.create(name="Bulk")
+        cls.products = [
+            Product.objects.create(name=f"Bulk {index}", category=category, price="1.00")
+            for index in range(20)
+        ]
+
+    def items(self, products, quantity=1):
+        return [
+            {"cartId": self.cart.pk, "productId": product.pk, "quantity": quantity}
+            for product in products
+        ]
+
+    def lines(self, result, field):
+        self.assertIsNone(result.errors)
+        edges = result.data[field]["cart"]["cartItems"]["edges"]
+        return {edge["node"]["product"]["name"]: edge["node"]["quantity"] for edge in edges}
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        for products in (self.products[:2], self.products[2:20]):
+            # cart, product check, cart lock, existing lines, upsert, then the
+            # returned cart's lines and products (plus the savepoint pair)
+            with self.assertNumQueries(9):
+                result = execute(self.add, {"items": self.items(products)}, user=self.user)
+            self.assertIsNone(result.errors)
+        self.assertEqual(self.cart.cart_items.count(), 20)
+
+    def test_add_sums_with_existing_and_duplicate_lines(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=2)
+        items = self.items(self.products[:2]) + self.items(self.products[:1], quantity=4)
+        result = execute(self.add, {"items": items}, user=self.user)
+        self.assertEqual(self.lines(result, "addToCartBatch"), {"Bulk 0": 7, "Bulk 1": 1})
+
+    def test_add_locks_the_cart(self):
+        # SQLite has no FOR UPDATE; have it built as an empty clause to see it used
+        with mock.patch.object(connection.features, "has_select_for_update", True), \
+                mock.patch.object(connection.ops, "for_update_sql", return_value="") as lock, \
+                CaptureQueriesContext(connection) as queries:
+            result = execute(self.add, {"items": self.items(self.products[:1])}, user=self.user)
+        self.assertIsNone(result.errors)
+        lock.assert_called_once()
+        locked = [query["sql"] for query in queries if query["sql"].endswith("LIMIT 1")]
+        self.assertIn('FROM "ecommerce_cart" WHERE "ecommerce_cart"."id" =', locked[-1])
+
+    def test_replace_drops_unlisted_lines(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=2)
+        items = self.items(self.products[1:3], quantity=5)
+        result = execute(self.replace, {"items": items}, user=self.user)
+        self.assertEqual(self.lines(result, "replaceCart"), {"Bulk 1": 5, "Bulk 2": 5})
+
+    def test_unknown_product_rejects_whole_batch(self):
+        items = self.items(self.products[:1]) + [
+            {"cartId": self.cart.pk, "productId": 999999, "quantity": 1}
+        ]
+        result = execute(self.add, {"items": items}, user=self.user)
+        self.assertEqual(result.errors[0].message, "Product does not exist: 999999.")
+        self.assertFalse(self.cart.cart_items.exists())
+
+
+class CartSummaryTests(TestCase):
+    """cartSummary is priced in one query and cached until the cart or a price changes"""
+
+    query = """
+    query {
+      cart {
+        cartSummary { itemCount lineCount subtotal lines { name quantity unitPrice lineTotal } }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="summary@example.com", username="summary", password="secret"
+        )
+        cls.cart = Cart.objects.create(user=cls.user)
+        category = Category.objects.create(name="Pantry")
+        cls.tea = Product.objects.create(
+            name="Tea", category=category, price="2.50", amount_in_stock=10
+        )
+        cls.jam = Product.objects.create(
+            name="Jam", category=category, price="4.00", amount_in_stock=10
+        )
+        CartItem.objects.create(cart=cls.cart, product=cls.tea, quantity=2)
+        CartItem.objects.create(cart=cls.cart, product=cls.jam, quantity=1)
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+
+    def summary(self):
+        result = execute(self.query, user=self.user)
+        self.assertIsNone(result.errors)
+        return result.data["cart"]["cartSummary"]
+
+    def test_summary_totals_every_line(self):
+        self.assertEqual(
+            self.summary(),
+            {
+                "itemCount": 3,
+                "lineCount": 2,
+                "subtotal": "9.00",
+                "lines": [
+                    {"name": "Tea", "quantity": 2, "unitPrice": "2.50", "lineTotal": "5.00"},
+                    {"name": "Jam", "quantity": 1, "unitPrice": "4.00", "lineTotal": "4.00"},
+                ],
+            },
+        )
+
+    def test_repeated_summary_is_served_from_cache(self):
+        self.summary()
+        # only the cart lookup itself
+        with self.assertNumQueries(1):
+            self.assertEqual(self.summary()["subtotal"], "9.00")
+
+    def test_cart_mutation_invalidates_summary(self):
+        self.summary()
+        mutation = """
+        mutation ($input: CartItemInput!) { addToCart(input: $input) { ok } }
+        """
+        variables = {"input": {"cartId": self.cart.pk, "productId": self.jam.pk, "quantity": 1}}
+        with self.captureOnCommitCallbacks(execute=True):
+            result = execute(mutation, variables, user=self.user)
+        self.assertIsNone(result.errors)
+        self.assertEqual(self.summary()["subtotal"], "13.00")
+
+    def test_write_committed_while_computing_is_not_cached_over(self):
+        compute = cart_summary.compute_cart_summary
+
+        def compute_then_write(user_id):
+            summary = compute(user_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                CartItem.objects.filter(product=self.jam).update(quantity=3)
+                cart_summary.invalidate_cart_summary(user_id)
+            return summary
+
+        with mock.patch.object(cart_summary, "compute_cart_summary", compute_then_write):
+            self.assertEqual(self.summary()["subtotal"], "9.00")
+        self.assertEqual(self.summary()["subtotal"], "17.00")
+
+    def test_price_change_invalidates_every_summary(self):
+        self.summary()
+        mutation = """
+        mutation ($id: Int!, $input: ProductInput!) { updateProduct(id: $id, input: $input) { ok } }
+        """
+        variables = {
+            "id": self.tea.pk,
+            "input": {
+                "name": "Tea",
+                "categoryId": self.tea.category_id,
+                "price": "3.00",
+                "amountInStock": 10,
+            },
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            result = execute(mutation, variables, user=self.user)
+        self.assertIsNone(result.errors)
+        self.assertEqual(self.summary()["subtotal"], "10.00")
+
+    def test_checkout_empties_summary(self):
+        self.summary()
+        with self.captureOnCommitCallbacks(execute=True):
+            result = execute('mutation { createOrder(status: "created") { ok } }', user=self.user)
+        self.assertIsNone(result.errors)
+        summary = self.summary()
+        self.assertEqual((summary["itemCount"], summary["subtotal"]), (0, "0.00"))
+
+
+class AsyncViewTests(TestCase):
+    """The async endpoint serves the same API through the async executor"""
+
+    query = """
+    query ($id: Int!) {
+      productById(id: $id) { name category { name } }
+      allCategories { edges { node { name } } }
+      cart { id }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="async@example.com", username="async", password="secret"
+        )
+        cls.cart = Cart.objects.create(user=cls.user)
+        cls.category = Category.objects.create(name="Lamps")
+        cls.product = Product.objects.create(name="Desk lamp", category=cls.category, price="12.00")
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        middleware.user_cache.clear()
+        self.addCleanup(middleware.user_cache.clear)
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"AUTHORIZATION": f"Bearer {token}"}
+
+    async def post(self, path, query, variables=None, headers=None):
+        response = await self.async_client.post(
+            path,
+            json.dumps({"query": query, "variables": variables or {}}),
+            content_type="application/json",
+            headers=headers,
+        )
+        return response.json()
+
+    def test_schemas_match(self):
+        self.assertEqual(str(async_schema), str(schema))
+
+    @override_settings(GRAPHQL_ASYNC_WORKERS=0)
+    async def test_query_matches_sync_view(self):
+        variables = {"id": self.product.pk}
+        expected = await self.post("/graphql-api/", self.query, variables, self.auth)
+        result = await self.post("/graphql-api/async/", self.query, variables, self.auth)
+        self.assertIsNone(result.get("errors"))
+        self.assertEqual(result, expected)
+        self.assertEqual(result["data"]["productById"]["category"]["name"], "Lamps")
+        self.assertEqual(result["data"]["cart"]["id"], str(self.cart.pk))
+
+    @override_settings(GRAPHQL_ASYNC_WORKERS=0)
+    async def test_anonymous_catalog_query_is_cached(self):
+        query = "query { allCategories { edges { node { name } } } }"
+        await self.post("/graphql-api/async/", query)
+        await Category.objects.acreate(name="Rugs")
+        result = await self.post("/graphql-api/async/", query)
+        self.assertEqual(result["data"]["allCategories"]["edges"], [{"node": {"name": "Lamps"}}])
+
+    @override_settings(GRAPHQL_ASYNC_WORKERS=0)
+    async def test_mutation_runs_on_sync_path(self):
+        mutation = 'mutation { createCategory(input: {name: "Rugs"}) { ok } }'
+        result = await self.post("/graphql-api/async/", mutation, headers=self.auth)
+        self.assertEqual(result["data"], {"createCategory": {"ok": True}})
+        self.assertTrue(await Category.objects.filter(name="Rugs").aexists())
+
+
+class AsyncExecutionContextTests(SimpleTestCase):
+    """Blocking work runs on the pool, coroutine resolvers on the event loop"""
+
+    class Step(graphene.ObjectType):
+        resolved_on = graphene.String()
+        completed_on = graphene.String()
+
+        def resolve_completed_on(root, info):
+            return threading.current_thread().name
+
+    class Root(graphene.ObjectType):
+        blocking = graphene.Field(lambda: AsyncExecutionContextTests.Step)
+        awaited = graphene.Field(lambda: AsyncExecutionContextTests.Step)
+
+        def resolve_blocking(root, info):
+            return {"resolved_on": threading.current_thread().name}
+
+        async def resolve_awaited(root, info):
+            return {"resolved_on": threading.current_thread().name}
+
+    @override_settings(GRAPHQL_ASYNC_WORKERS=2)
+    def test_fields_run_where_expected(self):
+        document = parse(
+            "{ blocking { resolvedOn completedOn } awaited { resolvedOn completedOn } }"
+        )
+        graphql_schema = graphene.Schema(query=self.Root).graphql_schema
+
+        async def run():
+            return await graphql_execute(
+                graphql_schema, document, execution_context_class=AsyncExecutionContext
+            )
+
+        result = asyncio.run(run())
+        self.assertIsNone(result.errors)
+        loop_thread = threading.current_thread().name
+        self.assertTrue(result.data["blocking"]["resolvedOn"].startswith("graphql-sync"))
+        self.assertTrue(result.data["blocking"]["completedOn"].startswith("graphql-sync"))
+        self.assertEqual(result.data["awaited"]["resolvedOn"], loop_thread)
+        self.assertTrue(result.data["awaited"]["completedOn"].startswith("graphql-sync"))
+
+    @override_settings(GRAPHQL_ASYNC_WORKERS=2)
+    def test_pool_jobs_drop_old_connections(self):
+        calls = []
+        with mock.patch(
+            "ecommerce.executor.close_old_connections", lambda: calls.append("close")
+        ):
+            def job():
+                calls.append(threading.current_thread().name)
+                raise ValueError("broken")
+
+            with self.assertRaises(ValueError):
+                asyncio.run(run_sync(job))
+        self.assertEqual(calls[0], "close")
+        self.assertTrue(calls[1].startswith("graphql-sync"))
+        self.assertEqual(calls[2:], ["close"])
+
+
+class StripePaymentTests(TestCase):
+    """CreatePayment talks to Stripe through the retrying, idempotent gateway"""
+
+    mutation = """
+    mutation ($input: PaymentInput!) {
+      createPayment(input: $input) { ok clientSecret payment { stripePaymentIntent status } }
+    }
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = FakeStripeServer().start()
+        cls.addClassCleanup(cls.stripe.stop)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="payer@example.com", username="payer", password="secret"
+        )
+        cls.order = Order.objects.create(user=cls.user, status="pending", total="25.50")
+
+    def setUp(self):
+        self.stripe.latency = 0
+        settings_override = override_settings(
+            STRIPE_SECRET_KEY="sk_test_fake",
+            STRIPE_API_BASE=self.stripe.url,
+            STRIPE_READ_TIMEOUT=0.5,
+            STRIPE_RETRY_BACKOFF=0.01,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def pay(self, amount="25.50", currency="usd", user=None):
+        user = user or self.user
+        variables = {
+            "input": {
+                "userId": user.pk,
+                "orderId": self.order.pk,
+                "stripePaymentIntent": "",
+                "amount": amount,
+                "currency": currency,
+                "status": "pending",
+            }
+        }
+        return execute(self.mutation, variables, user=user)
+
+    def test_payment_intent_is_created_in_cents(self):
+        result = self.pay()
+        self.assertIsNone(result.errors)
+        intent_id = result.data["createPayment"]["payment"]["stripePaymentIntent"]
+        intent = self.stripe.intents[intent_id]
+        self.assertEqual(intent["amount"], 2550)
+        self.assertEqual(intent["metadata"]["order_id"], str(self.order.pk))
+        self.assertEqual(result.data["createPayment"]["clientSecret"], intent["client_secret"])
+
+    def test_order_total_is_charged_to_its_owner_only(self):
+        result = self.pay(amount="0.01")
+        self.assertIsNone(result.errors)
+        intent_id = result.data["createPayment"]["payment"]["stripePaymentIntent"]
+        self.assertEqual(self.stripe.intents[intent_id]["amount"], 2550)
+        self.assertEqual(Payment.objects.get(order=self.order).amount, Decimal("25.50"))
+
+        other = User.objects.create_user(email="other@example.com", username="other", password="x")
+        result = self.pay(user=other)
+        self.assertEqual(
+            result.errors[0].message, "Not authorized to pay for another user's order."
+        )
+
+    def test_reused_key_with_other_params_is_refused(self):
+        self.assertIsNone(self.pay().errors)
+        result = self.pay(currency="eur")
+        self.assertIn("same parameters", result.errors[0].message)
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+    def test_transient_failures_are_retried(self):
+        self.stripe.fail_next(2, status=503)
+        result = self.pay()
+        self.assertIsNone(result.errors)
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+    def test_retried_request_reuses_the_intent(self):
+        first, second = self.pay(), self.pay()
+        self.assertEqual(
+            first.data["createPayment"]["payment"], second.data["createPayment"]["payment"]
+        )
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+    def test_exhausted_retries_fail_the_mutation(self):
+        self.stripe.latency = 1
+        result = self.pay()
+        self.assertTrue(
+            result.errors[0].message.startswith("Stripe PaymentIntent creation failed")
+        )
+        self.assertFalse(Payment.objects.filter(order=self.order).exists())
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test", GRAPHQL_ASYNC_WORKERS=0)
+class StripeWebhookTests(TestCase):
+    """Webhooks are stored in batches and applied to payments later"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="hooked@example.com", username="hooked", password="secret"
+        )
+        category = Category.objects.create(name="Hooks")
+        cls.product = Product.objects.create(
+            name="Coat hook", category=category, price="4.00", amount_in_stock=5
+        )
+
+    def setUp(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        with transaction.atomic():
+            self.order = checkout(cart)
+        self.payment = Payment.objects.create(
+            user=self.user,
+            order=self.order,
+            stripe_payment_intent="pi_hooked",
+            amount="8.00",
+            status="pending",
+        )
+
+    def send(
+        self, event_type, created=None, event_id=None, secret="whsec_test", intent="pi_hooked"
+    ):
+        payload = make_event(event_type, {"id": intent}, event_id=event_id, created=created)
+        return self.client.post(
+            "/stripe/webhook/",
+            payload,
+            content_type="application/json",
+            headers={"Stripe-Signature": sign_payload(payload, secret)},
+        )
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.amount_in_stock
+
+    def test_bad_signature_is_rejected(self):
+        response = self.send("payment_intent.succeeded", secret="whsec_other")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    @override_settings(STRIPE_WEBHOOK_SECRET="")
+    def test_webhooks_are_refused_without_a_secret(self):
+        response = self.send("payment_intent.succeeded", secret="")
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_redelivered_event_is_stored_once(self):
+        for _ in range(2):
+            response = self.send("payment_intent.succeeded", event_id="evt_once")
+            self.assertEqual(response.json(), {"received": True})
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_success_pays_order_and_commits_stock(self):
+        self.send("payment_intent.processing")
+        self.send("payment_intent.succeeded")
+        self.assertEqual(apply_events(), 2)
+        self.assertEqual(apply_events(), 0)
+
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.payment.status, "successful")
+        self.assertEqual(self.order.status, "paid")
+        self.assertEqual(self.order.reservations.get().status, "committed")
+        self.assertEqual(self.stock(), 3)
+
+    def test_success_after_expiry_pays_cancelled_order(self):
+        inventory.release_expired(now=timezone.now() + timedelta(days=1))
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.stock()), ("cancelled", 5))
+
+        self.send("payment_intent.succeeded")
+        apply_events()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+        self.assertEqual(self.order.reservations.get().status, "committed")
+        self.assertEqual(self.stock(), 3)
+
+    def test_cancel_releases_stock(self):
+        self.send("payment_intent.canceled")
+        apply_events()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "cancelled")
+        self.assertEqual(self.order.reservations.get().status, "released")
+        self.assertEqual(self.stock(), 5)
+
+    def test_events_wait_for_their_payment_row(self):
+        Payment.objects.filter(pk=self.payment.pk).update(stripe_payment_intent="pi_unsaved")
+        self.send("payment_intent.processing")
+        self.assertEqual(apply_events(), 0)
+        self.assertEqual(apply_events(), 0)
+
+        # CreatePayment stores the row after the event arrived
+        Payment.objects.filter(pk=self.payment.pk).update(stripe_payment_intent="pi_hooked")
+        self.assertEqual(apply_events(), 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "processing")
+
+        self.send("payment_intent.canceled", intent="pi_unknown")
+        with override_settings(STRIPE_WEBHOOK_RETRY_WINDOW=0):
+            with self.assertLogs("ecommerce.webhooks", "WARNING"):
+                self.assertEqual(apply_events(), 1)
+        self.assertFalse(WebhookEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_buffer_skips_requests_that_gave_up(self):
+        async def write():
+            loop = asyncio.get_running_loop()
+            waiting, gave_up = loop.create_future(), loop.create_future()
+            gave_up.cancel()
+            with mock.patch.object(webhooks, "store_events"):
+                await webhooks._EventBuffer().write([(None, gave_up), (None, waiting)])
+            return waiting.result()
+
+        self.assertIsNone(asyncio.run(write()))
+
+    def test_late_events_do_not_regress_status(self):
+        now = time.time()
+        self.send("payment_intent.succeeded", created=now)
+        self.send("payment_intent.processing", created=now - 5)
+        apply_events()
+        self.send("payment_intent.payment_failed", created=now - 1)
+        apply_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "successful")
+
+
+class ProductImageVariantTests(TestCase):
+    """Uploads get resized WebP/AVIF derivatives once they commit"""
+
+    mutation = """
+    mutation ($input: ProductImageInput!) {
+      createProductImage(input: $input) { productImage { thumbnailUrl srcset } }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Prints")
+        cls.product = Product.objects.create(name="Poster", category=category, price="15.00")
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = Path(media_root.name)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name, PRODUCT_IMAGE_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, render=True):
+        photo = BytesIO()
+        Image.new("RGB", (500, 250), "teal").save(photo, "JPEG")
+        variables = {
+            "input": {
+                "productId": self.product.pk,
+                "image": SimpleUploadedFile("poster.jpg", photo.getvalue(), "image/jpeg"),
+            }
+        }
+        with self.captureOnCommitCallbacks(execute=render):
+            result = execute(self.mutation, variables)
+        self.assertIsNone(result.errors)
+        return result.data["createProductImage"]["productImage"]
+
+    def test_variants_are_rendered_next_to_the_original(self):
+        self.upload()
+        product_image = ProductImage.objects.get(product=self.product)
+        self.assertEqual(
+            product_image.variants["webp"],
+            {
+                "320": "product_images/poster_320w.webp",
+                "500": "product_images/poster_500w.webp",
+            },
+        )
+        with Image.open(self.media_root / "product_images" / "poster_320w.avif") as variant:
+            self.assertEqual((variant.format, variant.size), ("AVIF", (320, 160)))
+
+    def test_thumbnail_and_srcset(self):
+        self.upload()
+        result = execute(
+            "query ($id: Int!) { productById(id: $id) { images { edges { node {"
+            " thumbnailUrl srcset avif: srcset(format: \"avif\") } } } } }",
+            {"id": self.product.pk},
+        )
+        node = result.data["productById"]["images"]["edges"][0]["node"]
+        self.assertEqual(node["thumbnailUrl"], "/media/product_images/poster_320w.webp")
+        self.assertEqual(
+            node["srcset"],
+            "/media/product_images/poster_320w.webp 320w, "
+            "/media/product_images/poster_500w.webp 500w",
+        )
+        self.assertTrue(node["avif"].endswith("poster_500w.avif 500w"))
+
+    def test_original_is_served_until_rendered(self):
+        data = self.upload(render=False)
+        self.assertEqual(data["thumbnailUrl"], "/media/product_images/poster.jpg")
+        self.assertIsNone(data["srcset"])
+
+
+class FilterIndexTests(TestCase):
+    """Every filterset lookup is answered from an index, never a table scan"""
+
+    newest_first = ("-created_at", "-id")
+    since = "2026-01-01T00:00:00Z"
+    until = "2026-02-01T00:00:00Z"
+
+    cases = [
+        # (filterset, data, ordering, index the plan must use; None = any)
+        (ProductFilter, {"category": 1, "price__gte": 5, "price__lte": 50}, newest_first, "product_category_price_idx"),
+        (ProductFilter, {"price__gte": 5, "price__lte": 50}, newest_first, "product_price_idx"),
+        (ProductFilter, {"stock__gte": 1, "stock__lte": 20}, newest_first, "product_stock_idx"),
+        (ProductFilter, {"low_stock": True}, newest_first, "product_low_stock_idx"),
+        (ProductFilter, {"subcategory": 1}, newest_first, None),
+        (ProductFilter, {"min_rating": 4}, ("-average_rating", "-id"), "product_avg_rating_idx"),
+        (OrderFilter, {"user_id": 1, "status": "PENDING", "created_after": since, "created_before": until}, newest_first, "order_user_status_idx"),
+        (OrderFilter, {"user_id": 1}, newest_first, None),
+        (OrderFilter, {"status": "paid"}, newest_first, "order_status_created_idx"),
+        (OrderFilter, {"created_after": since}, newest_first, "order_created_id_idx"),
+        (PaymentFilter, {"user_id": 1, "status": "Pending", "created_after": since}, newest_first, "payment_user_status_idx"),
+        (PaymentFilter, {"status": "successful", "amount__gte": 10}, newest_first, "payment_status_created_idx"),
+        (PaymentFilter, {"amount__gte": 10, "amount__lte": 20}, newest_first, "payment_amount_idx"),
+        (PaymentFilter, {"order_id": 1}, newest_first, None),
+        (RatingFilter, {"product_id": 1, "min_rating": 3}, newest_first, "rating_product_created_idx"),
+        (RatingFilter, {"rating_from_id": 1}, newest_first, None),
+        (CommentFilter, {"product_id": 1, "created_after": since, "created_before": until}, newest_first, "comment_product_created_idx"),
+        (CommentFilter, {"comment_from_id": 1}, newest_first, None),
+        (ProductImageFilter, {"product": 1}, (), None),
+        (SubCategoryFilter, {"category": 1}, (), None),
+        (CartItemFilter, {"cart_id": 1, "min_quantity": 2}, (), None),
+        (OrderItemFilter, {"order_id": 1, "product_id": 1}, (), None),
+    ]
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_filters_use_indexes(self):
+        for filterset_class, data, ordering, index in self.cases:
+            model = filterset_class._meta.model
+            with self.subTest(filterset=filterset_class.__name__, data=data):
+                filterset = filterset_class(data, queryset=model.objects.all())
+                self.assertTrue(filterset.is_valid(), filterset.errors)
+                plan = self.explain(filterset.qs.order_by(*ordering))
+                table = model._meta.db_table
+                partial = {
+                    model_index.name
+                    for model_index in model._meta.indexes
+                    if model_index.condition is not None
+                }
+                full_scans = [
+                    step
+                    for step in plan
+                    if re.match(rf"SCAN {table}\b", step)
+                    and not any(f"INDEX {name}" in step for name in partial)
+                ]
+                self.assertEqual(full_scans, [], plan)
+                if index is not None:
+                    self.assertTrue(any(f"INDEX {index}" in step for step in plan), plan)
+
+    def test_status_filter_is_case_insensitive(self):
+        user = User.objects.create_user(email="case@example.com", username="case", password="x")
+        order = Order.objects.create(user=user, status="pending")
+        filterset = OrderFilter({"status": "PENDING"}, queryset=Order.objects.all())
+        self.assertEqual(list(filterset.qs), [order])
+
+
+class QueryCostTests(TestCase):
+    """Operations are costed before execution and rejected over budget"""
+
+    abusive = """
+    query ($first: Int) {
+      allProducts(first: $first) {
+        edges { node {
+          rating { edges { node { ratingFrom { id username } } } }
+          comments { edges { node { commentFrom { id username } } } }
+        } }
+      }
+    }
+    """
+
+    def post(self, query, variables=None):
+        response = self.client.post(
+            "/graphql-api/",
+            json.dumps({"query": query, "variables": variables or {}}),
+            content_type="application/json",
+        )
+        return response.status_code, response.json()
+
+    def test_cost_is_reported_in_extensions(self):
+        status, result = self.post(
+            "query ($first: Int) { allCategories(first: $first) { edges { node { name } } } }",
+            {"first": 5},
+        )
+        self.assertEqual(status, 200)
+        # allCategories 1 + 5 x (edges 1 + node 1)
+        self.assertEqual(
+            result["extensions"]["cost"],
+            {"requested": 11, "maximum": 10000, "depth": 4, "maxDepth": 15},
+        )
+
+    def test_expensive_query_is_rejected_before_execution(self):
+        with self.assertNumQueries(0):
+            status, result = self.post(self.abusive, {"first": 1000})
+        self.assertEqual(status, 400)
+        self.assertEqual(
+            result["errors"][0]["message"], "Query cost 604001 exceeds the maximum of 10000."
+        )
+        self.assertNotIn("data", result)
+        self.assertEqual(result["extensions"]["cost"]["requested"], 604001)
+
+    def test_unpaginated_connections_cost_a_full_page(self):
+        status, result = self.post(self.abusive)
+        self.assertEqual(status, 400)
+        # 1 + 100 x (edges 1 + node 1 + 2 x (connection 1 + 100 x 3))
+        self.assertEqual(result["extensions"]["cost"]["requested"], 60401)
+
+    @override_settings(GRAPHQL_MAX_DEPTH=5)
+    def test_deep_query_is_rejected(self):
+        status, result = self.post(self.abusive, {"first": 1})
+        self.assertEqual(status, 400)
+        self.assertEqual(
+            result["errors"][0]["message"], "Query depth 8 exceeds the maximum of 5."
+        )
+
+    def test_frontend_queries_fit_the_budget(self):
+        # Page sizes the frontend requests (products page, orders page)
+        page_sizes = {"GetAllProducts": 50, "GetOrders": 20}
+        graphql_schema = schema.graphql_schema
+        for query in json.loads(persisted_queries.manifest.path.read_text()).values():
+            document = parse(query)
+            operation = get_operation_ast(document)
+            name = operation.name.value
+            with self.subTest(operation=name):
+                variables = {"first": page_sizes.get(name, 20)}
+                query_cost = analyze(graphql_schema, document, operation, variables)
+                if query_cost is not None:
+                    self.assertIsNone(query_cost.error())
+
+
+class TracingTests(TestCase):
+    """Resolver and per-operation SQL metrics, exposed on /metrics"""
+
+    query = "query TraceCategories { allCategories(first: 5) { edges { node { name } } } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.create(name="Traced")
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    async def apost(self, path, headers=None):
+        response = await self.async_client.post(
+            path, json.dumps({"query": self.query}), content_type="application/json", headers=headers
+        )
+        return response.json()
+
+    def post(self, path="/graphql-api/", headers=None):
+        response = self.client.post(
+            path, json.dumps({"query": self.query}), content_type="application/json", headers=headers
+        )
+        return response.json()
+
+    def test_operation_sql_and_resolvers_are_recorded(self):
+        operations = self.sample("graphql_operation_sql_queries_count", operation="TraceCategories")
+        statements = self.sample("graphql_operation_sql_queries_sum", operation="TraceCategories")
+        resolved = self.sample(
+            "graphql_resolver_duration_seconds_count", type="Query", field="allCategories"
+        )
+
+        result = self.post()
+        self.assertNotIn("tracing", result["extensions"])
+        self.assertEqual(
+            self.sample("graphql_operation_sql_queries_count", operation="TraceCategories"),
+            operations + 1,
+        )
+        self.assertEqual(
+            self.sample("graphql_operation_sql_queries_sum", operation="TraceCategories"),
+            statements + 1,
+        )
+        self.assertEqual(
+            self.sample(
+                "graphql_resolver_duration_seconds_count", type="Query", field="allCategories"
+            ),
+            resolved + 1,
+        )
+
+    @override_settings(GRAPHQL_ASYNC_WORKERS=0)
+    async def test_async_view_counts_sql_on_worker_threads(self):
+        before = self.sample("graphql_operation_sql_queries_sum", operation="TraceCategories")
+        await self.apost("/graphql-api/async/")
+        self.assertEqual(
+            self.sample("graphql_operation_sql_queries_sum", operation="TraceCategories"),
+            before + 1,
+        )
+
+    @override_settings(DEBUG=True)
+    def test_trace_header_returns_apollo_tracing(self):
+        tracing = self.post(headers={"X-GraphQL-Trace": "1"})["extensions"]["tracing"]
+        self.assertEqual(tracing["version"], 1)
+        self.assertEqual(tracing["sql"]["count"], 1)
+        paths = [resolver["path"] for resolver in tracing["execution"]["resolvers"]]
+        self.assertIn(["allCategories"], paths)
+        self.assertIn(["allCategories", "edges", 0, "node", "name"], paths)
+
+    def test_trace_header_is_ignored_for_anonymous_users(self):
+        result = self.post(headers={"X-GraphQL-Trace": "1"})
+        self.assertNotIn("tracing", result["extensions"])
+
+    def test_metrics_endpoint(self):
+        self.post()
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(
+            b'graphql_operation_sql_queries_count{operation="TraceCategories"}', response.content
+        )
+
+
+class OperationBenchmarkTests(TestCase):
+    """The frontend's operations replay offline against a seeded catalog"""
+
+    def run_benchmark(self, output, *args):
+        call_command(
+            "benchmark_operations",
+            "--output", output,
+            "--iterations", "2",
+            "--warmup", "0",
+            "--categories", "2",
+            "--products", "20",
+            "--users", "3",
+            "--orders", "6",
+            "--ratings", "20",
+            *args,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        with open(output) as output_file:
+            return json.load(output_file)
+
+    def test_every_operation_runs_without_errors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            result = self.run_benchmark(str(Path(directory) / "operations.json"))
+
+        operations = result["operations"]
+        self.assertLessEqual({"GetAllProducts", "CreateOrder", "CreatePayment"}, set(operations))
+        for name, stats in operations.items():
+            self.assertEqual(stats["errors"], 0, f"{name}: {stats['first_error']}")
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+            self.assertGreater(stats["peak_memory_kib"], 0)
+        self.assertGreaterEqual(operations["CreateOrder"]["sql_queries"], 1)
+        self.assertEqual(result["options"]["products"], 20)
+        # The seeded catalog and every mutation are rolled back
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_compare_against_an_earlier_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = str(Path(directory) / "baseline.json")
+            self.run_benchmark(baseline, "--operation", "GetCategories")
+            stdout = StringIO()
+            call_command(
+                "benchmark_operations",
+                "--output", str(Path(directory) / "current.json"),
+                "--compare", baseline,
+                "--iterations", "1",
+                "--products", "5",
+                "--operation", "GetCategories",
+                "--operation", "GetCart",
+                stdout=stdout,
+                stderr=StringIO(),
+            )
+        self.assertRegex(stdout.getvalue(), r"GetCategories\s+[+-]\d+%")
+        self.assertRegex(stdout.getvalue(), r"GetCart\s+new")
+
+
+class SeedCatalogTests(TestCase):
+    """seed_catalog generates a skewed catalog, the same one for the same seed"""
+
+    sizes = dict(
+        categories=3, products=200, users=40, orders=60, ratings=2000, comments=100, chunk_size=70
+    )
+
+    def snapshot(self, seed):
+        with transaction.atomic():
+            CatalogSeeder(seed=seed, **self.sizes).run()
+            products = list(
+                Product.objects.order_by("pk").values_list(
+                    "name", "price", "amount_in_stock", "rating_count", "rating_5_count"
+                )
+            )
+            orders = list(Order.objects.order_by("pk").values_list("status", "total"))
+            transaction.set_rollback(True)
+        return products, orders
+
+    def test_same_seed_same_catalog(self):
+        first = self.snapshot(7)
+        self.assertEqual(self.snapshot(7), first)
+        self.assertNotEqual(self.snapshot(8), first)
+
+    def test_popularity_and_aggregates(self):
+        counts = CatalogSeeder(seed=1, **self.sizes).run()
+        self.assertEqual(counts["Product"], 200)
+        self.assertEqual(counts["Rating"], Rating.objects.count())
+        self.assertEqual(Rating.objects.count(), 2000)
+
+        # Ratings follow product popularity: a few products get most of them
+        per_product = sorted(Product.objects.values_list("rating_count", flat=True), reverse=True)
+        self.assertGreater(sum(per_product[:20]), sum(per_product) / 2)
+
+        # Aggregates are written with the products and match the rating rows
+        stored = {
+            product.pk: (product.rating_count, product.rating_sum)
+            for product in Product.objects.exclude(rating_count=0)
+        }
+        actual = {
+            row["product_id"]: (row["count"], row["total"])
+            for row in Rating.objects.values("product_id").annotate(
+                count=Count("id"), total=Sum("rating")
+            )
+        }
+        self.assertEqual(stored, actual)
+
+        prices = dict(Product.objects.values_list("pk", "price"))
+        totals = {}
+        for order_id, product_id, quantity in OrderItem.objects.values_list(
+            "order_id", "product_id", "quantity"
+        ):
+            totals[order_id] = totals.get(order_id, 0) + prices[product_id] * quantity
+        self.assertEqual(dict(Order.objects.values_list("pk", "total")), totals)
+        self.assertEqual(
+            Payment.objects.count(), Order.objects.exclude(status="created").count()
+        )
+
+    def test_label_cannot_be_seeded_twice(self):
+        call_command(
+            "seed_catalog",
+            "--categories", "1",
+            "--products", "5",
+            "--users", "2",
+            "--orders", "2",
+            "--ratings", "5",
+            stdout=StringIO(),
+        )
+        with self.assertRaises(CommandError):
+            call_command("seed_catalog", "--products", "5", stdout=StringIO())
+
+
+class ProductImportTests(TestCase):
+    """Supplier files are streamed in and upserted by sku"""
+
+    csv = (
+        "sku,name,category,sub_category,description,price,amount_in_stock\r\n"
+        "A-1,Trail runner,Shoes,Running,Grippy sole,59.90,12\r\n"
+        "A-2,Road runner,Shoes,,,49,3\r\n"
+        "A-3,Beach towel,Outdoor,,,9.99,1\r\n"
+        "A-4,Odd price,Shoes,,,cheap,1\r\n"
+        ",No sku,Shoes,,,1.00,1\r\n"
+        "A-2,Road runner v2,Shoes,Running,\"Light, fast\",52.50,8\r\n"
+    )
+
+    mutation = """
+    mutation ($file: Upload!) {
+      importProducts(file: $file) { rows imported badRows errors { line message } ok }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name="Shoes")
+        cls.running = SubCategory.objects.create(name="Running", category=cls.shoes)
+
+    def run_import(self, text, file_format="csv", **kwargs):
+        return ProductImporter(**kwargs).run(read_rows(StringIO(text, newline=""), file_format))
+
+    def test_csv_rows_are_upserted_and_bad_rows_reported(self):
+        report = self.run_import(self.csv, batch_size=2)
+
+        self.assertEqual((report.rows, report.bad_rows), (6, 3))
+        self.assertEqual(
+            [line for line, _ in report.errors], [4, 5, 6]
+        )
+        self.assertIn("Unknown category 'Outdoor'", report.errors[0][1])
+        road = Product.objects.get(sku="A-2")
+        self.assertEqual(
+            (road.name, road.sub_category, road.description, str(road.price), road.amount_in_stock),
+            ("Road runner v2", self.running, "Light, fast", "52.50", 8),
+        )
+        self.assertEqual(Product.objects.count(), 2)
+
+        # A second file updates the same rows in place and reindexes them
+        pk = road.pk
+        self.run_import('{"sku": "A-2", "name": "Hill climber", "category": "Shoes", "price": 60}\n', "jsonl")
+        road.refresh_from_db()
+        self.assertEqual((road.pk, road.name, road.amount_in_stock), (pk, "Hill climber", 0))
+        self.assertEqual(list(search_products(Product.objects.all(), "climber")), [road])
+
+    def test_jsonl_and_missing_categories(self):
+        report = self.run_import(
+            '{"sku": "B-1", "name": "Tent", "category": "Camping", "sub_category": "Shelter", "price": "120"}\n'
+            "\n"
+            "not json\n"
+            '["B-2"]\n',
+            "jsonl",
+            create_missing=True,
+        )
+        self.assertEqual((report.rows, report.imported, report.bad_rows), (3, 1, 2))
+        self.assertEqual([line for line, _ in report.errors], [3, 4])
+        tent = Product.objects.get(sku="B-1")
+        self.assertEqual((tent.category.name, tent.sub_category.name), ("Camping", "Shelter"))
+
+    def test_lookups_run_once_per_import(self):
+        rows = "".join(
+            f'{{"sku": "C-{index}", "name": "Item", "category": "Shoes", "sub_category": "Running", "price": 1}}\n'
+            for index in range(50)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            report = self.run_import(rows, "jsonl", batch_size=25)
+        self.assertEqual(report.imported, 50)
+        # Two lookup queries, then per batch: upsert, held stock and two search index statements
+        self.assertLessEqual(len(queries), 2 + 2 * 4 + 4)
+
+    def test_stock_held_by_reservations_is_not_sold_again(self):
+        self.run_import(self.csv)
+        road = Product.objects.get(sku="A-2")
+        buyer = User.objects.create_user(email="buyer@example.com", username="buyer", password="x")
+        cart = Cart.objects.create(user=buyer)
+        CartItem.objects.create(cart=cart, product=road, quantity=5)
+        with transaction.atomic():
+            checkout(cart)
+        road.refresh_from_db()
+        self.assertEqual(road.amount_in_stock, 3)
+
+        # The supplier still counts the 5 held units in its 10
+        self.run_import(self.csv.replace(",52.50,8", ",52.50,10"))
+        road.refresh_from_db()
+        self.assertEqual(road.amount_in_stock, 5)
+        self.run_import(self.csv.replace(",52.50,8", ",52.50,2"))
+        road.refresh_from_db()
+        self.assertEqual(road.amount_in_stock, 0)
+
+    def test_long_names_are_reported_at_the_model_limit(self):
+        limit = Product._meta.get_field("name").max_length
+        rows = "".join(
+            f'{{"sku": "D-{length}", "name": "{"x" * length}", "category": "Shoes", "price": 1}}\n'
+            for length in (limit, limit + 1)
+        )
+        report = self.run_import(rows, "jsonl")
+        self.assertEqual(report.imported, 1)
+        self.assertEqual(report.errors, [(2, f"name is longer than {limit} characters.")])
+
+    def test_upload_mutation_requires_staff(self):
+        def upload():
+            return SimpleUploadedFile("catalog.csv", self.csv.encode(), content_type="text/csv")
+
+        buyer = User.objects.create_user(email="buyer@example.com", username="buyer", password="x")
+        result = execute(self.mutation, {"file": upload()}, user=buyer)
+        self.assertEqual(result.errors[0].message, "Not authorized to import products.")
+
+        buyer.is_staff = True
+        result = execute(self.mutation, {"file": upload()}, user=buyer)
+        self.assertIsNone(result.errors)
+        self.assertEqual(
+            result.data["importProducts"],
+            {
+                "rows": 6,
+                "imported": 3,
+                "badRows": 3,
+                "errors": [
+                    {"line": 4, "message": "Unknown category 'Outdoor'."},
+                    {"line": 5, "message": "Invalid price 'cheap'."},
+                    {"line": 6, "message": "Missing sku."},
+                ],
+                "ok": True,
+            },
+        )
+
+    def test_command_reports_rows_per_second(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "catalog.csv"
+            path.write_text(self.csv)
+            stdout, stderr = StringIO(), StringIO()
+            call_command("import_products", str(path), stdout=stdout, stderr=stderr)
+        self.assertRegex(stdout.getvalue(), r"Imported 3 of 6 rows, 3 bad, in [\d.]+s \(\d+ rows/s\)")
+        self.assertIn("line 5: Invalid price 'cheap'.", stderr.getvalue())
+
+
+class ExportTests(TestCase):
+    """Dumps stream in chunks, slice with the API filters and resume by key"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeder = CatalogSeeder(
+            seed=5, label="export", categories=2, sub_categories=1, products=30, images=1,
+            users=4, orders=12, items=3, ratings=20, comments=0, chunk_size=10,
+        )
+        cls.seeder.run()
+        cls.staff = User.objects.create_user(
+            email="finance@example.com", username="finance", password="x", is_staff=True
+        )
+
+    def get(self, path, user=None):
+        headers = {}
+        if user is not None:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {RefreshToken.for_user(user).access_token}"
+        return self.client.get(path, **headers)
+
+    def test_products_csv_filters_and_resumes(self):
+        category_id = self.seeder.category_ids[0]
+        response = self.get(
+            f"/exports/products/?category={category_id}&order_by=-price", self.staff
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(response["X-Export-Key"], "id")
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        expected = list(
+            Product.objects.filter(category_id=category_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        self.assertEqual([int(row["id"]) for row in rows], expected)
+        self.assertEqual(rows[0]["category"], Category.objects.get(pk=category_id).name)
+
+        response = self.get(
+            f"/exports/products/?category={category_id}&after={expected[4]}", self.staff
+        )
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([int(row["id"]) for row in rows], expected[5:])
+
+    def test_view_checks_staff_and_arguments(self):
+        buyer = User.objects.get(pk=self.seeder.user_ids[0])
+        self.assertEqual(self.get("/exports/payments/", buyer).status_code, 403)
+        self.assertEqual(self.get("/exports/refunds/", self.staff).status_code, 404)
+        response = self.get("/exports/payments/?amount__gte=lots", self.staff)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("amount__gte", response.content.decode())
+        self.assertEqual(self.get("/exports/payments/?format=xml", self.staff).status_code, 400)
+        self.assertEqual(self.get("/exports/payments/?after=x", self.staff).status_code, 400)
+
+    def test_orders_jsonl_has_a_row_per_item(self):
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(stream_export("orders", "jsonl", {"status": "PAID"}, chunk_size=5))
+        rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+        self.assertEqual(len(queries), 1)
+
+        items = OrderItem.objects.filter(order__status="paid").order_by("pk")
+        self.assertEqual([row["item_id"] for row in rows], [item.pk for item in items])
+        self.assertEqual({row["status"] for row in rows}, {"paid"})
+        first = items[0]
+        self.assertEqual(rows[0]["total"], str(first.order.total))
+        self.assertEqual(rows[0]["created_at"], first.order.created_at.isoformat())
+
+    def test_command_writes_parquet(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "payments.parquet"
+            stdout = StringIO()
+            call_command(
+                "export_data", "payments", output=str(path), chunk_size=4,
+                filter=["status=successful"], stdout=stdout,
+            )
+            parquet = pyarrow.parquet.ParquetFile(path)
+            table = parquet.read()
+        self.assertIn("resume key column: id", stdout.getvalue())
+
+        payments = Payment.objects.filter(status="successful").order_by("pk")
+        self.assertEqual(parquet.metadata.num_row_groups, -(-payments.count() // 4))
+        self.assertEqual(table.column("id").to_pylist(), [payment.pk for payment in payments])
+        self.assertEqual(
+            table.column("amount").to_pylist(), [payment.amount for payment in payments]
+        )
+        self.assertEqual(table.column("created_at").to_pylist()[0], payments[0].created_at)
+
+        with self.assertRaisesMessage(CommandError, "Expected NAME=VALUE"):
+            call_command("export_data", "payments", filter=["paid"])
+
+
+@override_settings(
+    DATABASE_REPLICAS=["replica_a", "replica_b"], DATABASE_REPLICA_STICKY_SECONDS=10
+)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Queries spread over healthy replicas; writes, transactions and recent writers
+    use the primary"""
+
+    def setUp(self):
+        replicas.pool.reset()
+        self.healthy = {"replica_a": True, "replica_b": True}
+        patcher = mock.patch.object(
+            replicas, "check", side_effect=lambda alias: self.healthy[alias]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(replicas.pool.reset)
+        self.router = replicas.ReplicaRouter()
+        self.request = RequestFactory().post("/graphql-api/")
+        self.request.user = User(pk=7, username="reader")
+        self.request._jwt_authenticated = True
+
+    def reads(self, operation_type=OperationType.QUERY, request=None):
+        routing = replicas.OperationRouting(operation_type, request or self.request).start()
+        try:
+            return self.router.db_for_read(Product)
+        finally:
+            routing.finish()
+
+    def test_queries_round_robin_over_healthy_replicas(self):
+        self.assertEqual([self.reads() for _ in range(3)], ["replica_a", "replica_b", "replica_a"])
+        self.assertEqual(self.router.db_for_read(Product), "default")
+        self.assertEqual(self.router.db_for_write(Product), "default")
+        self.assertFalse(self.router.allow_migrate("replica_a", "ecommerce"))
+
+        self.healthy["replica_b"] = False
+        replicas.pool.reset()
+        self.assertEqual([self.reads() for _ in range(3)], ["replica_a"] * 3)
+        self.healthy["replica_a"] = False
+        with override_settings(DATABASE_REPLICA_CHECK_INTERVAL=0):
+            self.assertEqual(self.reads(), "default")
+
+    def test_transactions_read_from_the_primary(self):
+        routing = replicas.OperationRouting(OperationType.QUERY, self.request).start()
+        try:
+            with mock.patch.object(connection, "in_atomic_block", True):
+                self.assertEqual(self.router.db_for_read(Product), "default")
+            self.assertNotEqual(self.router.db_for_read(Product), "default")
+        finally:
+            routing.finish()
+
+    def test_mutations_pin_their_user_to_the_primary(self):
+        other = RequestFactory().post("/graphql-api/")
+        other.user = User(pk=8, username="other")
+        other._jwt_authenticated = True
+        try:
+            self.assertEqual(self.reads(OperationType.MUTATION), "default")
+            self.assertEqual(self.reads(), "default")
+            self.assertNotEqual(self.reads(request=other), "default")
+
+            replicas.cache.delete(replicas._pin_key(self.request.user))
+            self.assertNotEqual(self.reads(), "default")
+        finally:
+            replicas.cache.delete(replicas._pin_key(self.request.user))
+
+
+
+class ReplicaViewTests(TestCase):
+    """The GraphQL view routes each operation and pins users who wrote"""
+
+    @override_settings(DATABASE_REPLICAS=["replica_a"])
+    def test_mutation_pins_its_user(self):
+        user = User.objects.create_user(
+            email="editor@example.com", username="editor", password="x", is_staff=True
+        )
+        token = RefreshToken.for_user(user).access_token
+        self.addCleanup(replicas.cache.delete, replicas._pin_key(user))
+
+        routed = []
+        start = replicas.OperationRouting.start
+
+        def record(routing):
+            routed.append(routing.operation_type)
+            return start(routing)
+
+        with mock.patch.object(replicas.OperationRouting, "start", record):
+            response = self.client.post(
+                "/graphql-api/",
+                {"query": 'mutation { createCategory(input: {name: "Garden"}) { ok } }'},
+                content_type="application/json",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+        self.assertEqual(response.json()["data"], {"createCategory": {"ok": True}})
+        self.assertEqual(routed, [OperationType.MUTATION])
+        self.assertTrue(replicas.is_pinned(user))
+
+
+    def stale_replica(self):
+        """Point DATABASE_REPLICAS at a SQLite copy of the primary as it is now"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = str(Path(directory.name) / "replica.sqlite3")
+        # A dump, not a backup: the backup would wait for the test's transaction
+        target = sqlite3.connect(path)
+        target.executescript("\n".join(connection.connection.iterdump()))
+        target.close()
+
+        connections.settings["replica_stale"] = {**connection.settings_dict, "NAME": path}
+        allowed = mock.patch.object(type(self), "databases", {"default", "replica_stale"})
+        allowed.start()
+        self.addCleanup(allowed.stop)
+        self.addCleanup(connections.settings.pop, "replica_stale")
+        self.addCleanup(connections.__delitem__, "replica_stale")
+        self.addCleanup(lambda: connections["replica_stale"].close())
+        replicas.pool.reset()
+        self.addCleanup(replicas.pool.reset)
+        overridden = override_settings(DATABASE_REPLICAS=["replica_stale"])
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+    def test_shared_caches_are_filled_from_the_primary(self):
+        response_cache.get_cache().clear()
+        Category.objects.create(name="Garden")
+        self.stale_replica()
+        Category.objects.create(name="Kitchen")
+        query = {"query": "query { allCategories { edges { node { name } } } }"}
+        # Outside the test's transaction, queries may read from a replica
+        replica_reads = mock.patch.object(connection, "in_atomic_block", False)
+
+        def names(**extra):
+            with replica_reads:
+                response = self.client.post(
+                    "/graphql-api/", query, content_type="application/json", **extra
+                )
+            edges = response.json()["data"]["allCategories"]["edges"]
+            return sorted(edge["node"]["name"] for edge in edges)
+
+        # Uncached queries read the lagging replica; the cached one does not
+        self.assertEqual(names(HTTP_AUTHORIZATION="Bearer token"), ["Garden"])
+        self.assertEqual(names(), ["Garden", "Kitchen"])
+
+        # Refilled after an invalidation, the cache gets the new write
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Shed")
+            response_cache.invalidate(response_cache.CATEGORIES)
+        self.assertEqual(names(), ["Garden", "Kitchen", "Shed"])
+        self.assertEqual(names(HTTP_AUTHORIZATION="Bearer token"), ["Garden"])
+
+        routing = replicas.OperationRouting(OperationType.QUERY, RequestFactory().post("/")).start()
+        try:
+            with replica_reads:
+                self.assertEqual(counting.cached_count(Category.objects.all()), 3)
+        finally:
+            routing.finish()
+
+    @override_settings(GRAPHQL_ASYNC_WORKERS=0)
+    def test_async_queries_read_from_replicas(self):
+        Category.objects.create(name="Garden")
+        self.stale_replica()
+        Category.objects.create(name="Kitchen")
+        query = {"query": "query { allCategories { edges { node { name } } } }"}
+
+        for path in ("/graphql-api/async/", "/graphql-api/", "/graphql-api/async/"):
+            with mock.patch.object(connection, "in_atomic_block", False):
+                response = self.client.post(
+                    path, query, content_type="application/json",
+                    HTTP_AUTHORIZATION="Bearer token",
+                )
+            edges = response.json()["data"]["allCategories"]["edges"]
+            self.assertEqual([edge["node"]["name"] for edge in edges], ["Garden"], path)
@@ -0,0 +1,204 @@
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from inspect import isawaitable
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from graphql import get_named_type, is_leaf_type
+from prometheus_client import Counter, Histogram
+
+from .middleware import attach_user
+
+
+# Request header asking for an Apollo tracing payload in extensions
+TRACE_HEADER = "X-GraphQL-Trace"
+
+RESOLVER_DURATION = Histogram(
+    "graphql_resolver_duration_seconds",
+    "Time spent resolving GraphQL object and list fields",
+    ["type", "field"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+RESOLVER_ERRORS = Counter(
+    "graphql_resolver_errors", "GraphQL resolvers that raised", ["type", "field"]
+)
+OPERATION_DURATION = Histogram(
+    "graphql_operation_duration_seconds",
+    "Execution time of GraphQL operations",
+    ["operation", "type"],
+)
+OPERATION_ERRORS = Counter(
+    "graphql_operation_errors", "GraphQL operations with errors", ["operation", "type"]
+)
+OPERATION_QUERIES = Histogram(
+    "graphql_operation_sql_queries",
+    "SQL statements run by a GraphQL operation",
+    ["operation"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+OPERATION_SQL_DURATION = Histogram(
+    "graphql_operation_sql_duration_seconds",
+    "Time a GraphQL operation spent in SQL",
+    ["operation"],
+)
+
+current_trace = ContextVar("graphql_trace", default=None)
+
+_operation_names = set()
+_operation_names_lock = threading.Lock()
+
+
+def operation_label(name):
+    """Metric label for an operation name, capping how many distinct names are kept"""
+    if not name:
+        return "anonymous"
+    with _operation_names_lock:
+        if name in _operation_names:
+            return name
+        if len(_operation_names) < settings.GRAPHQL_METRICS_MAX_OPERATIONS:
+            _operation_names.add(name)
+            return name
+    return "other"
+
+
+def wants_trace(request):
+    """Apollo tracing is returned to staff, or to anyone while DEBUG is on"""
+    if not request.headers.get(TRACE_HEADER):
+        return False
+    return settings.DEBUG or attach_user(request).is_staff
+
+
+def _nanoseconds(seconds):
+    return int(seconds * 1e9)
+
+
+class OperationTrace:
+    """SQL and resolver timings of one GraphQL operation.
+
+    Once started it is the current trace of everything that runs in the
+    operation's context, including sync_to_async threads, so SQL from the
+    async view's thread pool is counted too.
+    """
+
+    def __init__(self, operation, record_resolvers=False):
+        self.name = operation_label(operation.name and operation.name.value)
+        self.type = operation.operation.value
+        self.resolvers = [] if record_resolvers else None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self._lock = threading.Lock()
+        self._token = None
+
+    def start(self):
+        self.start_time = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self._token = current_trace.set(self)
+        return self
+
+    def finish(self, result):
+        """Record the operation's metrics; returns its tracing extension, if any"""
+        duration = time.perf_counter() - self.started
+        current_trace.reset(self._token)
+
+        OPERATION_DURATION.labels(self.name, self.type).observe(duration)
+        OPERATION_QUERIES.labels(self.name).observe(self.sql_count)
+        OPERATION_SQL_DURATION.labels(self.name).observe(self.sql_time)
+        if result.errors:
+            OPERATION_ERRORS.labels(self.name, self.type).inc()
+
+        if self.resolvers is None:
+            return None
+        return {
+            "tracing": {
+                "version": 1,
+                "startTime": self.start_time.isoformat(),
+                "endTime": datetime.now(timezone.utc).isoformat(),
+                "duration": _nanoseconds(duration),
+                "execution": {"resolvers": self.resolvers},
+                "sql": {"count": self.sql_count, "duration": _nanoseconds(self.sql_time)},
+            }
+        }
+
+    def add_query(self, duration):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_time += duration
+
+    def add_resolver(self, info, started, duration):
+        self.resolvers.append(
+            {
+                "path": info.path.as_list(),
+                "parentType": info.parent_type.name,
+                "fieldName": info.field_name,
+                "returnType": str(info.return_type),
+                "startOffset": _nanoseconds(started - self.started),
+                "duration": _nanoseconds(duration),
+            }
+        )
+
+
+def record_sql(execute, sql, params, many, context):
+    """Execute wrapper counting statements against the current trace"""
+    trace = current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.add_query(time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_sql_wrapper(sender, connection, **kwargs):
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+class TracingMiddleware:
+    """Graphene middleware timing resolvers into the resolver histogram.
+
+    Scalar fields are plain attribute reads, so they are only timed when
+    the request asked for a tracing payload.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        trace = current_trace.get()
+        tracing = trace is not None and trace.resolvers is not None
+        leaf = is_leaf_type(get_named_type(info.return_type))
+        if leaf and not tracing:
+            return next(root, info, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            result = next(root, info, **kwargs)
+        except Exception:
+            self.record(trace, info, started, leaf, failed=True)
+            raise
+        if isawaitable(result):
+            return self.await_result(trace, info, started, leaf, result)
+        self.record(trace, info, started, leaf)
+        return result
+
+    async def await_result(self, trace, info, started, leaf, result):
+        try:
+            result = await result
+        except Exception:
+            self.record(trace, info, started, leaf, failed=True)
+            raise
+        self.record(trace, info, started, leaf)
+        return result
+
+    @staticmethod
+    def record(trace, info, started, leaf, failed=False):
+        duration = time.perf_counter() - started
+        labels = (info.parent_type.name, info.field_name)
+        if not leaf:
+            RESOLVER_DURATION.labels(*labels).observe(duration)
+        if failed:
+            RESOLVER_ERRORS.labels(*labels).inc()
+        if trace is not None and trace.resolvers is not None:
+            trace.add_resolver(info, started, duration)
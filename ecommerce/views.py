@@ -1,3 +1,407 @@
-from django.shortcuts import render
+import json
+import os
+from inspect import isawaitable
 
-# Create your views here.
+import stripe
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.http.response import HttpResponseBadRequest
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import HttpError, set_rollback
+from graphene_file_upload.django import FileUploadGraphQLView
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    validate_schema,
+)
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    generate_latest,
+    multiprocess,
+)
+
+from . import response_cache
+from .cost import analyze
+from .executor import AsyncExecutionContext, run_sync
+from .exports import CONTENT_TYPES, EXPORTS, stream_export
+from .middleware import attach_user
+from .persisted_queries import PersistedQueryNotFound, get_document
+from .replicas import OperationRouting, pool, primary
+from .tracing import TRACE_HEADER, OperationTrace, wants_trace
+from .webhooks import enqueue, parse_event
+
+
+def finish_execution(result, trace, extensions, routing=None):
+    """Close the operation's trace and routing and set extensions on its
+    ExecutionResult, or on the one an awaitable returns"""
+    if isawaitable(result):
+
+        async def await_result():
+            return finish_execution(await result, trace, extensions, routing)
+
+        return await_result()
+    if routing is not None:
+        routing.finish()
+    if trace is not None:
+        extensions = {**(extensions or {}), **(trace.finish(result) or {})}
+    if extensions:
+        result.extensions = {**(result.extensions or {}), **extensions}
+    return result
+
+
+class PersistedQueryGraphQLView(FileUploadGraphQLView):
+    """GraphQL view that serves persisted queries from a document cache.
+
+    Clients send ``extensions.persistedQuery.sha256Hash`` instead of the
+    query text; the parsed and validated document is looked up by hash.
+    Plain query strings are still accepted (unless PERSISTED_QUERIES_ONLY
+    is set) and cached the same way.
+    """
+
+    @staticmethod
+    def get_query_hash(request, data):
+        """Return the persisted query hash sent by the client, if any"""
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted_query = (extensions or {}).get("persistedQuery") or {}
+        return persisted_query.get("sha256Hash")
+
+    def get_response(self, request, data, show_graphiql=False):
+        """Serve anonymous catalog queries from the shared response cache"""
+        key = None if show_graphiql else self.get_response_cache_key(request, data)
+        if key is None:
+            return self.execute_response(request, data, show_graphiql)
+
+        def compute():
+            # Cached until an invalidation, so never filled from a lagging replica
+            with primary():
+                result, status_code = self.execute_response(request, data, show_graphiql)
+            return (result, status_code), self.is_cacheable(result, status_code)
+
+        return response_cache.get_or_compute(key, compute)
+
+    def execute_response(self, request, data, show_graphiql=False):
+        """GraphQLView.get_response, keeping the result's extensions"""
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+        if not execution_result:
+            return None, 200
+        if execution_result.errors:
+            set_rollback()
+        return self.format_result(request, execution_result, show_graphiql, id)
+
+    def format_result(self, request, execution_result, pretty=False, id=None):
+        """Encode an ExecutionResult as the response body and status code"""
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+        if execution_result.extensions:
+            response["extensions"] = execution_result.extensions
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+        return self.json_encode(request, response, pretty=pretty), status_code
+
+    @staticmethod
+    def is_cacheable(result, status_code):
+        return status_code == 200 and "errors" not in json.loads(result)
+
+    def get_response_cache_key(self, request, data):
+        """Return the response cache key for a cacheable request, or None"""
+        if (
+            request.META.get("HTTP_AUTHORIZATION")
+            or request.user.is_authenticated
+            or request.headers.get(TRACE_HEADER)
+        ):
+            return None
+
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        if query and settings.PERSISTED_QUERIES_ONLY:
+            return None
+        query_hash = self.get_query_hash(request, data)
+        try:
+            document, errors = get_document(
+                self.schema.graphql_schema,
+                query=query or None,
+                query_hash=query_hash,
+                validation_rules=self.validation_rules,
+                max_errors=graphene_settings.MAX_VALIDATION_ERRORS,
+            )
+        except Exception:
+            return None
+        if errors:
+            return None
+
+        tags = response_cache.get_tags(document, operation_name)
+        if tags is None:
+            return None
+        return response_cache.make_key(
+            document, operation_name, variables, "anonymous", tags
+        )
+
+    def get_operation_type(self, request, data):
+        """Return the OperationType of the request, or None if it does not parse"""
+        query, _, operation_name, _ = self.get_graphql_params(request, data)
+        try:
+            document, _ = get_document(
+                self.schema.graphql_schema,
+                query=query or None,
+                query_hash=self.get_query_hash(request, data),
+                validation_rules=self.validation_rules,
+                max_errors=graphene_settings.MAX_VALIDATION_ERRORS,
+            )
+        except Exception:
+            return None
+        operation = get_operation_ast(document, operation_name)
+        return operation and operation.operation
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        query_hash = self.get_query_hash(request, data)
+        if not query and not query_hash:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        if query and settings.PERSISTED_QUERIES_ONLY and not show_graphiql:
+            return ExecutionResult(
+                errors=[GraphQLError("Only persisted queries are accepted.")]
+            )
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            document, validation_errors = get_document(
+                schema,
+                query=query or None,
+                query_hash=query_hash,
+                validation_rules=self.validation_rules,
+                max_errors=graphene_settings.MAX_VALIDATION_ERRORS,
+            )
+        except PersistedQueryNotFound as e:
+            return ExecutionResult(errors=[GraphQLError(str(e))])
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        extensions = None
+        query_cost = operation_ast and analyze(schema, document, operation_ast, variables)
+        if query_cost is not None:
+            extensions = {"cost": query_cost.as_extension()}
+            error = query_cost.error()
+            if error is not None:
+                return ExecutionResult(errors=[error], extensions=extensions)
+
+        trace = routing = None
+        if operation_ast is not None:
+            routing = OperationRouting(operation_ast.operation, request).start()
+            trace = OperationTrace(operation_ast, record_resolvers=wants_trace(request)).start()
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = (
+                    self.execution_context_class
+                )
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+            else:
+                result = execute(schema, document, **execute_options)
+        except Exception as e:
+            result = ExecutionResult(errors=[e])
+        return finish_execution(result, trace, extensions, routing)
+
+
+class AsyncPersistedQueryGraphQLView(PersistedQueryGraphQLView):
+    """Persisted query view for ASGI servers.
+
+    Queries run on graphql-core's async executor: coroutine resolvers use
+    Django's async ORM on the event loop and everything blocking goes to the
+    bounded thread pool (see AsyncExecutionContext). Mutations keep their
+    transactions by running whole on the pool. GraphiQL and batching are
+    left to the sync view.
+    """
+
+    execution_context_class = AsyncExecutionContext
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+            data = self.parse_body(request)
+            result, status_code = await self.aget_response(request, data)
+            return HttpResponse(
+                status=status_code, content=result, content_type="application/json"
+            )
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def aget_response(self, request, data):
+        """Serve from the response cache or execute, without blocking the loop"""
+        if self.get_operation_type(request, data) == OperationType.MUTATION:
+            return await run_sync(self.get_response, request, data)
+
+        key = await run_sync(self.authenticate, request, data)
+        if key is None:
+            return await self.aexecute(request, data)
+
+        async def compute():
+            with primary():
+                result, status_code = await self.aexecute(request, data)
+            return (result, status_code), self.is_cacheable(result, status_code)
+
+        return await response_cache.aget_or_compute(key, compute)
+
+    def authenticate(self, request, data):
+        """Return the response cache key, then resolve the JWT user"""
+        key = self.get_response_cache_key(request, data)
+        attach_user(request)
+        return key
+
+    async def aexecute(self, request, data):
+        """GraphQLView.get_response, awaiting the execution result"""
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        # Replica health checks query the database, which the event loop cannot
+        if pool.due():
+            await run_sync(pool.refresh)
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name
+        )
+        if isawaitable(execution_result):
+            execution_result = await execution_result
+        return self.format_result(request, execution_result)
+
+
+@csrf_exempt
+@require_POST
+async def stripe_webhook(request):
+    """Verify and store a Stripe event; process_webhook_events applies it"""
+    try:
+        event = parse_event(
+            request.body.decode("utf-8"), request.headers.get("Stripe-Signature", "")
+        )
+    except (stripe.SignatureVerificationError, ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest("Invalid webhook.")
+    except ImproperlyConfigured:
+        return HttpResponse("Webhooks are not configured.", status=503)
+    await enqueue(event)
+    return JsonResponse({"received": True})
+
+
+def metrics(request):
+    """Prometheus text exposition of the GraphQL and process metrics"""
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Several worker processes: merge the metrics they wrote to disk
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+@require_GET
+def export(request, name):
+    """Stream a staff-only dump of products, orders or payments.
+
+    ?format= picks csv (the default), jsonl or parquet; ?after= resumes
+    past a key value and the remaining parameters are the filters of the
+    matching API query.
+    """
+    if not attach_user(request).is_staff:
+        return HttpResponseForbidden("Exports are only available to staff.")
+    if name not in EXPORTS:
+        raise Http404(f"No export named {name!r}.")
+    params = request.GET.copy()
+    file_format = params.pop("format", ["csv"])[-1]
+    after = params.pop("after", [None])[-1]
+    try:
+        chunks = stream_export(name, file_format, params, after)
+    except Exception as e:
+        return HttpResponseBadRequest(str(e))
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[file_format])
+    response["Content-Disposition"] = f'attachment; filename="{name}.{file_format}"'
+    # The column to read the last exported value of, to resume with ?after=
+    response["X-Export-Key"] = EXPORTS[name].key
+    return response
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import weakref
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import stripe
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from . import inventory
+from .executor import run_sync
+from .models import Order, Payment, WebhookEvent
+
+
+logger = logging.getLogger(__name__)
+
+
+# Event type -> (new Payment.status, statuses it may replace). Stripe can
+# deliver events out of order, so a payment never moves back out of a
+# final status.
+TRANSITIONS = {
+    "payment_intent.processing": ("processing", ("pending",)),
+    "payment_intent.payment_failed": ("pending", ("processing",)),
+    "payment_intent.succeeded": ("successful", ("pending", "processing")),
+    "payment_intent.canceled": ("cancelled", ("pending", "processing")),
+}
+
+
+def parse_event(payload, signature):
+    """Verify a webhook's signature and return its unsaved WebhookEvent"""
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        # Anyone can sign with an empty key, so nothing can be verified
+        raise ImproperlyConfigured("STRIPE_WEBHOOK_SECRET is not set.")
+    stripe.WebhookSignature.verify_header(
+        payload, signature, settings.STRIPE_WEBHOOK_SECRET, settings.STRIPE_WEBHOOK_TOLERANCE
+    )
+    event = json.loads(payload)
+    return WebhookEvent(
+        event_id=event["id"],
+        type=event["type"],
+        object_id=event["data"]["object"]["id"],
+        created=datetime.fromtimestamp(event["created"], dt_timezone.utc),
+        payload=event,
+    )
+
+
+def store_events(events):
+    """Insert events in one statement, skipping ids that were already received"""
+    WebhookEvent.objects.bulk_create(events, ignore_conflicts=True)
+
+
+class _EventBuffer:
+    """Group-commits the events of concurrent requests on one event loop"""
+
+    def __init__(self):
+        self.pending = []
+        self.timer = None
+
+    async def add(self, event):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((event, future))
+        if len(self.pending) >= settings.STRIPE_WEBHOOK_INGEST_BATCH:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(
+                settings.STRIPE_WEBHOOK_INGEST_LINGER, self.flush
+            )
+        await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self.write(batch))
+
+    async def write(self, batch):
+        try:
+            await run_sync(store_events, [event for event, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                # A request that gave up has cancelled its future
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+
+_buffers = weakref.WeakKeyDictionary()
+
+
+async def enqueue(event):
+    """Durably store an event, sharing one INSERT with concurrent requests"""
+    loop = asyncio.get_running_loop()
+    if loop not in _buffers:
+        _buffers[loop] = _EventBuffer()
+    await _buffers[loop].add(event)
+
+
+def apply_events(batch_size=None):
+    """Apply one batch of stored events; returns how many were consumed.
+
+    Only the newest event per PaymentIntent counts. Each status transition
+    is one UPDATE on Payment, cascaded into Order.status and the order's
+    stock reservations. Events can beat CreatePayment to its Payment row,
+    so those of unknown PaymentIntents stay queued for a later batch until
+    STRIPE_WEBHOOK_RETRY_WINDOW has passed.
+    """
+    batch_size = batch_size or settings.STRIPE_WEBHOOK_APPLY_BATCH
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("id")
+            .values_list("pk", "type", "object_id", "created", "received_at")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        latest = {}
+        for pk, event_type, object_id, created, _ in events:
+            if event_type in TRANSITIONS and (
+                object_id not in latest or (created, pk) >= latest[object_id][1:]
+            ):
+                latest[object_id] = (event_type, created, pk)
+
+        known = set(
+            Payment.objects.filter(stripe_payment_intent__in=latest).values_list(
+                "stripe_payment_intent", flat=True
+            )
+        )
+        cutoff = timezone.now() - timedelta(seconds=settings.STRIPE_WEBHOOK_RETRY_WINDOW)
+        waiting, dropped = set(), set()
+        for _, _, object_id, _, received_at in events:
+            if object_id in latest and object_id not in known:
+                (waiting if received_at > cutoff else dropped).add(object_id)
+        for object_id in sorted(dropped - waiting):
+            logger.warning("Dropping webhook events for unknown PaymentIntent %s", object_id)
+
+        by_type = {}
+        for object_id, (event_type, _, _) in latest.items():
+            if object_id in known:
+                by_type.setdefault(event_type, []).append(object_id)
+
+        for event_type, intent_ids in by_type.items():
+            status, from_statuses = TRANSITIONS[event_type]
+            payments = dict(
+                Payment.objects.filter(
+                    stripe_payment_intent__in=intent_ids, status__in=from_statuses
+                ).values_list("pk", "order_id")
+            )
+            if not payments:
+                continue
+            Payment.objects.filter(pk__in=payments).update(status=status)
+            if status == "successful":
+                paid = inventory.commit_orders(set(payments.values()))
+                # An order whose hold expired was cancelled, but commit_orders
+                # has taken its stock again, so it is paid after all
+                Order.objects.filter(
+                    pk__in=paid, status__in=("created", "pending", "cancelled")
+                ).update(status="paid")
+            elif status == "cancelled":
+                order_ids = set(payments.values())
+                inventory.release_orders(order_ids)
+                Order.objects.filter(
+                    pk__in=order_ids, status__in=("created", "pending")
+                ).update(status="cancelled")
+
+        consumed = [pk for pk, _, object_id, _, _ in events if object_id not in waiting]
+        WebhookEvent.objects.filter(pk__in=consumed).update(processed_at=timezone.now())
+        return len(consumed)
@@ -1,5 +1,9 @@
 import graphene
-from ecommerce.schema import Query as ECOMMERCEQuery, Mutation as ECOMMERCEMutation
+from ecommerce.schema import (
+    AsyncQuery as ECOMMERCEAsyncQuery,
+    Mutation as ECOMMERCEMutation,
+    Query as ECOMMERCEQuery,
+)
 
 
 class Query(graphene.ObjectType):
@@ -14,4 +18,11 @@ class Mutation(ECOMMERCEMutation, graphene.ObjectType):
     '''Combined Mutation class'''
     pass
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+# Same root type as Query, with the async resolvers used by the async view
+class AsyncQuery(ECOMMERCEAsyncQuery, graphene.ObjectType):
+    '''Combined Query class'''
+    class Meta:
+        name = "Query"
+
+schema = graphene.Schema(query=Query, mutation=Mutation)
+async_schema = graphene.Schema(query=AsyncQuery, mutation=Mutation)
\ No newline at end of file
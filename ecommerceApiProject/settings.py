@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -117,9 +117,71 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Writers take the lock when the transaction begins and wait for it,
+        # instead of failing with "database is locked" on lock upgrade; WAL
+        # lets readers run alongside the single writer.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': config('SQLITE_TIMEOUT', default=20, cast=int),
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
+# Read replicas (see ecommerce/replicas.py). GraphQL query operations read
+# from the aliases in DATABASE_REPLICAS, round-robin over those that passed
+# a health check in the last CHECK_INTERVAL seconds. Mutations, anything in
+# transaction.atomic() and reads that fill shared caches (cached responses,
+# cart summaries and counts) use 'default', and a user's queries stay there for
+# STICKY_SECONDS after their last mutation; pins are kept in the default
+# cache, so share it between workers. DATABASE_REPLICA_PATHS adds SQLite
+# copies of the primary, refreshed by `manage.py sync_replicas`; any other
+# DATABASES entry, e.g. a Postgres standby, can be listed too.
+DATABASE_REPLICA_PATHS = config('DATABASE_REPLICA_PATHS', default='', cast=Csv())
+for index, path in enumerate(DATABASE_REPLICA_PATHS):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_REPLICA_CHECK_INTERVAL = config('DATABASE_REPLICA_CHECK_INTERVAL', default=5, cast=float)
+DATABASE_REPLICA_STICKY_SECONDS = config('DATABASE_REPLICA_STICKY_SECONDS', default=10, cast=int)
+DATABASE_ROUTERS = ['ecommerce.replicas.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Point GRAPHQL_CACHE_BACKEND at django.core.cache.backends.redis.RedisCache
+# to share cached GraphQL responses between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'graphql': {
+        'BACKEND': config('GRAPHQL_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('GRAPHQL_CACHE_LOCATION', default='graphql-responses'),
+    },
+}
+
+GRAPHQL_RESPONSE_CACHE = 'graphql'
+GRAPHQL_RESPONSE_CACHE_TIMEOUT = config('GRAPHQL_RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+GRAPHQL_RESPONSE_CACHE_LOCK_TIMEOUT = 10
+
+# totalCount strategies on connections: cached counts live this long even
+# without writes, approximate counts are exact below the threshold.
+GRAPHQL_COUNT_CACHE_TIMEOUT = config('GRAPHQL_COUNT_CACHE_TIMEOUT', default=60, cast=int)
+GRAPHQL_APPROXIMATE_COUNT_THRESHOLD = config('GRAPHQL_APPROXIMATE_COUNT_THRESHOLD', default=1000, cast=int)
+
+# Seconds checkout holds stock for an order before an unpaid reservation
+# can be released back to other buyers.
+INVENTORY_RESERVATION_TTL = config('INVENTORY_RESERVATION_TTL', default=900, cast=int)
+
+# Upper bound on how long a cached cart summary lives; cart and price
+# writes expire it sooner.
+CART_SUMMARY_CACHE_TIMEOUT = config('CART_SUMMARY_CACHE_TIMEOUT', default=300, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -161,23 +223,96 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
+# Uploads are streamed to a temporary file and moved into MEDIA_ROOT,
+# never held in memory whole.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Product image derivatives (one per width and format) are rendered on a
+# pool of PRODUCT_IMAGE_WORKERS processes after the upload commits; 0
+# renders them in the committing thread instead.
+PRODUCT_IMAGE_WIDTHS = config('PRODUCT_IMAGE_WIDTHS', default='320,640,1280', cast=Csv(int))
+PRODUCT_IMAGE_FORMATS = config('PRODUCT_IMAGE_FORMATS', default='webp,avif', cast=Csv())
+PRODUCT_IMAGE_QUALITY = config('PRODUCT_IMAGE_QUALITY', default=80, cast=int)
+PRODUCT_IMAGE_WORKERS = config('PRODUCT_IMAGE_WORKERS', default=2, cast=int)
+
+# Catalog imports upsert this many products per INSERT ... ON CONFLICT
+PRODUCT_IMPORT_BATCH_SIZE = config('PRODUCT_IMPORT_BATCH_SIZE', default=1000, cast=int)
+
+# Exports (/exports/<name>/ and `manage.py export_data`) fetch and write this
+# many rows at a time, which bounds their memory
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Authenticated users are cached briefly by (user id, token jti) so a
+# repeated token skips the user lookup; set the TTL to 0 to disable.
+JWT_USER_CACHE_TTL = config('JWT_USER_CACHE_TTL', default=30, cast=int)
+JWT_USER_CACHE_SIZE = config('JWT_USER_CACHE_SIZE', default=1024, cast=int)
+
+
 GRAPHENE = {
     "SCHEMA": "ecommerceApiProject.schema.schema",
     "MIDDLEWARE": [
         "ecommerce.middleware.JWTGrapQLMiddleware",
+        "ecommerce.tracing.TracingMiddleware",
     ],
 }
 
+# Resolver and per-operation SQL metrics are served on /metrics; at most
+# this many distinct operation names get their own label, later ones are
+# reported as "other".
+GRAPHQL_METRICS_MAX_OPERATIONS = config('GRAPHQL_METRICS_MAX_OPERATIONS', default=200, cast=int)
+
+# Operations are costed before execution (see ecommerce/cost.py) and
+# rejected above either limit; connections fetched without first/last count
+# RELAY_CONNECTION_MAX_LIMIT items and plain lists DEFAULT_LIST_SIZE items.
+GRAPHQL_MAX_COST = config('GRAPHQL_MAX_COST', default=10000, cast=int)
+GRAPHQL_MAX_DEPTH = config('GRAPHQL_MAX_DEPTH', default=15, cast=int)
+GRAPHQL_COST_DEFAULT_LIST_SIZE = config('GRAPHQL_COST_DEFAULT_LIST_SIZE', default=10, cast=int)
+
+# Threads the async GraphQL view runs blocking resolvers on; 0 runs them on
+# Django's thread-sensitive executor instead.
+GRAPHQL_ASYNC_WORKERS = config('GRAPHQL_ASYNC_WORKERS', default=8, cast=int)
+
+
+# Persisted GraphQL queries
+PERSISTED_QUERIES_MANIFEST = BASE_DIR / 'persisted_queries.json'
+PERSISTED_QUERIES_CACHE_SIZE = config('PERSISTED_QUERIES_CACHE_SIZE', default=512, cast=int)
+PERSISTED_QUERIES_ONLY = config('PERSISTED_QUERIES_ONLY', default=False, cast=bool)
+
 
 # Stripe configuration
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
+# Point at `manage.py run_fake_stripe` to work offline
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='https://api.stripe.com')
+STRIPE_CONNECT_TIMEOUT = config('STRIPE_CONNECT_TIMEOUT', default=3.05, cast=float)
+STRIPE_READ_TIMEOUT = config('STRIPE_READ_TIMEOUT', default=10, cast=float)
+STRIPE_MAX_RETRIES = config('STRIPE_MAX_RETRIES', default=2, cast=int)
+STRIPE_RETRY_BACKOFF = config('STRIPE_RETRY_BACKOFF', default=0.5, cast=float)
+STRIPE_POOL_SIZE = config('STRIPE_POOL_SIZE', default=10, cast=int)
+
+# Webhooks are stored on receipt (concurrent requests share one INSERT of up
+# to INGEST_BATCH events, waiting at most INGEST_LINGER seconds) and applied
+# by `manage.py process_webhook_events` in batches of APPLY_BATCH. Events for
+# a PaymentIntent with no Payment row yet are retried for RETRY_WINDOW
+# seconds after receipt, then dropped. Without a SECRET every webhook is
+# refused with a 503.
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+STRIPE_WEBHOOK_TOLERANCE = config('STRIPE_WEBHOOK_TOLERANCE', default=300, cast=int)
+STRIPE_WEBHOOK_INGEST_BATCH = config('STRIPE_WEBHOOK_INGEST_BATCH', default=500, cast=int)
+STRIPE_WEBHOOK_INGEST_LINGER = config('STRIPE_WEBHOOK_INGEST_LINGER', default=0.005, cast=float)
+STRIPE_WEBHOOK_APPLY_BATCH = config('STRIPE_WEBHOOK_APPLY_BATCH', default=1000, cast=int)
+STRIPE_WEBHOOK_RETRY_WINDOW = config('STRIPE_WEBHOOK_RETRY_WINDOW', default=300, cast=int)
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
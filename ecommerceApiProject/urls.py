@@ -14,13 +14,20 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
-from graphene_file_upload.django import FileUploadGraphQLView
 from django.views.decorators.csrf import csrf_exempt
 from graphql_playground.views import GraphQLPlaygroundView
-from ecommerceApiProject.schema import schema
-from graphene_django.views import GraphQLView
+from ecommerceApiProject.schema import async_schema, schema
+from ecommerce.views import (
+    AsyncPersistedQueryGraphQLView,
+    PersistedQueryGraphQLView,
+    export,
+    metrics,
+    stripe_webhook,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,14 +36,34 @@ urlpatterns = [
     path(
         "graphql-api/",
         csrf_exempt(
-            FileUploadGraphQLView.as_view(schema=schema)
+            PersistedQueryGraphQLView.as_view(schema=schema)
         ),
         name="graphql-api",
     ),
+
+    # Same API on the async executor, for ASGI deployments
+    path(
+        "graphql-api/async/",
+        csrf_exempt(
+            AsyncPersistedQueryGraphQLView.as_view(schema=async_schema)
+        ),
+        name="graphql-api-async",
+    ),
     
-    path("graphql/", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    # Stripe webhooks
+    path("stripe/webhook/", stripe_webhook, name="stripe-webhook"),
+
+    # Streaming CSV, JSONL and Parquet dumps for staff
+    path("exports/<str:name>/", export, name="export"),
+
+    # Prometheus scrape target
+    path("metrics", metrics, name="metrics"),
+
+    path("graphql/", csrf_exempt(PersistedQueryGraphQLView.as_view(graphiql=True))),
 
     # Playground UI (optional - for development only)
     path("playground/", csrf_exempt(GraphQLPlaygroundView.as_view())),
 ]
 
+# Uploaded media, served by Django only while DEBUG is on
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
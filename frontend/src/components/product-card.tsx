@@ -19,6 +19,8 @@ interface Product {
       node: {
         id: string;
         image: string;
+        thumbnailUrl?: string;
+        srcset?: string | null;
       };
     }>;
   };
@@ -39,7 +41,7 @@ export function ProductCard({ product }: ProductCardProps) {
   const { user } = useAuth();
   const [addToCart, { loading: addingToCart }] = useMutation(ADD_TO_CART);
 
-  const firstImage = product.images?.edges?.[0]?.node?.image;
+  const firstImage = product.images?.edges?.[0]?.node;
   const averageRating = product.rating?.edges?.length
     ? product.rating.edges.reduce((sum, edge) => sum + edge.node.rating, 0) / product.rating.edges.length
     : 0;
@@ -75,7 +77,10 @@ export function ProductCard({ product }: ProductCardProps) {
         <div className="aspect-square overflow-hidden rounded-t-lg bg-muted">
           {firstImage ? (
             <img
-              src={firstImage}
+              src={firstImage.thumbnailUrl ?? firstImage.image}
+              srcSet={firstImage.srcset ?? undefined}
+              sizes="(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw"
+              loading="lazy"
               alt={product.name}
               className="h-full w-full object-cover group-hover:scale-105 transition-transform duration-200"
             />
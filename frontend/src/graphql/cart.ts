@@ -12,6 +12,26 @@ export const GET_CART = gql`
   }
 `;
 
+export const GET_CART_SUMMARY = gql`
+  query GetCartSummary {
+    cart {
+      id
+      cartSummary {
+        itemCount
+        lineCount
+        subtotal
+        lines {
+          productId
+          name
+          quantity
+          unitPrice
+          lineTotal
+        }
+      }
+    }
+  }
+`;
+
 export const GET_CART_ITEMS = gql`
   query GetCartItems {
     cartItems {
@@ -24,7 +44,7 @@ export const GET_CART_ITEMS = gql`
             name
             price
             amountInStock
-            images {
+            images(first: 1) {
               edges {
                 node {
                   id
@@ -12,7 +12,7 @@ export const GET_ORDERS = gql`
             id
             email
           }
-          items {
+          items(first: 50) {
             edges {
               node {
                 id
@@ -21,7 +21,7 @@ export const GET_ORDERS = gql`
                   id
                   name
                   price
-                  images {
+                  images(first: 1) {
                     edges {
                       node {
                         id
@@ -33,7 +33,7 @@ export const GET_ORDERS = gql`
               }
             }
           }
-          payments {
+          payments(first: 10) {
             edges {
               node {
                 id
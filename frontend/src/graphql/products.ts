@@ -20,11 +20,13 @@ export const GET_ALL_PRODUCTS = gql`
             id
             name
           }
-          images {
+          images(first: 1) {
             edges {
               node {
                 id
                 image
+                thumbnailUrl
+                srcset
               }
             }
           }
@@ -149,6 +151,8 @@ export const SEARCH_PRODUCTS = gql`
           node {
             id
             image
+            thumbnailUrl
+            srcset
           }
         }
       }